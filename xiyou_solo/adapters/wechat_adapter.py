@@ -3,19 +3,59 @@ from __future__ import annotations
 import hashlib
 import json
 import os
+import threading
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import Any, Callable, Dict, List, Optional
 from urllib.parse import parse_qs, urlparse
 
-from xiyou_solo.services.game_service import TurnExecutor, handle_message
+from xiyou_solo.infra.dispatcher import QueueFullError
+from xiyou_solo.infra.http_server import PooledHTTPServer
+from xiyou_solo.infra.rate_limit import LimitExceeded
+from xiyou_solo.infra.session_store import DATA_DIR
+from xiyou_solo.infra.turn_queue import ReplySink, TransientTurnError, TurnJob, TurnQueue, TurnWorkers
+from xiyou_solo.services import room_repo
+from xiyou_solo.services.game_service import (
+    TurnExecutor,
+    admit_message,
+    dispatch_message,
+    dispatcher_stats,
+    handle_message,
+    is_turn_command,
+    limit_stats,
+)
+from xiyou_solo.services.metrics import metrics_snapshot
+from xiyou_solo.services.tg_handler import format_reply
+from xiyou_solo.ui.bot_runner import run_turn
 
 
 WECHAT_TOKEN = os.getenv("WECHAT_TOKEN", "").strip()
 HOST = os.getenv("WECHAT_ADAPTER_HOST", "127.0.0.1").strip() or "127.0.0.1"
 PORT = int(os.getenv("WECHAT_ADAPTER_PORT", "8090"))
+# "pool": fixed workers + bounded queue with 503 shedding; "thread": one thread per connection.
+SERVER_MODE = os.getenv("WECHAT_SERVER_MODE", "pool").strip().lower() or "pool"
+HTTP_WORKERS = int(os.getenv("WECHAT_HTTP_WORKERS", "16"))
+HTTP_MAX_QUEUE = int(os.getenv("WECHAT_HTTP_MAX_QUEUE", "64"))
+KEEPALIVE_SEC = float(os.getenv("WECHAT_KEEPALIVE_SEC", "5"))
+
+# /act turns go through a durable queue and are answered via the outbox; other commands join
+# that queue while the group still has turns pending, so they are answered in order.
+ASYNC_TURNS = os.getenv("WECHAT_ASYNC_TURNS", "1").strip() != "0"
+TURN_QUEUE_PATH = DATA_DIR / "wechat_turns.sqlite3"
+TURN_WORKERS = int(os.getenv("WECHAT_TURN_WORKERS", "2"))
+TURN_MAX_ATTEMPTS = int(os.getenv("WECHAT_TURN_MAX_ATTEMPTS", "3"))
+TURN_RETENTION_SEC = float(os.getenv("WECHAT_TURN_RETENTION_SEC", "86400"))
+# Unfinished queued turns per group; more are answered 429.
+TURN_MAX_PENDING = int(os.getenv("WECHAT_TURN_MAX_PENDING", "20"))
+# LLM failures worth re-running a queued turn for: network errors and upstream outages,
+# which include turns refused by an open circuit breaker.
+TRANSIENT_LLM_ERRORS = frozenset({"network", "unavailable"})
 
 _TURN_EXECUTOR: Optional[TurnExecutor] = None
+_REPLY_SINK: Optional[ReplySink] = None
+_QUEUE: Optional[TurnQueue] = None
+_WORKERS: Optional[TurnWorkers] = None
+_QUEUE_LOCK = threading.Lock()
 
 
 def set_turn_executor(executor: Optional[TurnExecutor]) -> None:
@@ -23,6 +63,75 @@ def set_turn_executor(executor: Optional[TurnExecutor]) -> None:
     _TURN_EXECUTOR = executor
 
 
+def set_reply_sink(sink: Optional[ReplySink]) -> None:
+    """Optional push delivery; outbox rows the sink accepts are marked delivered."""
+    global _REPLY_SINK
+    _REPLY_SINK = sink
+    if _WORKERS is not None:
+        _WORKERS.sink = sink
+
+
+def llm_turn_executor(session_id: str, user_id: str, text: str, meta: Dict[str, Any]) -> str:
+    """Play /act through the LLM engine; outages and a busy API key become TransientTurnError."""
+    try:
+        narrative, directive, summary = run_turn(
+            session_id, text, group_id=str(meta.get("group_id") or session_id), retry_errors=TRANSIENT_LLM_ERRORS
+        )
+    except LimitExceeded as exc:
+        raise TransientTurnError(str(exc)) from exc
+    return format_reply(narrative, directive, summary)
+
+
+def _run_queued_turn(job: TurnJob) -> List[str]:
+    # Rate limits were applied by admit_message before the job was queued.
+    return handle_message(
+        job.group_id, job.user_id, job.text, job.message_id, turn_executor=_TURN_EXECUTOR, check_rate=False
+    )
+
+
+def get_turn_queue() -> TurnQueue:
+    """Open the queue and start its workers on first use."""
+    global _QUEUE, _WORKERS
+    if _WORKERS is None:
+        with _QUEUE_LOCK:
+            if _WORKERS is None:
+                _QUEUE = TurnQueue(
+                    TURN_QUEUE_PATH,
+                    max_attempts=TURN_MAX_ATTEMPTS,
+                    retention_sec=TURN_RETENTION_SEC,
+                    max_pending=TURN_MAX_PENDING,
+                )
+                _WORKERS = TurnWorkers(_QUEUE, _run_queued_turn, workers=TURN_WORKERS, sink=_REPLY_SINK).start()
+    return _QUEUE
+
+
+def stop_turn_workers() -> None:
+    global _QUEUE, _WORKERS
+    with _QUEUE_LOCK:
+        if _WORKERS is not None:
+            _WORKERS.stop()
+            _QUEUE.close()
+        _QUEUE = None
+        _WORKERS = None
+
+
+def turn_queue_stats() -> Dict[str, Any]:
+    if _WORKERS is None:
+        return {"enabled": ASYNC_TURNS, "open": False}
+    return {"enabled": ASYNC_TURNS, "open": True, **_QUEUE.stats(), "run_ms": _WORKERS.run_ms.snapshot()}
+
+
+def _should_queue(event: Dict[str, str]) -> bool:
+    """/act always goes through the queue; other commands only while their group has turns in it."""
+    if not ASYNC_TURNS:
+        return False
+    if is_turn_command(event["text"]):
+        return True
+    # Plain commands never open the queue themselves: no queue yet means nothing is pending.
+    queue = _QUEUE
+    return queue is not None and queue.pending(event["group_id"]) > 0
+
+
 def verify_signature(token: str, timestamp: str, nonce: str, signature: str) -> bool:
     """
     WeChat-style signature check:
@@ -49,6 +158,9 @@ def parse_event(payload: Dict[str, Any]) -> Dict[str, str]:
 
 class WeChatCallbackHandler(BaseHTTPRequestHandler):
     server_version = "xiyou-wechat-adapter/0.1"
+    protocol_version = "HTTP/1.1"
+    # Idle keep-alive connections give their worker back after this many seconds.
+    timeout = KEEPALIVE_SEC
 
     def _send_json(self, status: int, obj: Dict[str, Any]) -> None:
         body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
@@ -60,7 +172,23 @@ class WeChatCallbackHandler(BaseHTTPRequestHandler):
 
     def do_GET(self) -> None:
         parsed = urlparse(self.path)
+        if parsed.path == "/metrics":
+            self._send_json(
+                HTTPStatus.OK,
+                {
+                    "ok": True,
+                    "dispatcher": dispatcher_stats(),
+                    "dedup": room_repo.dedup_stats(),
+                    "turn_queue": turn_queue_stats(),
+                    **metrics_snapshot(limit_stats()),
+                    "http": self.server.stats() if isinstance(self.server, PooledHTTPServer) else {},
+                },
+            )
+            return
         qs = parse_qs(parsed.query)
+        if parsed.path == "/outbox":
+            self._send_outbox(qs)
+            return
         signature = (qs.get("signature") or [""])[0]
         timestamp = (qs.get("timestamp") or [""])[0]
         nonce = (qs.get("nonce") or [""])[0]
@@ -79,6 +207,8 @@ class WeChatCallbackHandler(BaseHTTPRequestHandler):
     def do_POST(self) -> None:
         parsed = urlparse(self.path)
         if parsed.path not in {"/wechat/callback", "/callback"}:
+            # The body is left unread, so this keep-alive connection cannot be reused.
+            self.close_connection = True
             self._send_json(HTTPStatus.NOT_FOUND, {"ok": False, "error": "not found"})
             return
 
@@ -86,6 +216,7 @@ class WeChatCallbackHandler(BaseHTTPRequestHandler):
         try:
             length = int(length_raw)
         except ValueError:
+            self.close_connection = True
             self._send_json(HTTPStatus.BAD_REQUEST, {"ok": False, "error": "invalid content-length"})
             return
         body = self.rfile.read(max(0, length))
@@ -100,23 +231,70 @@ class WeChatCallbackHandler(BaseHTTPRequestHandler):
             self._send_json(HTTPStatus.BAD_REQUEST, {"ok": False, "error": "missing group_id/user_id"})
             return
 
-        replies = handle_message(
-            group_id=event["group_id"],
-            user_id=event["user_id"],
-            text=event["text"],
-            message_id=event["message_id"],
-            turn_executor=_TURN_EXECUTOR,
-        )
+        if _should_queue(event):
+            refused = admit_message(event["group_id"], event["user_id"], event["message_id"])
+            if refused is not None:
+                self._send_json(HTTPStatus.OK, {"ok": True, "queued": False, "replies": [refused]})
+                return
+            try:
+                job_id = get_turn_queue().enqueue(event["group_id"], event["user_id"], event["text"], event["message_id"])
+            except QueueFullError:
+                self._send_json(HTTPStatus.TOO_MANY_REQUESTS, {"ok": False, "error": "group queue full"})
+                return
+            if job_id is None:
+                self._send_json(HTTPStatus.OK, {"ok": True, "queued": False, "replies": ["Duplicate message ignored."]})
+            else:
+                self._send_json(HTTPStatus.ACCEPTED, {"ok": True, "queued": True, "job_id": job_id, "replies": []})
+            return
+
+        try:
+            pending = dispatch_message(
+                group_id=event["group_id"],
+                user_id=event["user_id"],
+                text=event["text"],
+                message_id=event["message_id"],
+                turn_executor=_TURN_EXECUTOR,
+            )
+        except QueueFullError:
+            self._send_json(HTTPStatus.TOO_MANY_REQUESTS, {"ok": False, "error": "group queue full"})
+            return
+        replies = pending.result()
         self._send_json(HTTPStatus.OK, {"ok": True, "replies": replies})
 
+    def _send_outbox(self, qs: Dict[str, List[str]]) -> None:
+        signature = (qs.get("signature") or [""])[0]
+        timestamp = (qs.get("timestamp") or [""])[0]
+        nonce = (qs.get("nonce") or [""])[0]
+        if not verify_signature(WECHAT_TOKEN, timestamp, nonce, signature):
+            self._send_json(HTTPStatus.FORBIDDEN, {"ok": False, "error": "invalid signature"})
+            return
+        try:
+            after = int((qs.get("after") or ["0"])[0])
+            limit = int((qs.get("limit") or ["50"])[0])
+        except ValueError:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"ok": False, "error": "invalid after/limit"})
+            return
+        group_id = (qs.get("group_id") or [""])[0].strip() or None
+        messages = get_turn_queue().outbox(group_id=group_id, after_id=after, limit=min(limit, 200))
+        nxt = messages[-1]["id"] if messages else after
+        self._send_json(HTTPStatus.OK, {"ok": True, "messages": messages, "next": nxt})
+
     def log_message(self, format: str, *args: Any) -> None:  # noqa: A003
         # Quiet default logging; keep adapter output clean.
         return
 
 
+def make_server(host: str = HOST, port: int = PORT, mode: str = SERVER_MODE) -> ThreadingHTTPServer | PooledHTTPServer:
+    if mode == "thread":
+        return ThreadingHTTPServer((host, port), WeChatCallbackHandler)
+    return PooledHTTPServer((host, port), WeChatCallbackHandler, workers=HTTP_WORKERS, max_queue=HTTP_MAX_QUEUE)
+
+
 def run_server(host: str = HOST, port: int = PORT) -> None:
-    server = ThreadingHTTPServer((host, port), WeChatCallbackHandler)
-    print(f"WeChat adapter listening on http://{host}:{port}")
+    if _TURN_EXECUTOR is None:
+        set_turn_executor(llm_turn_executor)
+    server = make_server(host, port)
+    print(f"WeChat adapter listening on http://{host}:{port} ({SERVER_MODE})")
     server.serve_forever()
 
 
@@ -0,0 +1 @@
+"""Micro-benchmarks; run modules with ``python -m xiyou_solo.benchmarks.<name>``."""
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from xiyou_solo.benchmarks.fake_openrouter import FakeOpenRouter, add_config_args, config_from_args
+from xiyou_solo.infra.http_pool import get_pool
+from xiyou_solo.infra.metrics import LatencyStats
+from xiyou_solo.llm import openrouter, structured
+
+
+def run(base_url: str, turns: int, concurrency: int, policy: openrouter.CallPolicy, model: str) -> Dict[str, Any]:
+    """Drive ``turns`` provider calls through the real HTTP path (pool, retries, breaker) against base_url."""
+    provider = openrouter.OpenRouterProvider(
+        api_key="sk-bench", model=model, cache=None, policy=policy, fallback=None, base_url=base_url
+    )
+    latency = LatencyStats()
+    errors: Dict[str, int] = {}
+
+    def one(idx: int) -> None:
+        result = provider.generate("You are the DM.", "language: en", f"turn {idx}")
+        latency.record(float(result.latency_ms))
+        key = result.error or "ok"
+        errors[key] = errors.get(key, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        list(pool.map(one, range(turns)))
+    elapsed = time.perf_counter() - started
+    return {
+        "turns": turns,
+        "turns_per_sec": turns / elapsed if elapsed else 0.0,
+        "latency_ms": latency.snapshot(),
+        "outcomes": errors,
+        "openrouter": {k: v for k, v in openrouter.call_stats().items() if k not in {"latency_ms", "breakers"}},
+        "http_pool": {k: v for k, v in get_pool().stats().items() if k != "connect_ms"},
+        "parsing": structured.parse_stats().get(model, {}),
+    }
+
+
+def stream_probe(base_url: str, model: str, timeout: float = 30.0) -> Dict[str, Any]:
+    """Time to first SSE chunk vs the whole stream, for one streamed completion."""
+    parts = urlsplit(openrouter.chat_url(base_url))
+    cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    conn = cls(parts.hostname or "", parts.port or (443 if parts.scheme == "https" else 80), timeout=timeout)
+    body = json.dumps({"model": model, "stream": True, "messages": [{"role": "user", "content": "[Player Input]\nlook"}]})
+    started = time.perf_counter()
+    first_ms: Optional[float] = None
+    chunks = 0
+    malformed = 0
+    try:
+        conn.request("POST", parts.path, body=body, headers={"Content-Type": "application/json", "Authorization": "Bearer sk-bench"})
+        resp = conn.getresponse()
+        if resp.status != 200:
+            return {"status": resp.status}
+        for raw in resp:
+            line = raw.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            if first_ms is None:
+                first_ms = (time.perf_counter() - started) * 1000
+            chunks += 1
+            try:
+                json.loads(data)
+            except json.JSONDecodeError:
+                malformed += 1
+    finally:
+        conn.close()
+    return {"status": 200, "first_chunk_ms": first_ms, "total_ms": (time.perf_counter() - started) * 1000, "chunks": chunks, "malformed": malformed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenRouterProvider load test against a local fake server (or --url)")
+    parser.add_argument("--url", default="", help="base URL of a running server; default starts a fake in-process")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--model", default="fake/model")
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--attempts", type=int, default=3)
+    parser.add_argument("--hedge", action="store_true")
+    parser.add_argument("--stream", action="store_true", help="also time one SSE streamed completion")
+    add_config_args(parser)
+    args = parser.parse_args()
+
+    fake: Optional[FakeOpenRouter] = None
+    base_url = args.url
+    if not base_url:
+        fake = FakeOpenRouter(config_from_args(args)).start()
+        base_url = fake.base_url
+    policy = openrouter.CallPolicy(
+        timeout_sec=args.timeout, max_attempts=args.attempts, backoff_base_sec=0.05, hedge=args.hedge, hedge_min_samples=20
+    )
+    try:
+        rows: List[Dict[str, Any]] = [run(base_url, args.turns, args.concurrency, policy, args.model)]
+        if args.stream:
+            rows.append({"stream": stream_probe(base_url, args.model, args.timeout)})
+        if fake is not None:
+            rows.append({"server": fake.stats()})
+    finally:
+        if fake is not None:
+            fake.stop()
+    for row in rows:
+        print(json.dumps(row, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import argparse
+import json
+import timeit
+from typing import Any, Callable, Dict, List, Tuple
+
+from xiyou_solo.core import rules
+from xiyou_solo.core.engine import GameEngine
+from xiyou_solo.core.state import GameState, new_game_state
+from xiyou_solo.infra.serialization import available_serializers, get_serializer, state_from_doc
+from xiyou_solo.llm.mock import MockProvider
+
+
+SCRIPT = ["inspect the cart tracks", "ask the tea seller", "search the ridge", "fight the bandits", "attack", "attack", "defend", "attack"]
+
+
+def _session(turns: int) -> GameState:
+    rules.set_seed(42)
+    state = new_game_state(session_id="sess_bench_000000_000000_abcdef", player_id="telegram:bench")
+    state.inventory.extend(["dagger", "healing_herbs", "buff_potion", "incense_charm", "smoke_bomb"])
+    log_data: Dict[str, Any] = {"session_id": state.session_id, "events": []}
+    engine = GameEngine(provider=MockProvider())
+    for idx in range(turns):
+        engine.run_turn(state, log_data, SCRIPT[idx % len(SCRIPT)], "DM")
+    return state
+
+
+def _bench(fn: Callable[[], Any], number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def _legacy_codec(state: GameState) -> Tuple[int, float, float, int]:
+    doc = state.to_dict()
+    raw = json.dumps(doc, ensure_ascii=False, indent=2).encode("utf-8")
+    number = 2000
+    enc = _bench(lambda: json.dumps(state.to_dict(), ensure_ascii=False, indent=2).encode("utf-8"), number)
+    dec = _bench(lambda: GameState.from_dict(json.loads(raw.decode("utf-8"))), number)
+    return len(raw), enc, dec, number
+
+
+def run(sizes: List[int]) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    for turns in sizes:
+        state = _session(turns)
+        size, enc, dec, _ = _legacy_codec(state)
+        rows.append({"turns": turns, "codec": "json-indent2 (legacy)", "bytes": size, "encode_us": enc, "decode_us": dec})
+        for name in available_serializers():
+            codec = get_serializer(name)
+            raw = codec.dumps(state.to_dict())
+            enc = _bench(lambda: codec.dumps(state.to_dict()), 2000)
+            dec = _bench(lambda: state_from_doc(codec.loads(raw)), 2000)
+            rows.append({"turns": turns, "codec": name, "bytes": len(raw), "encode_us": enc, "decode_us": dec})
+    return rows
+
+
+def rebuild(sizes: List[int]) -> List[Dict[str, Any]]:
+    """dict -> GameState alone: the defensive from_dict against from_trusted_dict."""
+    rows: List[Dict[str, Any]] = []
+    for turns in sizes:
+        doc = _session(turns).to_dict()
+        checked = _bench(lambda: GameState.from_dict(doc), 5000)
+        trusted = _bench(lambda: GameState.from_trusted_dict(doc), 5000)
+        rows.append({"turns": turns, "from_dict_us": checked, "from_trusted_dict_us": trusted})
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="GameState encode/decode benchmark")
+    parser.add_argument("--turns", type=int, nargs="*", default=[0, 6, 15])
+    args = parser.parse_args()
+    print(f"{'turns':>5}  {'codec':<22} {'bytes':>6} {'encode_us':>10} {'decode_us':>10}")
+    for row in run(args.turns):
+        print(f"{row['turns']:>5}  {row['codec']:<22} {row['bytes']:>6} {row['encode_us']:>10.1f} {row['decode_us']:>10.1f}")
+    print()
+    print(f"{'turns':>5}  {'from_dict_us':>12} {'from_trusted_dict_us':>20}")
+    for row in rebuild(args.turns):
+        print(f"{row['turns']:>5}  {row['from_dict_us']:>12.1f} {row['from_trusted_dict_us']:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
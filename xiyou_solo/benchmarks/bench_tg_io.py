@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+from unittest import mock
+
+from xiyou_solo.core import rules
+from xiyou_solo.infra import session_store
+from xiyou_solo.llm.mock import MockProvider
+from xiyou_solo.services import tg_handler
+from xiyou_solo.services.telegram_state import ChatIndex
+from xiyou_solo.ui import bot_runner
+
+
+ONBOARDING = ["/start", "en", "/skip", "1", "Wukong"]
+PLAYING = ["inspect the cart tracks", "ask the tea seller", "search the ridge", "/status", "move on"]
+
+# File-system audit events (PEP 578) that map one-to-one onto open/rename/mkdir/unlink/listdir syscalls.
+_FS_EVENTS = {"open", "os.rename", "os.mkdir", "os.remove", "os.listdir", "os.scandir"}
+
+
+class IOCounter:
+    """Counts file-system syscalls on the current thread via one process-wide audit hook."""
+
+    _installed = False
+    _local = threading.local()
+
+    def __init__(self) -> None:
+        self.counts: Counter = Counter()
+        if not IOCounter._installed:
+            sys.addaudithook(IOCounter._hook)
+            IOCounter._installed = True
+
+    @staticmethod
+    def _hook(event: str, args: tuple) -> None:
+        counter = getattr(IOCounter._local, "active", None)
+        if counter is None or event not in _FS_EVENTS:
+            return
+        if event == "open":
+            mode = args[1] if len(args) > 1 and isinstance(args[1], str) else "r"
+            event = "open_write" if any(c in mode for c in "wax+") else "open_read"
+        counter.counts[event] += 1
+
+    @contextmanager
+    def counting(self) -> Iterator["IOCounter"]:
+        IOCounter._local.active = self
+        try:
+            yield self
+        finally:
+            IOCounter._local.active = None
+
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+
+@contextmanager
+def isolated_data_dir() -> Iterator[Path]:
+    """Point sessions and the chat index at a temp dir and replace the LLM with MockProvider."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        index = ChatIndex(root / "telegram_chats.sqlite3", legacy_path=None)
+        try:
+            with mock.patch.object(session_store, "SESSIONS_DIR", root / "sessions"), mock.patch.object(
+                tg_handler, "_CHAT_INDEX", index
+            ), mock.patch.object(bot_runner, "make_provider", lambda api_key=None: MockProvider()):
+                yield root
+        finally:
+            index.close()
+
+
+def run(play_messages: int) -> List[Dict[str, Any]]:
+    rules.set_seed(42)
+    rows: List[Dict[str, Any]] = []
+    with isolated_data_dir():
+        chat_id = 1001
+        script = [("onboarding", m) for m in ONBOARDING]
+        script += [("playing", PLAYING[i % len(PLAYING)]) for i in range(play_messages)]
+        for phase, text in script:
+            counter = IOCounter()
+            with counter.counting():
+                tg_handler.handle_chat_text(chat_id, text)
+            rows.append({"phase": phase, "text": text, "total": counter.total(), **counter.counts})
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="File-system syscalls per Telegram message")
+    parser.add_argument("--messages", type=int, default=10, help="playing-stage messages after onboarding")
+    args = parser.parse_args()
+    rows = run(args.messages)
+    cols = ["open_read", "open_write", "os.rename", "os.mkdir"]
+    print(f"{'phase':<11} {'message':<26} {'total':>5} " + " ".join(f"{c:>10}" for c in cols))
+    for row in rows:
+        print(f"{row['phase']:<11} {row['text'][:26]:<26} {row['total']:>5} " + " ".join(f"{row.get(c, 0):>10}" for c in cols))
+    for phase in ("onboarding", "playing"):
+        picked = [r["total"] for r in rows if r["phase"] == phase]
+        if picked:
+            print(f"mean syscalls per {phase} message: {sum(picked) / len(picked):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from xiyou_solo.llm import structured
+
+
+# Injectable faults: HTTP statuses, "timeout" (no answer until the client gives up) and "malformed" (broken JSON body).
+FAULTS = ("401", "402", "429", "500", "502", "503", "504", "timeout", "malformed")
+
+
+@dataclass
+class LatencyModel:
+    """Time to first token in ms: fixed, uniform in [base - spread, base + spread], or lognormal around base."""
+
+    kind: str = "fixed"
+    base_ms: float = 0.0
+    spread: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            return max(0.0, rng.uniform(self.base_ms - self.spread, self.base_ms + self.spread))
+        if self.kind == "lognormal" and self.base_ms > 0:
+            # spread is sigma of the underlying normal; base_ms is the median.
+            return self.base_ms * rng.lognormvariate(0.0, self.spread)
+        return self.base_ms
+
+
+@dataclass
+class FakeConfig:
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    # Completion tokens are "generated" at this rate after the first token; 0 means instantly.
+    tokens_per_sec: float = 0.0
+    completion_tokens: int = 60
+    # Probability per request of each fault in FAULTS.
+    fault_rates: Dict[str, float] = field(default_factory=dict)
+    retry_after_sec: Optional[float] = 1.0
+    # How long a "timeout" request hangs before the connection is dropped.
+    hang_sec: float = 30.0
+    seed: Optional[int] = None
+
+
+class FakeOpenRouter:
+    """
+    Local OpenAI-compatible chat completions server for offline load and
+    failure testing. Point OpenRouterProvider at it with
+    ``base_url=fake.base_url`` (or OPENROUTER_BASE_URL).
+
+    Replies follow the DM two-part format, or the structured shape when the
+    request carries response_format/tools; ``"stream": true`` is answered as
+    SSE chunks paced by ``tokens_per_sec``. Faults come from
+    ``config.fault_rates`` or, deterministically, from ``script`` (the next
+    requests' faults, "" for a normal reply).
+    """
+
+    def __init__(self, config: Optional[FakeConfig] = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.config = config or FakeConfig()
+        self.script: List[str] = []
+        self.requests: List[Dict[str, Any]] = []
+        self.statuses: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self._rng = random.Random(self.config.seed)
+        self._closing = threading.Event()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None) -> None:
+                fake._count(str(status))
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", "0"))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self._reply(400, json.dumps({"error": {"message": "invalid JSON"}}).encode("utf-8"))
+                    return
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._reply(404, json.dumps({"error": {"message": "not found"}}).encode("utf-8"))
+                    return
+                with fake.lock:
+                    fake.requests.append(payload)
+                fault = fake._next_fault()
+                if fault == "timeout":
+                    fake._count("timeout")
+                    fake._closing.wait(fake.config.hang_sec)
+                    self.close_connection = True
+                    return
+                if fault and fault != "malformed":
+                    code = int(fault)
+                    headers = {}
+                    if code == 429 and fake.config.retry_after_sec is not None:
+                        headers["Retry-After"] = f"{fake.config.retry_after_sec:g}"
+                    self._reply(code, json.dumps({"error": {"code": code, "message": f"injected {code}"}}).encode("utf-8"), headers)
+                    return
+                fake._wait(fake._sample_latency_ms() / 1000.0)
+                if payload.get("stream"):
+                    self._stream(payload, malformed=fault == "malformed")
+                    return
+                fake._wait(fake._generation_sec())
+                body = json.dumps(fake.completion(payload)).encode("utf-8")
+                if fault == "malformed":
+                    body = body[: len(body) // 2]
+                self._reply(200, body)
+
+            def _stream(self, payload: Dict[str, Any], malformed: bool) -> None:
+                fake._count("stream")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                completion = fake.completion(payload)
+                text = completion["choices"][0]["message"]["content"] or ""
+                pieces = fake._split(text)
+                per_piece = fake._generation_sec() / max(1, len(pieces))
+                try:
+                    for idx, piece in enumerate(pieces):
+                        chunk = {
+                            "id": completion["id"],
+                            "object": "chat.completion.chunk",
+                            "model": completion["model"],
+                            "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                        }
+                        line = json.dumps(chunk, ensure_ascii=False)
+                        if malformed and idx == len(pieces) // 2:
+                            line = line[: len(line) // 2]
+                        self.wfile.write(f"data: {line}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                        if idx < len(pieces) - 1:
+                            fake._wait(per_piece)
+                    done = {"id": completion["id"], "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": completion["usage"]}
+                    self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    fake._count("200")
+                except OSError:
+                    pass
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A003
+                return
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://{host}:{self.server.server_address[1]}/api/v1"
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "FakeOpenRouter":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._closing.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, name: str) -> None:
+        with self.lock:
+            self.statuses[name] = self.statuses.get(name, 0) + 1
+
+    def _wait(self, seconds: float) -> None:
+        if seconds > 0:
+            self._closing.wait(seconds)
+
+    def _next_fault(self) -> str:
+        with self.lock:
+            if self.script:
+                return self.script.pop(0)
+            roll = self._rng.random()
+        for fault in FAULTS:
+            roll -= float(self.config.fault_rates.get(fault, 0.0))
+            if roll < 0:
+                return fault
+        return ""
+
+    def _sample_latency_ms(self) -> float:
+        with self.lock:
+            return self.config.latency.sample(self._rng)
+
+    def _generation_sec(self) -> float:
+        rate = self.config.tokens_per_sec
+        return self.config.completion_tokens / rate if rate > 0 else 0.0
+
+    @staticmethod
+    def _split(text: str, size: int = 16) -> List[str]:
+        return [text[i : i + size] for i in range(0, len(text), size)] or [""]
+
+    def completion(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """A chat.completion object answering payload in the shape it asked for."""
+        messages = payload.get("messages") or [{}]
+        user = str(messages[-1].get("content", ""))
+        player_input = user.rsplit("[Player Input]", 1)[-1].strip() or "..."
+        narrative = f"The scene answers: {player_input}"
+        directive = {
+            "need_check": False,
+            "check": {"attribute": "Mind", "dc": 15, "reason": ""},
+            "enter_combat": False,
+            "offer_actions": ["Look around", "Move on"],
+        }
+        message: Dict[str, Any] = {"role": "assistant"}
+        turn = json.dumps({"narrative": narrative, "directive": directive}, ensure_ascii=False)
+        if payload.get("tools"):
+            message["content"] = None
+            message["tool_calls"] = [
+                {"id": "call_0", "type": "function", "function": {"name": structured.TOOL_NAME, "arguments": turn}}
+            ]
+        elif payload.get("response_format"):
+            message["content"] = turn
+        else:
+            message["content"] = f"{narrative}\n\n```json\n{json.dumps(directive, ensure_ascii=False)}\n```"
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        completion_tokens = self.config.completion_tokens
+        with self.lock:
+            served = len(self.requests)
+        return {
+            "id": f"fake-{served}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake/model"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"requests": len(self.requests), "responses": dict(self.statuses)}
+
+
+def parse_faults(spec: str) -> Dict[str, float]:
+    """"429=0.1,503=0.05,timeout=0.01" -> {"429": 0.1, ...}; unknown faults are rejected."""
+    rates: Dict[str, float] = {}
+    for part in spec.split(","):
+        name, _, rate = part.partition("=")
+        if not name.strip():
+            continue
+        if name.strip() not in FAULTS:
+            raise ValueError(f"unknown fault {name.strip()!r}; pick from {', '.join(FAULTS)}")
+        rates[name.strip()] = float(rate or 0)
+    return rates
+
+
+def add_config_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="first-token latency (median for lognormal)")
+    parser.add_argument("--spread", type=float, default=0.5, help="uniform half-width in ms, or lognormal sigma")
+    parser.add_argument("--tokens-per-sec", type=float, default=80.0)
+    parser.add_argument("--completion-tokens", type=int, default=120)
+    parser.add_argument("--faults", default="", help='e.g. "429=0.05,503=0.02,timeout=0.01,malformed=0.01"')
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--hang-sec", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeConfig:
+    return FakeConfig(
+        latency=LatencyModel(args.latency, args.latency_ms, args.spread),
+        tokens_per_sec=args.tokens_per_sec,
+        completion_tokens=args.completion_tokens,
+        fault_rates=parse_faults(args.faults),
+        retry_after_sec=args.retry_after,
+        hang_sec=args.hang_sec,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local fake OpenRouter (OpenAI-compatible) server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    add_config_args(parser)
+    args = parser.parse_args()
+    fake = FakeOpenRouter(config_from_args(args), host=args.host, port=args.port)
+    print(f"fake OpenRouter on {fake.base_url} (export OPENROUTER_BASE_URL={fake.base_url})")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.stop()
+        print(json.dumps(fake.stats()))
+
+
+if __name__ == "__main__":
+    main()
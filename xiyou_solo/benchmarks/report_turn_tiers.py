@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Any, Dict
+
+from xiyou_solo.infra import session_store
+from xiyou_solo.infra.session_store import SessionStore
+from xiyou_solo.llm.base import LLMCallResult
+from xiyou_solo.llm.tiers import TierReport
+
+
+def report_sessions(sessions_dir: Path) -> Dict[str, Any]:
+    """Rebuild the per-tier report from saved session logs (turns logged with a tier only)."""
+    store = SessionStore(sessions_dir)
+    report = TierReport()
+    for row in store.list_sessions():
+        for ev in store.load_log(row["session_id"]).get("events", []):
+            meta = ev.get("meta", {}) if isinstance(ev, dict) else {}
+            if ev.get("type") != "dm_narrative" or not meta.get("tier"):
+                continue
+            result = LLMCallResult(
+                narrative="",
+                directive={},
+                raw_text="",
+                latency_ms=int(meta.get("latency_ms") or 0),
+                tokens=meta.get("tokens") if isinstance(meta.get("tokens"), int) else None,
+                model=meta.get("model"),
+            )
+            report.record(str(meta["tier"]), str(meta.get("turn_class", "")), result)
+    return report.snapshot()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-tier turn latency and token usage from session logs")
+    parser.add_argument("--sessions", type=Path, default=session_store.SESSIONS_DIR)
+    args = parser.parse_args()
+    rows = report_sessions(args.sessions)
+    print(f"{'tier':<8} {'turns':>6} {'tokens/turn':>12} {'p50_ms':>8} {'p95_ms':>8}  classes / models")
+    for tier, row in sorted(rows.items()):
+        lat = row["latency_ms"]
+        print(
+            f"{tier:<8} {row['turns']:>6} {row['tokens_per_turn']:>12.1f} {lat['p50']:>8.0f} {lat['p95']:>8.0f}  "
+            f"{row['classes']} {row['models']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
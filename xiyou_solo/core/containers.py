@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List
+
+
+class Inventory:
+    """
+    Counter-backed item bag; iterates like the list it replaces (one entry
+    per unit, in the order the units were added). Equality ignores order.
+    """
+
+    __slots__ = ("_counts", "_order")
+
+    def __init__(self, items: Iterable[str] = ()):
+        self._counts: Counter = Counter()
+        self._order: List[str] = []
+        for item in items:
+            self.add(item)
+
+    def add(self, item: str, qty: int = 1) -> None:
+        if qty > 0:
+            key = str(item)
+            self._counts[key] += int(qty)
+            self._order.extend([key] * int(qty))
+
+    def append(self, item: str) -> None:
+        self.add(item)
+
+    def extend(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.add(item)
+
+    def discard(self, item: str, qty: int = 1) -> bool:
+        have = self._counts.get(item, 0)
+        if have <= 0:
+            return False
+        take = min(have, max(1, int(qty)))
+        if take < have:
+            self._counts[item] = have - take
+        else:
+            del self._counts[item]
+        # Like list.remove: the earliest units go first.
+        for _ in range(take):
+            self._order.remove(item)
+        return True
+
+    def remove(self, item: str) -> None:
+        if not self.discard(item):
+            raise ValueError(f"{item!r} not in inventory")
+
+    def count(self, item: str) -> int:
+        return self._counts.get(item, 0)
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self._counts)
+
+    def to_list(self) -> List[str]:
+        return list(self._order)
+
+    def __contains__(self, item: object) -> bool:
+        return self._counts.get(item, 0) > 0  # type: ignore[call-overload]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._order))
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Inventory):
+            return self._counts == other._counts
+        if isinstance(other, (list, tuple)):
+            return self._counts == Counter(str(x) for x in other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(self.to_list())
+
+
+MAX_FLAGS = 256
+MAX_FLAG_LEN = 96
+
+
+def flag_namespace(flag: str) -> str:
+    head, sep, _ = flag.partition(":")
+    return head if sep else ""
+
+
+class FlagStore:
+    """Ordered, deduplicated world-flag set with a namespace index.
+
+    ``clue:<title>``, ``scene:<id>``, ``npc:<id>`` ... are indexed by the part
+    before the first ``:`` so namespace listings never scan unrelated flags.
+    The store is bounded: past ``limit`` the oldest namespaced flag is
+    evicted; bare flags such as ``finale`` are never evicted, so a store
+    full of them refuses new namespaced flags (a new bare flag still goes in).
+    """
+
+    __slots__ = ("_items", "_by_ns", "_limit")
+
+    def __init__(self, flags: Iterable[str] = (), limit: int = MAX_FLAGS):
+        self._items: Dict[str, None] = {}
+        self._by_ns: Dict[str, Dict[str, None]] = {}
+        self._limit = max(1, int(limit))
+        for flag in flags:
+            self.add(flag)
+
+    @staticmethod
+    def normalize(flag: Any) -> str:
+        return " ".join(str(flag).split())[:MAX_FLAG_LEN]
+
+    def add(self, flag: str) -> bool:
+        key = self.normalize(flag)
+        if not key or key in self._items:
+            return False
+        if len(self._items) >= self._limit and not self._evict_one() and flag_namespace(key):
+            # Only bare flags left: they are never evicted, so the new namespaced flag is dropped.
+            return False
+        self._items[key] = None
+        self._by_ns.setdefault(flag_namespace(key), {})[key] = None
+        return True
+
+    def append(self, flag: str) -> None:
+        self.add(flag)
+
+    def discard(self, flag: str) -> bool:
+        key = self.normalize(flag)
+        if key not in self._items:
+            return False
+        self._drop(key)
+        return True
+
+    def _drop(self, key: str) -> None:
+        del self._items[key]
+        ns = flag_namespace(key)
+        bucket = self._by_ns.get(ns)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._by_ns[ns]
+
+    def _evict_one(self) -> bool:
+        for flag in self._items:
+            if flag_namespace(flag):
+                self._drop(flag)
+                return True
+        return False
+
+    def namespace(self, ns: str) -> List[str]:
+        return list(self._by_ns.get(ns, ()))
+
+    def values(self, ns: str) -> List[str]:
+        cut = len(ns) + 1
+        return [flag[cut:] for flag in self._by_ns.get(ns, ())]
+
+    def with_prefix(self, prefix: str) -> List[str]:
+        ns = flag_namespace(prefix)
+        if not ns:
+            return [flag for flag in self._items if flag.startswith(prefix)]
+        if prefix == f"{ns}:":
+            return self.namespace(ns)
+        return [flag for flag in self._by_ns.get(ns, ()) if flag.startswith(prefix)]
+
+    def namespaces(self) -> List[str]:
+        return [ns for ns in self._by_ns if ns]
+
+    def to_list(self) -> List[str]:
+        return list(self._items)
+
+    def __contains__(self, flag: object) -> bool:
+        return self.normalize(flag) in self._items
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, FlagStore):
+            return list(self._items) == list(other._items)
+        if isinstance(other, (list, tuple)):
+            return list(self._items) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(self.to_list())
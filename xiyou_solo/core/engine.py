@@ -3,12 +3,20 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Any, Dict, Optional
 
-from xiyou_solo.core import combat, rules
+from xiyou_solo.core import combat, pacing, rules
+from xiyou_solo.core.containers import flag_namespace
 from xiyou_solo.core.state import GameState
+from xiyou_solo.core.turn_class import COMBAT_ROUND, ROUTINE, classify_turn
 from xiyou_solo.llm.base import LLMProvider
+from xiyou_solo.llm.tiers import record_turn
 
 
 ATTR_MAP = {"Body": "body", "Mind": "wit", "Spirit": "spirit", "Luck": "luck"}
+# Flags in these namespaces describe the provider call, not the world.
+TRANSIENT_FLAG_NAMESPACES = {"provider"}
+MAX_FLAGS_PER_TURN = 8
+MAX_NPC_CHANGES_PER_TURN = 6
+MAX_CONTEXT_NPCS = 6
 
 
 @dataclass
@@ -19,14 +27,22 @@ class TurnResult:
     outcome: Optional[str]
     latency_ms: int
     tokens: Optional[int]
+    turn_class: str = ROUTINE
+    # Provider failure kind of the LLM call behind this turn, if it failed.
+    error: Optional[str] = None
 
 
 class GameEngine:
     def __init__(self, provider: LLMProvider):
         self.provider = provider
 
+    def _provider_for(self, turn_class: str) -> LLMProvider:
+        hook = getattr(self.provider, "for_turn_class", None)
+        return hook(turn_class) if callable(hook) else self.provider
+
     def build_context(self, state: GameState, log_data: Dict[str, Any], recent_n: int = 8) -> str:
         recent = log_data.get("events", [])[-recent_n:]
+        upcoming = ", ".join(f"{ev['kind']}@{ev['due']}" for ev in state.clock.upcoming()) or "none"
         lines = [
             f"language: {state.language}",
             f"session_id: {state.session_id}",
@@ -36,29 +52,75 @@ class GameEngine:
             f"goal: {state.current_goal.get(state.language, state.current_goal.get('zh', ''))}",
             f"location: {state.location.get(state.language, state.location.get('zh', ''))}",
             f"turn: {state.turn}",
+            f"clock: {state.clock.now}",
+            f"upcoming: {upcoming}",
             f"progress: {state.progress}",
             f"threat_level: {state.threat_level}",
             f"hp: {state.hp}/{state.max_hp}",
             f"gold: {state.gold}",
             f"inventory: {state.inventory}",
-            "recent_events:",
+            f"flags: {state.flags.namespace('')}",
+            f"clues: {state.flags.values('clue')}",
+            f"scene_flags: {state.flags.values('scene')}",
+            "npcs_here:",
         ]
+        for npc in state.npcs.at_location(state.location_id)[-MAX_CONTEXT_NPCS:]:
+            notes = f" ({'; '.join(npc.notes)})" if npc.notes else ""
+            lines.append(f"- {npc.npc_id} {npc.name or npc.npc_id}: {npc.attitude_label}{notes}")
+        lines.append("recent_events:")
         for ev in recent:
             lines.append(f"- [{ev.get('type', 'unknown')}] {ev.get('content', '')}")
         return "\n".join(lines)
 
     def _apply_state_dict(self, state: GameState, payload: Dict[str, Any]) -> None:
         updated = GameState.from_dict(payload)
-        state.__dict__.update(updated.__dict__)
+        state.update_from(updated)
 
     def _advance_fast15_threat(self, state: GameState) -> None:
-        state.threat = max(0, int(getattr(state, "threat", 0)) + 1)
-        if state.threat >= 6 and "finale" not in state.flags:
-            state.flags.append("finale")
+        pacing_rules = pacing.load_pacing_rules(state.mode)
+        state.threat = max(0, int(getattr(state, "threat", 0)) + int(pacing_rules["threat_per_turn"]))
+        if state.threat >= int(pacing_rules["finale_threat"]) and "finale" not in state.flags:
+            state.flags.add("finale")
+
+    def _tick_world(self, state: GameState, log_data: Dict[str, Any], clock_delta: Any) -> None:
+        pacing_rules = pacing.load_pacing_rules(state.mode)
+        pacing.seed_clock(state.clock, pacing_rules)
+        try:
+            delta = int(clock_delta)
+        except (TypeError, ValueError):
+            delta = 1
+        delta = max(0, min(int(pacing_rules["max_clock_delta"]), delta))
+        for event in state.clock.advance(delta):
+            effects = event.get("effects", {})
+            state.threat = max(0, state.threat + int(effects.get("threat_delta", 0)))
+            state.threat_level = max(0, min(9, state.threat_level + int(effects.get("threat_level_delta", 0))))
+            self._apply_flags(state, effects.get("add_flags", []), allow_bare=True)
+            for flag in effects.get("remove_flags", []) or []:
+                state.flags.discard(str(flag))
+            log_data["events"].append(
+                {"type": "world_event", "content": str(effects.get("note", "") or event.get("kind", "")), "meta": event}
+            )
+
+    def _apply_flags(self, state: GameState, raw_flags: Any, allow_bare: bool = False) -> None:
+        if not isinstance(raw_flags, list):
+            return
+        for raw in raw_flags[:MAX_FLAGS_PER_TURN]:
+            flag = state.flags.normalize(raw)
+            # Bare flags ("finale", ...) drive pacing: world events may set them, the DM's directive may not.
+            ns = flag_namespace(flag)
+            if flag and (ns or allow_bare) and ns not in TRANSIENT_FLAG_NAMESPACES:
+                state.flags.add(flag)
+
+    def _apply_npc_changes(self, state: GameState, changes: Any) -> None:
+        if not isinstance(changes, list):
+            return
+        for change in changes[:MAX_NPC_CHANGES_PER_TURN]:
+            state.npcs.apply_change(change, turn=state.turn, location_id=state.location_id)
 
     def run_turn(self, state: GameState, log_data: Dict[str, Any], player_input: str, dm_system: str) -> TurnResult:
         log_data.setdefault("session_id", state.session_id)
         log_data.setdefault("events", [])
+        pacing.seed_clock(state.clock, pacing.load_pacing_rules(state.mode))
 
         state_dict = state.to_dict()
         if combat.is_combat_active(state_dict):
@@ -67,6 +129,7 @@ class GameEngine:
             if not combat.is_combat_active(state_dict):
                 combat.finalize_combat(state_dict)
             self._apply_state_dict(state, state_dict)
+            self._tick_world(state, log_data, 1)
             self._advance_fast15_threat(state)
 
             text = combat.get_combat_prompt(state.to_dict())
@@ -85,11 +148,15 @@ class GameEngine:
             }
             log_data["events"].append({"type": "combat_round", "content": player_input, "meta": {"action": action}})
             log_data["events"].append({"type": "dm_narrative", "content": text, "meta": {"directive": directive, "combat": True}})
-            return TurnResult(narrative=text, directive=directive, check_result=None, outcome=None, latency_ms=0, tokens=None)
+            return TurnResult(
+                narrative=text, directive=directive, check_result=None, outcome=None, latency_ms=0, tokens=None, turn_class=COMBAT_ROUND
+            )
 
+        turn_class = classify_turn(state, player_input)
         state.turn += 1
         dm_context = self.build_context(state, log_data)
-        llm_result = self.provider.generate(dm_system, dm_context, player_input)
+        llm_result = self._provider_for(turn_class).generate(dm_system, dm_context, player_input)
+        tier = record_turn(turn_class, llm_result)
         log_data["events"].append({"type": "action", "content": player_input, "meta": {}})
         directive = llm_result.directive if isinstance(llm_result.directive, dict) else {}
 
@@ -111,11 +178,15 @@ class GameEngine:
             clue = directive.get("clue", {}) if isinstance(directive.get("clue"), dict) else {}
             title = str(clue.get("title", "")).strip()
             if title:
-                state.flags.append(f"clue:{title}")
+                state.flags.add(f"clue:{title}")
+
+        self._apply_flags(state, directive.get("flags_to_add", []))
+        self._apply_npc_changes(state, directive.get("npc_attitude_changes", []))
 
         wt = directive.get("world_tick", {}) if isinstance(directive.get("world_tick"), dict) else {}
         threat_delta = int(wt.get("threat_delta", 0))
         state.threat_level = max(0, min(9, state.threat_level + threat_delta))
+        self._tick_world(state, log_data, wt.get("clock_delta", 1))
 
         if bool(directive.get("enter_combat", False)):
             c = directive.get("combat", {}) if isinstance(directive.get("combat"), dict) else {}
@@ -132,7 +203,14 @@ class GameEngine:
             {
                 "type": "dm_narrative",
                 "content": llm_result.narrative,
-                "meta": {"directive": directive, "latency_ms": llm_result.latency_ms, "tokens": llm_result.tokens},
+                "meta": {
+                    "directive": directive,
+                    "latency_ms": llm_result.latency_ms,
+                    "tokens": llm_result.tokens,
+                    "turn_class": turn_class,
+                    "tier": tier,
+                    "model": llm_result.model,
+                },
             }
         )
         if check_result is not None:
@@ -145,4 +223,6 @@ class GameEngine:
             outcome=outcome,
             latency_ms=llm_result.latency_ms,
             tokens=llm_result.tokens,
+            turn_class=turn_class,
+            error=llm_result.error,
         )
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict
+
+from xiyou_solo.core.world import WorldClock
+
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+PACING_RULES_PATH = BASE_DIR / "data" / "pacing_rules.json"
+
+
+def _default_pacing_rules() -> Dict[str, Any]:
+    return {
+        "fast15": {
+            "threat_per_turn": 1,
+            "finale_threat": 6,
+            "max_clock_delta": 6,
+            "events": [],
+        }
+    }
+
+
+@lru_cache(maxsize=1)
+def _pacing_file() -> Dict[str, Any]:
+    if not PACING_RULES_PATH.exists():
+        return {}
+    try:
+        raw = json.loads(PACING_RULES_PATH.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return raw if isinstance(raw, dict) else {}
+
+
+def load_pacing_rules(mode: str = "fast15") -> Dict[str, Any]:
+    rules = dict(_default_pacing_rules()["fast15"])
+    raw = _pacing_file()
+    picked = raw.get(mode) or raw.get("fast15")
+    if isinstance(picked, dict):
+        rules.update(picked)
+    return rules
+
+
+def seed_clock(clock: WorldClock, rules: Dict[str, Any]) -> None:
+    """Schedule the rule set's timed events once per session."""
+    if clock.seeded:
+        return
+    events = rules.get("events", [])
+    for ev in events if isinstance(events, list) else []:
+        if not isinstance(ev, dict):
+            continue
+        try:
+            at = int(ev.get("at", 0))
+            every = int(ev.get("repeat_every", 0))
+        except (TypeError, ValueError):
+            continue
+        effects = ev.get("effects", {})
+        clock.schedule(
+            str(ev.get("kind", "event")),
+            max(0, at - clock.now),
+            effects if isinstance(effects, dict) else {},
+            event_id=str(ev.get("id", "")),
+            repeat_every=every,
+        )
+    clock.seeded = True
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from typing import Dict
+
+from xiyou_solo.core.text_table import intern_text
+
+
+SCENARIOS: Dict[str, Dict[str, Dict[str, str]]] = {
+    "huangfeng": {
+        "title": {"zh": "黄风岭迷雾", "en": "Mist of Huangfeng Ridge"},
+        "goal": {"zh": "找出真路并护送药材通过山口", "en": "Find the true route and escort medicine through the pass"},
+        "location": {"zh": "黄风岭前哨", "en": "Huangfeng Outpost"},
+    },
+    "baigu": {
+        "title": {"zh": "白骨疑影", "en": "Shadows at White Bone Ridge"},
+        "goal": {"zh": "辨明身份并避免误伤无辜", "en": "Identify the truth and avoid harming innocents"},
+        "location": {"zh": "白骨岭驿站", "en": "White Bone Ridge Post"},
+    },
+    "huoyan": {
+        "title": {"zh": "火焰山借扇", "en": "Borrow the Fan at Flame Mountain"},
+        "goal": {"zh": "借来宝扇缓解热浪", "en": "Borrow the fan to ease the heatwave"},
+        "location": {"zh": "火焰山脚", "en": "Foot of Flame Mountain"},
+    },
+}
+
+SCENARIO_ORDER = ["huangfeng", "baigu", "huoyan"]
+
+# scenario_id -> {"title"|"goal"|"location": text id}
+SCENARIO_TEXT_IDS: Dict[str, Dict[str, int]] = {
+    sid: {part: intern_text(text) for part, text in sc.items()} for sid, sc in SCENARIOS.items()
+}
@@ -1,10 +1,23 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Mapping, Optional
 
+from xiyou_solo.core.containers import FlagStore, Inventory
+from xiyou_solo.core.text_table import get_text, intern_text
+from xiyou_solo.core.world import NpcTable, WorldClock
 
-@dataclass
+
+DEFAULT_LOCATION = {"zh": "路边茶摊", "en": "Roadside Tea Stall"}
+DEFAULT_QUEST_TITLE = {"zh": "旅途初章", "en": "First Chapter"}
+DEFAULT_CURRENT_GOAL = {"zh": "观察局势并收集线索", "en": "Observe and collect clues"}
+
+DEFAULT_LOCATION_ID = intern_text(DEFAULT_LOCATION)
+DEFAULT_QUEST_TITLE_ID = intern_text(DEFAULT_QUEST_TITLE)
+DEFAULT_CURRENT_GOAL_ID = intern_text(DEFAULT_CURRENT_GOAL)
+
+
+@dataclass(slots=True)
 class GameState:
     session_id: str
     player_id: Optional[str] = None
@@ -18,15 +31,52 @@ class GameState:
     hp: int = 12
     max_hp: int = 12
     gold: int = 50
-    inventory: List[str] = field(default_factory=list)
-    location: Dict[str, str] = field(default_factory=lambda: {"zh": "路边茶摊", "en": "Roadside Tea Stall"})
-    quest_title: Dict[str, str] = field(default_factory=lambda: {"zh": "旅途初章", "en": "First Chapter"})
-    current_goal: Dict[str, str] = field(default_factory=lambda: {"zh": "观察局势并收集线索", "en": "Observe and collect clues"})
+    inventory: Inventory = field(default_factory=Inventory)
+    location_id: int = DEFAULT_LOCATION_ID
+    quest_title_id: int = DEFAULT_QUEST_TITLE_ID
+    current_goal_id: int = DEFAULT_CURRENT_GOAL_ID
     turn: int = 0
     progress: int = 0
     threat_level: int = 1
-    flags: List[str] = field(default_factory=list)
+    flags: FlagStore = field(default_factory=FlagStore)
     combat_state: Dict[str, Any] = field(default_factory=dict)
+    npcs: NpcTable = field(default_factory=NpcTable)
+    clock: WorldClock = field(default_factory=WorldClock)
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.inventory, Inventory):
+            self.inventory = Inventory(self.inventory)
+        if not isinstance(self.flags, FlagStore):
+            self.flags = FlagStore(self.flags)
+
+    # Localized texts live in the shared text table; states only keep the id.
+    @property
+    def location(self) -> Mapping[str, str]:
+        return get_text(self.location_id)
+
+    @location.setter
+    def location(self, value: Mapping[str, str]) -> None:
+        self.location_id = intern_text(value)
+
+    @property
+    def quest_title(self) -> Mapping[str, str]:
+        return get_text(self.quest_title_id)
+
+    @quest_title.setter
+    def quest_title(self, value: Mapping[str, str]) -> None:
+        self.quest_title_id = intern_text(value)
+
+    @property
+    def current_goal(self) -> Mapping[str, str]:
+        return get_text(self.current_goal_id)
+
+    @current_goal.setter
+    def current_goal(self, value: Mapping[str, str]) -> None:
+        self.current_goal_id = intern_text(value)
+
+    def update_from(self, other: "GameState") -> None:
+        for f in fields(self):
+            setattr(self, f.name, getattr(other, f.name))
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -43,7 +93,7 @@ class GameState:
                 "hp": int(self.hp),
                 "max_hp": int(self.max_hp),
                 "gold": int(self.gold),
-                "inventory": list(self.inventory),
+                "inventory": self.inventory.to_list(),
             },
             "story": {
                 "location": dict(self.location),
@@ -52,15 +102,17 @@ class GameState:
                 "turn": int(self.turn),
                 "progress": int(self.progress),
                 "threat_level": int(self.threat_level),
-                "flags": list(self.flags),
+                "flags": self.flags.to_list(),
             },
             "combat_state": dict(self.combat_state) if isinstance(self.combat_state, dict) else {},
+            "world": {"npcs": self.npcs.to_list(), "clock": self.clock.to_dict()},
         }
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "GameState":
         player = data.get("player", {}) if isinstance(data.get("player"), dict) else {}
         story = data.get("story", {}) if isinstance(data.get("story"), dict) else {}
+        world = data.get("world", {}) if isinstance(data.get("world"), dict) else {}
         raw_stats = player.get("stats", {})
         stats = {"body": 10, "wit": 10, "spirit": 10, "luck": 10}
         if isinstance(raw_stats, dict):
@@ -77,7 +129,7 @@ class GameState:
 
         return cls(
             session_id=str(data.get("session_id", "")).strip(),
-            player_id=(str(data.get("player_id", "")).strip() or None),
+            player_id=(str(data.get("player_id") or "").strip() or None),
             language=str(data.get("language", "zh")),
             mode=mode,
             threat=max(0, threat),
@@ -88,23 +140,59 @@ class GameState:
             hp=int(player.get("hp", 12)),
             max_hp=int(player.get("max_hp", 12)),
             gold=int(player.get("gold", 50)),
-            inventory=[str(x) for x in player.get("inventory", [])] if isinstance(player.get("inventory", []), list) else [],
-            location=story.get("location", {"zh": "路边茶摊", "en": "Roadside Tea Stall"})
-            if isinstance(story.get("location"), dict)
-            else {"zh": "路边茶摊", "en": "Roadside Tea Stall"},
-            quest_title=story.get("quest_title", {"zh": "旅途初章", "en": "First Chapter"})
-            if isinstance(story.get("quest_title"), dict)
-            else {"zh": "旅途初章", "en": "First Chapter"},
-            current_goal=story.get("current_goal", {"zh": "观察局势并收集线索", "en": "Observe and collect clues"})
-            if isinstance(story.get("current_goal"), dict)
-            else {"zh": "观察局势并收集线索", "en": "Observe and collect clues"},
+            inventory=Inventory(str(x) for x in player.get("inventory", []))
+            if isinstance(player.get("inventory", []), list)
+            else Inventory(),
+            location_id=_text_id(story.get("location"), DEFAULT_LOCATION_ID),
+            quest_title_id=_text_id(story.get("quest_title"), DEFAULT_QUEST_TITLE_ID),
+            current_goal_id=_text_id(story.get("current_goal"), DEFAULT_CURRENT_GOAL_ID),
             turn=int(story.get("turn", 0)),
             progress=int(story.get("progress", 0)),
             threat_level=int(story.get("threat_level", 1)),
-            flags=[str(x) for x in story.get("flags", [])] if isinstance(story.get("flags", []), list) else [],
+            flags=FlagStore(str(x) for x in story.get("flags", [])) if isinstance(story.get("flags", []), list) else FlagStore(),
             combat_state=data.get("combat_state", {}) if isinstance(data.get("combat_state"), dict) else {},
+            npcs=NpcTable.from_list(world.get("npcs", [])),
+            clock=WorldClock.from_dict(world.get("clock")),
         )
 
+    @classmethod
+    def from_trusted_dict(cls, data: Dict[str, Any]) -> "GameState":
+        """Rebuild from a document this codebase wrote itself (current schema); skips the type coercion in ``from_dict``."""
+        try:
+            player = data["player"]
+            story = data["story"]
+            return cls(
+                session_id=data["session_id"],
+                player_id=data.get("player_id"),
+                language=data["language"],
+                mode=data["mode"],
+                threat=data["threat"],
+                player_name=player["name"],
+                race_id=player["race_id"],
+                class_id=player["class_id"],
+                stats=dict(player["stats"]),
+                hp=player["hp"],
+                max_hp=player["max_hp"],
+                gold=player["gold"],
+                inventory=Inventory(player["inventory"]),
+                location_id=intern_text(story["location"]),
+                quest_title_id=intern_text(story["quest_title"]),
+                current_goal_id=intern_text(story["current_goal"]),
+                turn=story["turn"],
+                progress=story["progress"],
+                threat_level=story["threat_level"],
+                flags=FlagStore(story["flags"]),
+                combat_state=dict(data.get("combat_state") or {}),
+                npcs=NpcTable.from_list(data["world"]["npcs"]),
+                clock=WorldClock.from_dict(data["world"]["clock"]),
+            )
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return cls.from_dict(data)
+
+
+def _text_id(raw: Any, default_id: int) -> int:
+    return intern_text(raw) if isinstance(raw, dict) else default_id
+
 
 def new_game_state(session_id: str, player_id: Optional[str] = None, language: str = "zh") -> GameState:
     return GameState(
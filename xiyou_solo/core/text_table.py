@@ -0,0 +1,37 @@
+"""Process-wide table of interned localized strings (``{"zh": ..., "en": ...}``).
+
+Sessions reference entries by integer id so thousands of cached states share
+one read-only mapping per distinct text instead of each holding its own dict.
+"""
+from __future__ import annotations
+
+import threading
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Tuple
+
+
+_LOCK = threading.Lock()
+_IDS: Dict[Tuple[Tuple[str, str], ...], int] = {}
+_ENTRIES: List[Mapping[str, str]] = []
+
+
+def intern_text(value: Mapping[str, Any]) -> int:
+    key = tuple(sorted((str(k), str(v)) for k, v in value.items()))
+    text_id = _IDS.get(key)
+    if text_id is not None:
+        return text_id
+    with _LOCK:
+        text_id = _IDS.get(key)
+        if text_id is None:
+            text_id = len(_ENTRIES)
+            _ENTRIES.append(MappingProxyType(dict(key)))
+            _IDS[key] = text_id
+    return text_id
+
+
+def get_text(text_id: int) -> Mapping[str, str]:
+    return _ENTRIES[text_id]
+
+
+def table_size() -> int:
+    return len(_ENTRIES)
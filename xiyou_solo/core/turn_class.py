@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from xiyou_solo.core import pacing
+from xiyou_solo.core.state import GameState
+
+
+ROUTINE = "routine"
+CHECK_HEAVY = "check_heavy"
+COMBAT_ENTRY = "combat_entry"
+FINALE = "finale"
+TURN_CLASSES = (ROUTINE, CHECK_HEAVY, COMBAT_ENTRY, FINALE)
+# Rounds of an active fight are resolved by the rules engine without an LLM call.
+COMBAT_ROUND = "combat_round"
+
+COMBAT_WORDS = ("fight", "battle", "combat", "attack", "ambush", "duel", "战斗", "开打", "攻击", "动手", "迎战")
+CHECK_WORDS = (
+    "inspect", "check", "search", "investigate", "examine", "track", "decipher", "sneak", "persuade",
+    "调查", "观察", "搜索", "检查", "追踪", "辨认", "潜行", "说服",
+)
+# Threat level at which the DM is expected to call for checks even on plain moves.
+CHECK_HEAVY_THREAT = 5
+
+
+def classify_turn(state: GameState, player_input: str) -> str:
+    """Pick the turn class from the state and the raw input; cheap enough to run before every LLM call."""
+    rules = pacing.load_pacing_rules(state.mode)
+    if "finale" in state.flags or int(state.threat) >= int(rules["finale_threat"]):
+        return FINALE
+    text = (player_input or "").lower()
+    if any(word in text for word in COMBAT_WORDS):
+        return COMBAT_ENTRY
+    if any(word in text for word in CHECK_WORDS) or int(state.threat_level) >= CHECK_HEAVY_THREAT:
+        return CHECK_HEAVY
+    return ROUTINE
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import heapq
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from xiyou_solo.core.text_table import get_text, intern_text
+
+
+ATTITUDES = ["hostile", "unfriendly", "neutral", "friendly", "allied"]
+MAX_NPCS = 64
+MAX_NPC_NOTES = 3
+MAX_NOTE_LEN = 120
+
+
+def _attitude_score(label: str) -> Optional[int]:
+    try:
+        return ATTITUDES.index(label.strip().lower()) - 2
+    except ValueError:
+        return None
+
+
+def normalize_npc_id(raw: Any) -> str:
+    return re.sub(r"[^0-9a-z_\-\u4e00-\u9fff]+", "_", str(raw).strip().lower()).strip("_")[:48]
+
+
+@dataclass(slots=True)
+class NpcRecord:
+    npc_id: str
+    name: str = ""
+    attitude: int = 0
+    location_id: Optional[int] = None
+    last_seen_turn: int = 0
+    notes: List[str] = field(default_factory=list)
+
+    @property
+    def attitude_label(self) -> str:
+        return ATTITUDES[self.attitude + 2]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "npc_id": self.npc_id,
+            "name": self.name,
+            "attitude": self.attitude_label,
+            "location": dict(get_text(self.location_id)) if self.location_id is not None else None,
+            "last_seen_turn": self.last_seen_turn,
+            "notes": list(self.notes),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> Optional["NpcRecord"]:
+        npc_id = normalize_npc_id(data.get("npc_id", ""))
+        if not npc_id:
+            return None
+        score = _attitude_score(str(data.get("attitude", "neutral")))
+        location = data.get("location")
+        notes = data.get("notes", [])
+        try:
+            last_seen = int(data.get("last_seen_turn", 0))
+        except (TypeError, ValueError):
+            last_seen = 0
+        return cls(
+            npc_id=npc_id,
+            name=str(data.get("name", ""))[:48],
+            attitude=score if score is not None else 0,
+            location_id=intern_text(location) if isinstance(location, dict) else None,
+            last_seen_turn=last_seen,
+            notes=[str(n)[:MAX_NOTE_LEN] for n in notes][-MAX_NPC_NOTES:] if isinstance(notes, list) else [],
+        )
+
+
+class NpcTable:
+    """Per-session NPC world state, indexed by npc id and by last-seen location."""
+
+    __slots__ = ("_by_id", "_by_location")
+
+    def __init__(self, records: Iterable[NpcRecord] = ()):
+        self._by_id: Dict[str, NpcRecord] = {}
+        self._by_location: Dict[Optional[int], Dict[str, None]] = {}
+        for rec in records:
+            self._put(rec)
+
+    def _put(self, rec: NpcRecord) -> None:
+        old = self._by_id.pop(rec.npc_id, None)
+        if old is not None:
+            self._unindex(old)
+        elif len(self._by_id) >= MAX_NPCS:
+            stalest = min(self._by_id.values(), key=lambda r: r.last_seen_turn)
+            self._by_id.pop(stalest.npc_id)
+            self._unindex(stalest)
+        self._by_id[rec.npc_id] = rec
+        self._by_location.setdefault(rec.location_id, {})[rec.npc_id] = None
+
+    def _unindex(self, rec: NpcRecord) -> None:
+        bucket = self._by_location.get(rec.location_id)
+        if bucket is not None:
+            bucket.pop(rec.npc_id, None)
+            if not bucket:
+                del self._by_location[rec.location_id]
+
+    def get(self, npc_id: str) -> Optional[NpcRecord]:
+        return self._by_id.get(normalize_npc_id(npc_id))
+
+    def at_location(self, location_id: int) -> List[NpcRecord]:
+        return [self._by_id[npc_id] for npc_id in self._by_location.get(location_id, ())]
+
+    def apply_change(self, change: Any, turn: int, location_id: int) -> Optional[NpcRecord]:
+        """Apply one directive ``npc_attitude_changes`` entry; invalid entries are ignored."""
+        if not isinstance(change, dict):
+            return None
+        npc_id = normalize_npc_id(change.get("npc_id") or change.get("name") or "")
+        if not npc_id:
+            return None
+        current = self._by_id.get(npc_id)
+        rec = NpcRecord(npc_id=npc_id) if current is None else current
+        name = str(change.get("name", "")).strip()[:48]
+        if name:
+            rec.name = name
+        target = _attitude_score(str(change.get("set_to", "")))
+        if target is not None:
+            rec.attitude = target
+        else:
+            try:
+                delta = max(-2, min(2, int(change.get("delta", 0))))
+            except (TypeError, ValueError):
+                delta = 0
+            rec.attitude = max(-2, min(2, rec.attitude + delta))
+        reason = " ".join(str(change.get("reason", "")).split())[:MAX_NOTE_LEN]
+        if reason:
+            rec.notes = (rec.notes + [reason])[-MAX_NPC_NOTES:]
+        rec.last_seen_turn = int(turn)
+        if current is not None:
+            self._unindex(current)
+            del self._by_id[npc_id]
+        rec.location_id = location_id
+        self._put(rec)
+        return rec
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [rec.to_dict() for rec in self._by_id.values()]
+
+    @classmethod
+    def from_list(cls, rows: Any) -> "NpcTable":
+        if not isinstance(rows, list):
+            return cls()
+        records = [NpcRecord.from_dict(row) for row in rows if isinstance(row, dict)]
+        return cls(rec for rec in records if rec is not None)
+
+    def __contains__(self, npc_id: object) -> bool:
+        return npc_id in self._by_id
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, NpcTable):
+            return self.to_list() == other.to_list()
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"NpcTable({sorted(self._by_id)})"
+
+
+class WorldClock:
+    """Session world clock with a min-heap of scheduled events.
+
+    Events are ``{"id", "kind", "due", "effects", "repeat_every"}`` dicts;
+    scheduling and each fired event cost O(log n) regardless of how many
+    events are pending.
+    """
+
+    __slots__ = ("now", "seeded", "_heap", "_seq")
+
+    def __init__(self, now: int = 0, seeded: bool = False, events: Iterable[Dict[str, Any]] = ()):
+        self.now = max(0, int(now))
+        self.seeded = bool(seeded)
+        self._heap: List[Tuple[int, int, Dict[str, Any]]] = []
+        self._seq = 0
+        for event in events:
+            self._push(event)
+
+    def _push(self, event: Dict[str, Any]) -> None:
+        self._seq += 1
+        heapq.heappush(self._heap, (int(event["due"]), self._seq, event))
+
+    def schedule(
+        self,
+        kind: str,
+        delay: int,
+        effects: Optional[Dict[str, Any]] = None,
+        *,
+        event_id: str = "",
+        repeat_every: int = 0,
+    ) -> Dict[str, Any]:
+        event = {
+            "id": event_id or f"{kind}_{self._seq + 1}",
+            "kind": str(kind),
+            "due": self.now + max(0, int(delay)),
+            "effects": dict(effects or {}),
+            "repeat_every": max(0, int(repeat_every)),
+        }
+        self._push(event)
+        return event
+
+    def cancel(self, event_id: str) -> bool:
+        kept = [item for item in self._heap if item[2].get("id") != event_id]
+        if len(kept) == len(self._heap):
+            return False
+        self._heap = kept
+        heapq.heapify(self._heap)
+        return True
+
+    def advance(self, delta: int) -> List[Dict[str, Any]]:
+        """Move the clock forward and return the events that came due, in order."""
+        self.now += max(0, int(delta))
+        fired: List[Dict[str, Any]] = []
+        while self._heap and self._heap[0][0] <= self.now:
+            _, _, event = heapq.heappop(self._heap)
+            fired.append(event)
+            every = int(event.get("repeat_every", 0))
+            if every > 0:
+                nxt = dict(event)
+                nxt["due"] = int(event["due"]) + every
+                self._push(nxt)
+        return fired
+
+    def upcoming(self, limit: int = 3) -> List[Dict[str, Any]]:
+        return [item[2] for item in heapq.nsmallest(limit, self._heap)]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"now": self.now, "seeded": self.seeded, "events": [item[2] for item in sorted(self._heap)]}
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "WorldClock":
+        if not isinstance(data, dict):
+            return cls()
+        events: List[Dict[str, Any]] = []
+        raw_events = data.get("events", [])
+        for raw in raw_events if isinstance(raw_events, list) else []:
+            if not isinstance(raw, dict):
+                continue
+            try:
+                due = int(raw.get("due", 0))
+                every = int(raw.get("repeat_every", 0))
+            except (TypeError, ValueError):
+                continue
+            effects = raw.get("effects", {})
+            events.append(
+                {
+                    "id": str(raw.get("id", "")),
+                    "kind": str(raw.get("kind", "event")),
+                    "due": due,
+                    "effects": dict(effects) if isinstance(effects, dict) else {},
+                    "repeat_every": max(0, every),
+                }
+            )
+        try:
+            now = int(data.get("now", 0))
+        except (TypeError, ValueError):
+            now = 0
+        return cls(now=now, seeded=bool(data.get("seeded", False)), events=events)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, WorldClock):
+            return self.to_dict() == other.to_dict()
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"WorldClock(now={self.now}, pending={len(self._heap)})"
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+class TTLDedupCache:
+    """Bounded, TTL-expiring set of recently seen ids.
+
+    Entries are kept in insertion (= time) order, so capacity eviction and
+    TTL expiry both pop from the front: insert, lookup and eviction are O(1)
+    amortized. ``to_compact``/``from_compact`` give a small persisted form.
+    """
+
+    def __init__(self, capacity: int = 500, ttl_sec: float = 86400.0):
+        self.capacity = max(1, int(capacity))
+        self.ttl_sec = float(ttl_sec)
+        self._items: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def _expire(self, now: float) -> None:
+        if self.ttl_sec <= 0:
+            return
+        cutoff = now - self.ttl_sec
+        while self._items:
+            key, ts = next(iter(self._items.items()))
+            if ts > cutoff:
+                break
+            self._items.popitem(last=False)
+            self.expired += 1
+
+    def seen(self, key: str, now: Optional[float] = None) -> bool:
+        ts = time.time() if now is None else float(now)
+        with self._lock:
+            self._expire(ts)
+            if key in self._items:
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def add(self, key: str, now: Optional[float] = None) -> None:
+        ts = time.time() if now is None else float(now)
+        with self._lock:
+            self._expire(ts)
+            if key in self._items:
+                self._items.move_to_end(key)
+            self._items[key] = ts
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+                self.evicted += 1
+
+    def check_and_add(self, key: str, now: Optional[float] = None) -> bool:
+        """Return True if ``key`` was already present; record it either way."""
+        duplicate = self.seen(key, now)
+        if not duplicate:
+            self.add(key, now)
+        return duplicate
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def to_compact(self) -> List[List[Any]]:
+        with self._lock:
+            return [[key, round(ts, 3)] for key, ts in self._items.items()]
+
+    @classmethod
+    def from_compact(
+        cls,
+        rows: Any,
+        capacity: int = 500,
+        ttl_sec: float = 86400.0,
+        now: Optional[float] = None,
+    ) -> "TTLDedupCache":
+        cache = cls(capacity=capacity, ttl_sec=ttl_sec)
+        ts_now = time.time() if now is None else float(now)
+        entries: List[tuple] = []
+        if isinstance(rows, list):
+            for row in rows:
+                if isinstance(row, (list, tuple)) and len(row) == 2:
+                    try:
+                        entries.append((str(row[0]), float(row[1])))
+                    except (TypeError, ValueError):
+                        continue
+        elif isinstance(rows, dict):
+            # Legacy form: {id: true}; age unknown, treat as seen now.
+            entries = [(str(key), ts_now) for key in rows]
+        entries.sort(key=lambda item: item[1])
+        for key, ts in entries:
+            cache._items[key] = ts
+            cache._items.move_to_end(key)
+        while len(cache._items) > cache.capacity:
+            cache._items.popitem(last=False)
+        cache._expire(ts_now)
+        cache.expired = 0
+        return cache
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from xiyou_solo.infra.metrics import LatencyStats
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+_Job = Tuple[Future, Callable[..., Any], tuple, Dict[str, Any], float]
+
+
+class KeyedDispatcher:
+    """Per-key FIFO queues served by a bounded worker pool.
+
+    Jobs sharing a key run one at a time in submission order; different keys
+    run in parallel. A worker runs one job and then yields the key back to the
+    pool, so a busy key cannot starve the others.
+    """
+
+    def __init__(self, max_workers: int = 8, max_queue_per_key: int = 0, max_pending: int = 0, name: str = "dispatch"):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queues: Dict[Hashable, Deque[_Job]] = {}
+        self._active: set = set()
+        self._pending = 0
+        self.max_queue_per_key = max(0, int(max_queue_per_key))
+        self.max_pending = max(0, int(max_pending))
+        self.wait_ms = LatencyStats()
+        self.run_ms = LatencyStats()
+        self.rejected = 0
+        self.completed = 0
+        self.max_depth_seen = 0
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        fut: Future = Future()
+        with self._lock:
+            queue = self._queues.setdefault(key, deque())
+            if (self.max_queue_per_key and len(queue) >= self.max_queue_per_key) or (
+                self.max_pending and self._pending >= self.max_pending
+            ):
+                self.rejected += 1
+                if not queue:
+                    del self._queues[key]
+                raise QueueFullError(f"queue full for {key!r}")
+            queue.append((fut, fn, args, kwargs, time.perf_counter()))
+            self._pending += 1
+            self.max_depth_seen = max(self.max_depth_seen, len(queue))
+            schedule = key not in self._active
+            if schedule:
+                self._active.add(key)
+        if schedule:
+            self._pool.submit(self._run_next, key)
+        return fut
+
+    def _run_next(self, key: Hashable) -> None:
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                self._active.discard(key)
+                self._queues.pop(key, None)
+                return
+            fut, fn, args, kwargs, enqueued = queue.popleft()
+        started = time.perf_counter()
+        self.wait_ms.record((started - enqueued) * 1000)
+        if fut.set_running_or_notify_cancel():
+            try:
+                fut.set_result(fn(*args, **kwargs))
+            except BaseException as exc:  # noqa: BLE001 - handed to the caller via the future
+                fut.set_exception(exc)
+        self.run_ms.record((time.perf_counter() - started) * 1000)
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+            more = bool(self._queues.get(key))
+            if not more:
+                self._active.discard(key)
+                self._queues.pop(key, None)
+        if more:
+            self._pool.submit(self._run_next, key)
+
+    def queue_depth(self, key: Optional[Hashable] = None) -> int:
+        with self._lock:
+            if key is None:
+                return self._pending
+            return len(self._queues.get(key, ()))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = self._pending
+            keys = len(self._queues)
+        return {
+            "pending": pending,
+            "active_keys": keys,
+            "max_depth_seen": self.max_depth_seen,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_ms": self.wait_ms.snapshot(),
+            "run_ms": self.run_ms.snapshot(),
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import base64
+import http.client
+import json
+import os
+import select
+import threading
+import time
+import urllib.request
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from xiyou_solo.infra.metrics import LatencyStats
+
+
+_HostKey = Tuple[str, str, int]
+# Errors that mean a reused keep-alive connection was already closed by the peer.
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError, http.client.CannotSendRequest)
+# Safe to send twice; a POST that may have reached the server is never resent.
+_IDEMPOTENT = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class HTTPStatusError(Exception):
+    def __init__(self, code: int, body: bytes, headers: Dict[str, str]):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+        self.body = body
+        self.headers = headers
+
+    @property
+    def retry_after(self) -> Optional[float]:
+        raw = self.headers.get("retry-after", "")
+        try:
+            return float(raw)
+        except ValueError:
+            return None
+
+
+@dataclass
+class HTTPResponse:
+    status: int
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+    reused: bool = False
+
+    def json(self) -> Any:
+        return json.loads(self.body.decode("utf-8"))
+
+
+def _host_key(url: str) -> Tuple[_HostKey, str]:
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in {"http", "https"}:
+        raise ValueError(f"unsupported url scheme: {url!r}")
+    port = parts.port or (443 if scheme == "https" else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return (scheme, parts.hostname or "", port), path
+
+
+def _is_dropped(conn: http.client.HTTPConnection) -> bool:
+    """An idle connection with something to read has been closed (or broken) by the peer."""
+    if conn.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class ConnectionPool:
+    """
+    Keep-alive http.client connections shared across threads.
+
+    At most max_per_host connections to one host are checked out at a time;
+    idle ones are reused newest first and closed after idle_timeout seconds,
+    or as soon as the server is seen to have closed them. A request that
+    fails on a reused connection the server already closed is retried once
+    on a fresh connection when it could not have been processed: idempotent
+    methods always, POST only if sending itself failed.
+
+    HTTP(S)_PROXY / NO_PROXY are honoured like urllib does: https goes
+    through a CONNECT tunnel, plain http is sent to the proxy as an
+    absolute URL.
+    """
+
+    def __init__(
+        self,
+        max_per_host: int = 10,
+        idle_timeout: float = 60.0,
+        timeout: float = 30.0,
+        proxies: Optional[Dict[str, str]] = None,
+    ):
+        self.max_per_host = max(1, int(max_per_host))
+        self.idle_timeout = float(idle_timeout)
+        self.timeout = float(timeout)
+        self.proxies = urllib.request.getproxies() if proxies is None else dict(proxies)
+        self._lock = threading.Lock()
+        self._idle: Dict[_HostKey, Deque[Tuple[http.client.HTTPConnection, float]]] = {}
+        self._slots: Dict[_HostKey, threading.BoundedSemaphore] = {}
+        self.created = 0
+        self.reused = 0
+        self.requests = 0
+        self.stale_retries = 0
+        self.idle_closed = 0
+        self.dropped = 0
+        self.connect_ms = LatencyStats()
+
+    def _slot(self, key: _HostKey) -> threading.BoundedSemaphore:
+        with self._lock:
+            sem = self._slots.get(key)
+            if sem is None:
+                sem = self._slots[key] = threading.BoundedSemaphore(self.max_per_host)
+            return sem
+
+    def _proxy(self, key: _HostKey) -> Optional[Tuple[str, int, Dict[str, str]]]:
+        """(proxy host, port, Proxy-Authorization header) for the target, or None to connect directly."""
+        scheme, host, _port = key
+        url = self.proxies.get(scheme)
+        if not url or urllib.request.proxy_bypass_environment(host, self.proxies):
+            return None
+        parts = urlsplit(url if "://" in url else f"http://{url}")
+        headers: Dict[str, str] = {}
+        if parts.username:
+            cred = f"{unquote(parts.username)}:{unquote(parts.password or '')}".encode("utf-8")
+            headers["Proxy-Authorization"] = "Basic " + base64.b64encode(cred).decode("ascii")
+        return parts.hostname or "", parts.port or 8080, headers
+
+    def _new_conn(self, key: _HostKey, timeout: float) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        proxy = self._proxy(key)
+        if proxy is None:
+            conn = cls(host, port, timeout=timeout)
+        elif scheme == "https":
+            conn = cls(proxy[0], proxy[1], timeout=timeout)
+            conn.set_tunnel(host, port, headers=proxy[2])
+        else:
+            conn = cls(proxy[0], proxy[1], timeout=timeout)
+        started = time.perf_counter()
+        conn.connect()
+        self.connect_ms.record((time.perf_counter() - started) * 1000)
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def _take_idle(self, key: _HostKey, now: float) -> Optional[http.client.HTTPConnection]:
+        expired = []
+        conn = None
+        with self._lock:
+            idle = self._idle.get(key)
+            dropped = 0
+            while idle:
+                candidate, last_used = idle.pop()
+                if now - last_used > self.idle_timeout:
+                    expired.append(candidate)
+                    break
+                if _is_dropped(candidate):
+                    dropped += 1
+                    expired.append(candidate)
+                    continue
+                conn = candidate
+                break
+            # Anything older than the newest expired connection is expired too.
+            if idle and len(expired) > dropped:
+                expired.extend(c for c, _ in idle)
+                idle.clear()
+            self.idle_closed += len(expired) - dropped
+            self.dropped += dropped
+        for old in expired:
+            old.close()
+        return conn
+
+    def _put_idle(self, key: _HostKey, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._idle.setdefault(key, deque()).append((conn, time.monotonic()))
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> HTTPResponse:
+        key, path = _host_key(url)
+        headers = dict(headers or {})
+        proxy = self._proxy(key) if key[0] == "http" else None
+        if proxy is not None:
+            # Plain http through a proxy: absolute URL, credentials on every request.
+            path = f"http://{key[1]}:{key[2]}{path}"
+            headers.update(proxy[2])
+        limit = self.timeout if timeout is None else float(timeout)
+        slot = self._slot(key)
+        if not slot.acquire(timeout=limit):
+            raise TimeoutError(f"no free connection to {key[1]}:{key[2]}")
+        try:
+            conn = self._take_idle(key, time.monotonic())
+            reused = conn is not None
+            if conn is None:
+                conn = self._new_conn(key, limit)
+            while True:
+                conn.timeout = limit
+                if conn.sock is not None:
+                    conn.sock.settimeout(limit)
+                sent = False
+                try:
+                    conn.request(method, path, body=body, headers=headers)
+                    sent = True
+                    resp = conn.getresponse()
+                    data = resp.read()
+                    break
+                except _STALE_ERRORS:
+                    conn.close()
+                    if not reused or (sent and method.upper() not in _IDEMPOTENT):
+                        raise
+                    with self._lock:
+                        self.stale_retries += 1
+                    conn = self._new_conn(key, limit)
+                    reused = False
+                except BaseException:
+                    conn.close()
+                    raise
+            with self._lock:
+                self.requests += 1
+                if reused:
+                    self.reused += 1
+            if resp.will_close:
+                conn.close()
+            else:
+                self._put_idle(key, conn)
+        finally:
+            slot.release()
+        return HTTPResponse(
+            status=resp.status,
+            body=data,
+            headers={k.lower(): v for k, v in resp.getheaders()},
+            reused=reused,
+        )
+
+    def request_json(
+        self,
+        method: str,
+        url: str,
+        payload: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """JSON in, JSON out; raises HTTPStatusError for 4xx/5xx."""
+        hdrs = {"Accept": "application/json", **(headers or {})}
+        body = None
+        if payload is not None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            hdrs.setdefault("Content-Type", "application/json")
+        resp = self.request(method, url, body=body, headers=hdrs, timeout=timeout)
+        if resp.status >= 400:
+            raise HTTPStatusError(resp.status, resp.body, resp.headers)
+        return resp.json()
+
+    def prewarm(self, url: str, count: int = 1) -> int:
+        """Open up to ``count`` idle connections to the url's host ahead of the first request."""
+        key, _path = _host_key(url)
+        opened = 0
+        for _ in range(max(0, min(int(count), self.max_per_host))):
+            try:
+                conn = self._new_conn(key, self.timeout)
+            except OSError:
+                break
+            self._put_idle(key, conn)
+            opened += 1
+        return opened
+
+    def close(self) -> None:
+        with self._lock:
+            conns = [conn for idle in self._idle.values() for conn, _ in idle]
+            self._idle.clear()
+        for conn in conns:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            idle = sum(len(q) for q in self._idle.values())
+            requests = self.requests
+            reused = self.reused
+            return {
+                "created": self.created,
+                "reused": reused,
+                "requests": requests,
+                "reuse_rate": reused / requests if requests else 0.0,
+                "idle": idle,
+                "idle_closed": self.idle_closed,
+                "stale_retries": self.stale_retries,
+                "dropped": self.dropped,
+                "connect_ms": self.connect_ms.snapshot(),
+            }
+
+
+_POOL: Optional[ConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ConnectionPool(
+                    max_per_host=int(os.getenv("HTTP_POOL_MAX_PER_HOST", "10")),
+                    idle_timeout=float(os.getenv("HTTP_POOL_IDLE_SEC", "60")),
+                )
+    return _POOL
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import json
+import queue
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+
+class PooledHTTPServer(HTTPServer):
+    """
+    HTTPServer served by a fixed worker pool behind a bounded accept queue.
+
+    Accepted connections wait in the queue for a worker; once it is full new
+    connections get a 503 with Retry-After instead of a thread. The 503 is
+    written by a separate reject thread within ``reject_deadline_sec``, so a
+    slow or trickling client never stalls the accept loop; when that thread
+    is backed up too, the connection is simply closed.
+    A keep-alive connection holds its worker until the client closes it or
+    the handler's idle ``timeout`` expires.
+    """
+
+    def __init__(
+        self,
+        server_address: Tuple[str, int],
+        handler_class: Type[BaseHTTPRequestHandler],
+        workers: int = 16,
+        max_queue: int = 64,
+        retry_after_sec: int = 1,
+        reject_deadline_sec: float = 0.25,
+    ):
+        self.request_queue_size = max(5, int(max_queue))
+        super().__init__(server_address, handler_class)
+        self.retry_after_sec = max(1, int(retry_after_sec))
+        self.reject_deadline_sec = max(0.01, float(reject_deadline_sec))
+        self._rejects: "queue.Queue[Optional[socket.socket]]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._pending: "queue.Queue[Optional[Tuple[Any, Any]]]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._stats_lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.served = 0
+        self.rejected = 0
+        self.dropped = 0
+        self._workers: List[threading.Thread] = [
+            threading.Thread(target=self._work, name=f"http-worker-{idx}", daemon=True) for idx in range(max(1, int(workers)))
+        ]
+        self._reject_thread = threading.Thread(target=self._reject_loop, name="http-reject", daemon=True)
+        for thread in self._workers:
+            thread.start()
+        self._reject_thread.start()
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        try:
+            self._pending.put_nowait((request, client_address))
+        except queue.Full:
+            try:
+                self._rejects.put_nowait(request)
+            except queue.Full:
+                with self._stats_lock:
+                    self.dropped += 1
+                self.shutdown_request(request)
+                return
+            with self._stats_lock:
+                self.rejected += 1
+
+    def _reject_loop(self) -> None:
+        while True:
+            request = self._rejects.get()
+            if request is None:
+                return
+            try:
+                self._reject(request)
+            finally:
+                self.shutdown_request(request)
+
+    def _reject(self, request: socket.socket) -> None:
+        body = json.dumps({"ok": False, "error": "server busy"}).encode("utf-8")
+        head = (
+            "HTTP/1.1 503 Service Unavailable\r\n"
+            f"Retry-After: {self.retry_after_sec}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("ascii")
+        deadline = time.monotonic() + self.reject_deadline_sec
+        try:
+            request.settimeout(self.reject_deadline_sec)
+            request.sendall(head + body)
+            request.shutdown(socket.SHUT_WR)
+            # Drain what the client already sent so close() does not reset the connection,
+            # but never past the deadline: a trickling client just gets closed.
+            while True:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                request.settimeout(left)
+                if not request.recv(4096):
+                    break
+        except OSError:
+            pass
+
+    def _work(self) -> None:
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            request, client_address = item
+            with self._stats_lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                self.finish_request(request, client_address)
+            except Exception:  # noqa: BLE001 - same contract as socketserver.process_request
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with self._stats_lock:
+                    self.in_flight -= 1
+                    self.served += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "workers": len(self._workers),
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queued": self._pending.qsize(),
+                "served": self.served,
+                "rejected": self.rejected,
+                "dropped": self.dropped,
+            }
+
+    def server_close(self) -> None:
+        super().server_close()
+        for _ in self._workers:
+            self._pending.put(None)
+        self._rejects.put(None)
+        for thread in [*self._workers, self._reject_thread]:
+            thread.join(timeout=5)
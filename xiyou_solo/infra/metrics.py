@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import threading
+from collections import deque
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import Deque, Dict, List, Optional
 
 
 @dataclass
@@ -25,3 +27,37 @@ def format_metric_line(latency_ms: int, tokens: Optional[int]) -> str:
         return f"[metrics] latency={int(latency_ms)}ms tokens=n/a"
     return f"[metrics] latency={int(latency_ms)}ms tokens={int(tokens)}"
 
+
+class LatencyStats:
+    """Thread-safe running stats plus a bounded window for percentiles."""
+
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self._recent: Deque[float] = deque(maxlen=max(1, int(window)))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+            self._recent.append(value)
+
+    def percentile(self, pct: float) -> float:
+        with self._lock:
+            ordered = sorted(self._recent)
+        if not ordered:
+            return 0.0
+        idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+        return ordered[idx]
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "max": self.max,
+        }
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Iterator, Optional
+
+
+class LimitExceeded(RuntimeError):
+    def __init__(self, scope: str, key: Hashable = ""):
+        super().__init__(f"{scope} limit exceeded for {key!r}")
+        self.scope = scope
+        self.key = key
+
+
+@dataclass
+class TokenBucket:
+    rate: float
+    burst: float
+    tokens: float
+    updated: float
+
+    def take(self, now: float, cost: float = 1.0) -> bool:
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated = max(self.updated, now)
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+    def idle_full(self, now: float) -> bool:
+        return self.tokens + max(0.0, now - self.updated) * self.rate >= self.burst
+
+
+class RateLimiter:
+    """
+    Keyed token buckets. rate <= 0 disables the limiter.
+
+    Buckets live in LRU order; one untouched for idle_sec (and therefore
+    full again) is dropped, and max_keys bounds the table outright.
+    """
+
+    def __init__(self, rate: float, burst: float, idle_sec: float = 600.0, max_keys: int = 10000):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.idle_sec = float(idle_sec)
+        self.max_keys = max(1, int(max_keys))
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+        self.refunded = 0
+        self.evicted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _evict(self, now: float) -> None:
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            over = len(self._buckets) > self.max_keys
+            if not over and (now - bucket.updated < self.idle_sec or not bucket.idle_full(now)):
+                break
+            del self._buckets[key]
+            self.evicted += 1
+
+    def allow(self, key: Hashable, now: Optional[float] = None, cost: float = 1.0) -> bool:
+        if not self.enabled:
+            return True
+        ts = time.monotonic() if now is None else float(now)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst, self.burst, ts)
+                self._buckets[key] = bucket
+            else:
+                self._buckets.move_to_end(key)
+            ok = bucket.take(ts, cost)
+            if ok:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+            self._evict(ts)
+            return ok
+
+    def refund(self, key: Hashable, cost: float = 1.0) -> None:
+        """Give back a token taken by allow() for a request that a later check turned away."""
+        if not self.enabled:
+            return
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                return
+            bucket.tokens = min(self.burst, bucket.tokens + cost)
+            self.allowed -= 1
+            self.refunded += 1
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "keys": len(self._buckets),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "refunded": self.refunded,
+            "evicted": self.evicted,
+        }
+
+
+class ConcurrencyLimiter:
+    """
+    Cap on in-flight work per key. limit <= 0 disables it.
+
+    acquire() fails at once by default; with a timeout it waits up to that
+    long for a slot on the key to be released.
+    """
+
+    def __init__(self, limit: int, scope: str = "concurrency"):
+        self.limit = int(limit)
+        self.scope = scope
+        self._in_flight: Dict[Hashable, int] = {}
+        self._cond = threading.Condition()
+        self.rejected = 0
+        self.waited = 0
+        self.max_in_flight = 0
+
+    def acquire(self, key: Hashable, timeout: float = 0.0) -> bool:
+        deadline = time.monotonic() + max(0.0, float(timeout))
+        with self._cond:
+            waited = False
+            while self.limit > 0 and self._in_flight.get(key, 0) >= self.limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    return False
+                if not waited:
+                    waited = True
+                    self.waited += 1
+                self._cond.wait(remaining)
+            current = self._in_flight.get(key, 0) + 1
+            self._in_flight[key] = current
+            self.max_in_flight = max(self.max_in_flight, current)
+            return True
+
+    def release(self, key: Hashable) -> None:
+        with self._cond:
+            current = self._in_flight.get(key, 0) - 1
+            if current > 0:
+                self._in_flight[key] = current
+            else:
+                self._in_flight.pop(key, None)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, key: Hashable, timeout: float = 0.0) -> Iterator[None]:
+        if not self.acquire(key, timeout):
+            raise LimitExceeded(self.scope, key)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+    def in_flight(self, key: Optional[Hashable] = None) -> int:
+        with self._cond:
+            if key is None:
+                return sum(self._in_flight.values())
+            return self._in_flight.get(key, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight(),
+            "max_in_flight": self.max_in_flight,
+            "waited": self.waited,
+            "rejected": self.rejected,
+        }
+
+
+def key_fingerprint(secret: Optional[str]) -> str:
+    """Stable short id for an API key, so limiter tables never hold the key itself."""
+    raw = (secret or "").strip()
+    if not raw:
+        return "default"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
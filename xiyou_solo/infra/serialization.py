@@ -0,0 +1,264 @@
+"""Pluggable GameState serializers.
+
+Every format carries ``SCHEMA_VERSION``. Documents written with the current
+version are produced by this module from a ``GameState.to_dict`` and are
+decoded through ``GameState.from_trusted_dict``, which skips the type
+coercion in ``from_dict`` but still rebuilds the containers; anything else (legacy pretty JSON, hand-edited files, older
+versions) goes through the defensive ``GameState.from_dict`` path.
+"""
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+from xiyou_solo.core.state import GameState
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+SCHEMA_VERSION = 1
+BINARY_MAGIC = b"XYS"
+
+_HEADER = struct.Struct("<3sBB")
+# threat, hp, max_hp, gold, body, wit, spirit, luck, turn, progress, threat_level
+_CORE = struct.Struct("<11i")
+_STAT_KEYS = ("body", "wit", "spirit", "luck")
+
+
+class StateSerializer(Protocol):
+    name: str
+    suffix: str
+
+    def dumps(self, doc: Dict[str, Any]) -> bytes:
+        ...
+
+    def loads(self, raw: bytes) -> Dict[str, Any]:
+        ...
+
+
+def _versioned(doc: Dict[str, Any]) -> Dict[str, Any]:
+    payload = {"schema_version": SCHEMA_VERSION}
+    payload.update(doc)
+    payload["schema_version"] = SCHEMA_VERSION
+    return payload
+
+
+class JsonSerializer:
+    name = "json"
+    suffix = "json"
+
+    def dumps(self, doc: Dict[str, Any]) -> bytes:
+        return json.dumps(_versioned(doc), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, raw: bytes) -> Dict[str, Any]:
+        obj = json.loads(raw.decode("utf-8"))
+        return obj if isinstance(obj, dict) else {}
+
+
+class OrjsonSerializer:
+    name = "orjson"
+    suffix = "json"
+
+    def dumps(self, doc: Dict[str, Any]) -> bytes:
+        return orjson.dumps(_versioned(doc))
+
+    def loads(self, raw: bytes) -> Dict[str, Any]:
+        obj = orjson.loads(raw)
+        return obj if isinstance(obj, dict) else {}
+
+
+# -- binary container encoding (msgpack-compatible subset) -------------------
+
+
+def _pack(value: Any, out: bytearray) -> None:
+    if value is None:
+        out.append(0xC0)
+    elif value is True:
+        out.append(0xC3)
+    elif value is False:
+        out.append(0xC2)
+    elif isinstance(value, int):
+        if 0 <= value < 0x80:
+            out.append(value)
+        else:
+            out.append(0xD3)
+            out += struct.pack(">q", value)
+    elif isinstance(value, float):
+        out.append(0xCB)
+        out += struct.pack(">d", value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        if len(data) < 32:
+            out.append(0xA0 | len(data))
+        else:
+            out.append(0xDB)
+            out += struct.pack(">I", len(data))
+        out += data
+    elif isinstance(value, (list, tuple)):
+        if len(value) < 16:
+            out.append(0x90 | len(value))
+        else:
+            out.append(0xDD)
+            out += struct.pack(">I", len(value))
+        for item in value:
+            _pack(item, out)
+    elif isinstance(value, dict):
+        if len(value) < 16:
+            out.append(0x80 | len(value))
+        else:
+            out.append(0xDF)
+            out += struct.pack(">I", len(value))
+        for key, item in value.items():
+            _pack(str(key), out)
+            _pack(item, out)
+    else:
+        _pack(str(value), out)
+
+
+def _unpack(buf: bytes, pos: int) -> Tuple[Any, int]:
+    tag = buf[pos]
+    pos += 1
+    if tag < 0x80:
+        return tag, pos
+    if 0x80 <= tag <= 0x8F:
+        return _unpack_map(buf, pos, tag & 0x0F)
+    if 0x90 <= tag <= 0x9F:
+        return _unpack_array(buf, pos, tag & 0x0F)
+    if 0xA0 <= tag <= 0xBF:
+        size = tag & 0x1F
+        return buf[pos : pos + size].decode("utf-8"), pos + size
+    if tag == 0xC0:
+        return None, pos
+    if tag == 0xC2:
+        return False, pos
+    if tag == 0xC3:
+        return True, pos
+    if tag == 0xD3:
+        return struct.unpack_from(">q", buf, pos)[0], pos + 8
+    if tag == 0xCB:
+        return struct.unpack_from(">d", buf, pos)[0], pos + 8
+    if tag == 0xDB:
+        size = struct.unpack_from(">I", buf, pos)[0]
+        pos += 4
+        return buf[pos : pos + size].decode("utf-8"), pos + size
+    if tag == 0xDD:
+        return _unpack_array(buf, pos + 4, struct.unpack_from(">I", buf, pos)[0])
+    if tag == 0xDF:
+        return _unpack_map(buf, pos + 4, struct.unpack_from(">I", buf, pos)[0])
+    raise ValueError(f"unknown binary tag 0x{tag:02x} at offset {pos - 1}")
+
+
+def _unpack_array(buf: bytes, pos: int, size: int) -> Tuple[List[Any], int]:
+    out: List[Any] = []
+    for _ in range(size):
+        item, pos = _unpack(buf, pos)
+        out.append(item)
+    return out, pos
+
+
+def _unpack_map(buf: bytes, pos: int, size: int) -> Tuple[Dict[str, Any], int]:
+    out: Dict[str, Any] = {}
+    for _ in range(size):
+        key, pos = _unpack(buf, pos)
+        val, pos = _unpack(buf, pos)
+        out[str(key)] = val
+    return out, pos
+
+
+class BinarySerializer:
+    """Header + struct-packed numeric core + packed containers for the rest."""
+
+    name = "binary"
+    suffix = "bin"
+
+    def dumps(self, doc: Dict[str, Any]) -> bytes:
+        rest = dict(doc)
+        rest.pop("schema_version", None)
+        player = dict(rest.get("player") or {})
+        story = dict(rest.get("story") or {})
+        stats = dict(player.pop("stats", None) or {})
+        core = (
+            int(rest.pop("threat", 0)),
+            int(player.pop("hp", 0)),
+            int(player.pop("max_hp", 0)),
+            int(player.pop("gold", 0)),
+            *(int(stats.get(key, 10)) for key in _STAT_KEYS),
+            int(story.pop("turn", 0)),
+            int(story.pop("progress", 0)),
+            int(story.pop("threat_level", 0)),
+        )
+        rest["player"] = player
+        rest["story"] = story
+        out = bytearray(_HEADER.pack(BINARY_MAGIC, SCHEMA_VERSION, 0))
+        out += _CORE.pack(*core)
+        _pack(rest, out)
+        return bytes(out)
+
+    def loads(self, raw: bytes) -> Dict[str, Any]:
+        magic, version, _flags = _HEADER.unpack_from(raw, 0)
+        if magic != BINARY_MAGIC:
+            raise ValueError("not a binary GameState document")
+        core = _CORE.unpack_from(raw, _HEADER.size)
+        doc, _ = _unpack(raw, _HEADER.size + _CORE.size)
+        if not isinstance(doc, dict):
+            raise ValueError("binary GameState body is not a map")
+        player = doc.get("player") if isinstance(doc.get("player"), dict) else {}
+        story = doc.get("story") if isinstance(doc.get("story"), dict) else {}
+        doc["schema_version"] = version
+        doc["threat"] = core[0]
+        player["hp"], player["max_hp"], player["gold"] = core[1], core[2], core[3]
+        player["stats"] = dict(zip(_STAT_KEYS, core[4:8]))
+        story["turn"], story["progress"], story["threat_level"] = core[8], core[9], core[10]
+        doc["player"] = player
+        doc["story"] = story
+        return doc
+
+
+_JSON = JsonSerializer()
+_BINARY = BinarySerializer()
+
+
+def available_serializers() -> List[str]:
+    names = ["json", "binary"]
+    if orjson is not None:
+        names.insert(1, "orjson")
+    return names
+
+
+def get_serializer(name: Optional[str] = "auto") -> StateSerializer:
+    key = (name or "auto").strip().lower()
+    if key == "binary":
+        return _BINARY
+    if key == "json":
+        return _JSON
+    if key in {"orjson", "auto"} and orjson is not None:
+        return OrjsonSerializer()
+    return _JSON
+
+
+def sniff_serializer(raw: bytes) -> StateSerializer:
+    if raw[: len(BINARY_MAGIC)] == BINARY_MAGIC:
+        return _BINARY
+    return get_serializer("auto")
+
+
+def loads_any(raw: bytes) -> Dict[str, Any]:
+    return sniff_serializer(raw).loads(raw)
+
+
+def state_from_doc(doc: Dict[str, Any]) -> GameState:
+    if doc.get("schema_version") == SCHEMA_VERSION:
+        return GameState.from_trusted_dict(doc)
+    return GameState.from_dict(doc)
+
+
+def encode_state(state: GameState, serializer: Optional[StateSerializer] = None) -> bytes:
+    return (serializer or get_serializer()).dumps(state.to_dict())
+
+
+def decode_state(raw: bytes) -> GameState:
+    return state_from_doc(loads_any(raw))
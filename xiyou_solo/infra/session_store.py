@@ -1,13 +1,17 @@
 from __future__ import annotations
 
+import copy
 import json
+import os
 import shutil
 import uuid
 from datetime import datetime, timezone
 from pathlib import Path
+from struct import error as struct_error
 from typing import Any, Dict, List, Optional, Tuple
 
 from xiyou_solo.core.state import GameState
+from xiyou_solo.infra.serialization import StateSerializer, get_serializer, loads_any, state_from_doc
 
 
 BASE_DIR = Path(__file__).resolve().parents[1]
@@ -43,9 +47,20 @@ def write_json(path: Path, data: Dict[str, Any]) -> None:
     tmp_path.replace(path)
 
 
+def write_bytes(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + f".tmp-{uuid.uuid4().hex}")
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
+
+
+STATE_SUFFIXES = ("json", "bin")
+
+
 class SessionStore:
-    def __init__(self, sessions_dir: Path = SESSIONS_DIR):
-        self.sessions_dir = sessions_dir
+    def __init__(self, sessions_dir: Optional[Path] = None, serializer: Optional[StateSerializer] = None):
+        self.sessions_dir = sessions_dir or SESSIONS_DIR
+        self.serializer = serializer or get_serializer(os.getenv("XIYOU_STATE_FORMAT", "auto"))
 
     def ensure_dirs(self) -> None:
         self.sessions_dir.mkdir(parents=True, exist_ok=True)
@@ -54,7 +69,17 @@ class SessionStore:
         return self.sessions_dir / session_id
 
     def _state_path(self, session_id: str) -> Path:
-        return self.session_dir(session_id) / "state.json"
+        return self.session_dir(session_id) / f"state.{self.serializer.suffix}"
+
+    def _find_state_path(self, session_id: str) -> Optional[Path]:
+        own = self._state_path(session_id)
+        if own.exists():
+            return own
+        for suffix in STATE_SUFFIXES:
+            alt = self.session_dir(session_id) / f"state.{suffix}"
+            if alt != own and alt.exists():
+                return alt
+        return None
 
     def _log_path(self, session_id: str) -> Path:
         return self.session_dir(session_id) / "log.json"
@@ -85,7 +110,13 @@ class SessionStore:
         return session_id
 
     def load_state(self, session_id: str) -> Dict[str, Any]:
-        return read_json(self._state_path(session_id), {})
+        path = self._find_state_path(session_id)
+        if path is None:
+            return {}
+        try:
+            return loads_any(path.read_bytes())
+        except (OSError, ValueError, struct_error, IndexError):
+            return {}
 
     def load_log(self, session_id: str) -> Dict[str, Any]:
         return read_json(self._log_path(session_id), {"session_id": session_id, "events": []})
@@ -96,7 +127,14 @@ class SessionStore:
     def save_state(self, session_id: str, state_obj: Dict[str, Any]) -> None:
         payload = dict(state_obj)
         payload["session_id"] = session_id
-        write_json(self._state_path(session_id), payload)
+        own = self._state_path(session_id)
+        write_bytes(own, self.serializer.dumps(payload))
+        # A state file in another format is now stale; left behind it would win the next
+        # load after switching the format back, losing every turn saved in between.
+        for suffix in STATE_SUFFIXES:
+            alt = self.session_dir(session_id) / f"state.{suffix}"
+            if alt != own and alt.exists():
+                alt.unlink()
 
     def save_log(self, session_id: str, log_obj: Dict[str, Any]) -> None:
         payload = dict(log_obj)
@@ -116,7 +154,7 @@ class SessionStore:
             if not p.is_dir():
                 continue
             sid = p.name
-            if not self._state_path(sid).exists() or not self._log_path(sid).exists():
+            if self._find_state_path(sid) is None or not self._log_path(sid).exists():
                 continue
             meta = read_json(self._meta_path(sid), {})
             if player_id is not None and str(meta.get("player_id", "")).strip() != player_id:
@@ -215,7 +253,7 @@ class GameSessionStore:
         if not state:
             return None
         log_data = self._store.load_log(session_id)
-        return GameState.from_dict(state), log_data
+        return state_from_doc(state), log_data
 
     def save_game(self, state: GameState, log_data: Dict[str, Any]) -> None:
         self._store.save_state(state.session_id, state.to_dict())
@@ -241,3 +279,68 @@ class GameSessionStore:
 
     def migrate_legacy_shared(self, player_id: Optional[str]) -> Optional[str]:
         return migrate_legacy_shared_session(store=self._store, player_id=player_id)
+
+
+class SessionUnitOfWork(GameSessionStore):
+    """
+    Request-scoped GameSessionStore: every session is read at most once and
+    saves are held until commit().
+
+    load_game/load_meta return the same objects for the whole request, so
+    mutations are visible to later callers without a reload. save_game marks
+    the game dirty; save_meta only marks meta dirty if it actually changed.
+    """
+
+    def __init__(self, session_store: Optional[SessionStore] = None):
+        super().__init__(session_store)
+        self._games: Dict[str, Optional[Tuple[GameState, Dict[str, Any]]]] = {}
+        self._metas: Dict[str, Dict[str, Any]] = {}
+        self._saved_metas: Dict[str, Dict[str, Any]] = {}
+        self._dirty_games: Dict[str, None] = {}
+        self._dirty_metas: Dict[str, None] = {}
+
+    def create_session(self, player_id: Optional[str], meta: Optional[Dict[str, Any]] = None) -> str:
+        session_id = super().create_session(player_id=player_id, meta=meta)
+        self._games[session_id] = None
+        return session_id
+
+    def load_game(self, session_id: str) -> Optional[Tuple[GameState, Dict[str, Any]]]:
+        if session_id not in self._games:
+            self._games[session_id] = super().load_game(session_id)
+        return self._games[session_id]
+
+    def save_game(self, state: GameState, log_data: Dict[str, Any]) -> None:
+        self._games[state.session_id] = (state, log_data)
+        self._dirty_games[state.session_id] = None
+
+    def load_meta(self, session_id: str) -> Dict[str, Any]:
+        if session_id not in self._metas:
+            meta = super().load_meta(session_id)
+            self._metas[session_id] = meta
+            self._saved_metas[session_id] = copy.deepcopy(meta)
+        return self._metas[session_id]
+
+    def save_meta(self, session_id: str, meta_obj: Dict[str, Any]) -> None:
+        self._metas[session_id] = meta_obj
+        if meta_obj != self._saved_metas.get(session_id):
+            self._dirty_metas[session_id] = None
+        else:
+            self._dirty_metas.pop(session_id, None)
+
+    def is_dirty(self) -> bool:
+        return bool(self._dirty_games or self._dirty_metas)
+
+    def commit(self) -> int:
+        """Write every dirty game and meta; returns the number of sessions touched."""
+        touched = set(self._dirty_games) | set(self._dirty_metas)
+        for session_id in list(self._dirty_games):
+            loaded = self._games.get(session_id)
+            if loaded is not None:
+                super().save_game(*loaded)
+        for session_id in list(self._dirty_metas):
+            meta = self._metas[session_id]
+            super().save_meta(session_id, meta)
+            self._saved_metas[session_id] = copy.deepcopy(meta)
+        self._dirty_games.clear()
+        self._dirty_metas.clear()
+        return len(touched)
@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from xiyou_solo.infra.dispatcher import QueueFullError
+from xiyou_solo.infra.metrics import LatencyStats
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    next_at REAL NOT NULL,
+    finished_at REAL,
+    last_error TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_message ON jobs(group_id, message_id) WHERE message_id != '';
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs(status, next_at);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER,
+    group_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    replies TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    delivered_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_group ON outbox(group_id, id);
+"""
+
+
+@dataclass
+class TurnJob:
+    id: int
+    group_id: str
+    user_id: str
+    message_id: str
+    text: str
+    attempts: int
+    enqueued_at: float
+
+
+class TurnQueue:
+    """
+    SQLite-backed FIFO of pending turns plus the outbox their replies land in.
+
+    A group has at most one running job, so turns of one group keep arrival
+    order while different groups are worked in parallel. Jobs left "running"
+    by a crash are re-queued when the queue is opened. Finished jobs and
+    outbox rows older than retention_sec are pruned as jobs finish. A group
+    holds at most max_pending unfinished jobs (0: unbounded).
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        max_attempts: int = 3,
+        retry_base_sec: float = 2.0,
+        retention_sec: float = 86400.0,
+        max_pending: int = 0,
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_base_sec = float(retry_base_sec)
+        self.retention_sec = float(retention_sec)
+        self.max_pending = max(0, int(max_pending))
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self.queue_ms = LatencyStats()
+        self.retries = 0
+        self.failed = 0
+        self.completed = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.pruned = 0
+        self._finished = 0
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+
+    def enqueue(self, group_id: str, user_id: str, text: str, message_id: str = "", now: Optional[float] = None) -> Optional[int]:
+        """
+        Persist a turn; returns its id, or None when this message id is already
+        queued. Raises QueueFullError when the group already has max_pending
+        unfinished jobs.
+        """
+        ts = time.time() if now is None else float(now)
+        with self._lock:
+            if self.max_pending and self._pending(group_id) >= self.max_pending:
+                self.rejected += 1
+                raise QueueFullError(f"group {group_id} has {self.max_pending} pending turns")
+            try:
+                cur = self._conn.execute(
+                    "INSERT INTO jobs (group_id, user_id, message_id, text, enqueued_at, next_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (group_id, user_id, message_id, text, ts, ts),
+                )
+            except sqlite3.IntegrityError:
+                self.duplicates += 1
+                return None
+            self._wakeup.notify()
+            return int(cur.lastrowid)
+
+    def pending(self, group_id: str) -> int:
+        """Queued or running jobs of the group."""
+        with self._lock:
+            return self._pending(group_id)
+
+    def _pending(self, group_id: str) -> int:
+        row = self._conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE group_id = ? AND status IN ('queued', 'running')", (group_id,)
+        ).fetchone()
+        return int(row[0])
+
+    def claim(self, now: Optional[float] = None) -> Optional[TurnJob]:
+        ts = time.time() if now is None else float(now)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    """
+                    SELECT id, group_id, user_id, message_id, text, attempts, enqueued_at FROM jobs j
+                    WHERE status = 'queued' AND next_at <= ?
+                      AND NOT EXISTS (SELECT 1 FROM jobs r WHERE r.group_id = j.group_id AND r.status = 'running')
+                      AND NOT EXISTS (SELECT 1 FROM jobs o WHERE o.group_id = j.group_id AND o.status = 'queued' AND o.id < j.id)
+                    ORDER BY id LIMIT 1
+                    """,
+                    (ts,),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1 WHERE id = ?", (row[0],))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = TurnJob(*row[:5], attempts=row[5] + 1, enqueued_at=row[6])
+        if job.attempts == 1:
+            self.queue_ms.record(max(0.0, ts - job.enqueued_at) * 1000)
+        return job
+
+    def wait(self, timeout: float) -> None:
+        with self._wakeup:
+            self._wakeup.wait(timeout)
+
+    def complete(self, job: TurnJob, replies: List[str], now: Optional[float] = None) -> int:
+        """Mark the job done and append its replies to the outbox; returns the outbox id."""
+        return self._finish(job, "done", replies, None, now)
+
+    def _finish(self, job: TurnJob, status: str, replies: List[str], error: Optional[str], now: Optional[float]) -> int:
+        ts = time.time() if now is None else float(now)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, last_error = ? WHERE id = ?",
+                    (status, ts, error[:500] if error else None, job.id),
+                )
+                cur = self._conn.execute(
+                    "INSERT INTO outbox (job_id, group_id, message_id, replies, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job.id, job.group_id, job.message_id, json.dumps(replies, ensure_ascii=False), ts),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            if status == "done":
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._finished += 1
+            if self._finished % 100 == 0:
+                self._prune(ts)
+            self._wakeup.notify()
+            return int(cur.lastrowid)
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Delete finished jobs and outbox rows older than retention_sec; returns rows deleted."""
+        with self._lock:
+            return self._prune(time.time() if now is None else float(now))
+
+    def _prune(self, now: float) -> int:
+        # Undelivered outbox rows go too: a poller has had retention_sec to read them.
+        cutoff = now - self.retention_sec
+        jobs = self._conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (cutoff,)).rowcount
+        rows = self._conn.execute("DELETE FROM outbox WHERE created_at < ?", (cutoff,)).rowcount
+        self.pruned += jobs + rows
+        return jobs + rows
+
+    def retry(self, job: TurnJob, error: str, now: Optional[float] = None) -> Optional[int]:
+        """
+        Re-queue with exponential backoff. Once attempts are used up the job
+        fails instead and the outbox id of its failure notice is returned.
+        """
+        ts = time.time() if now is None else float(now)
+        if job.attempts >= self.max_attempts:
+            return self.fail(job, error, now=ts)
+        delay = self.retry_base_sec * (2 ** (job.attempts - 1))
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', next_at = ?, last_error = ? WHERE id = ?",
+                (ts + delay, error[:500], job.id),
+            )
+            self.retries += 1
+        return None
+
+    def fail(self, job: TurnJob, error: str, now: Optional[float] = None) -> int:
+        return self._finish(job, "failed", [f"Action failed: {error}"], error, now)
+
+    def outbox(self, group_id: Optional[str] = None, after_id: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        sql = "SELECT id, job_id, group_id, message_id, replies, created_at FROM outbox WHERE id > ?"
+        args: List[Any] = [int(after_id)]
+        if group_id:
+            sql += " AND group_id = ?"
+            args.append(group_id)
+        sql += " ORDER BY id LIMIT ?"
+        args.append(max(1, int(limit)))
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [
+            {"id": r[0], "job_id": r[1], "group_id": r[2], "message_id": r[3], "replies": json.loads(r[4]), "created_at": r[5]}
+            for r in rows
+        ]
+
+    def mark_delivered(self, outbox_id: int, now: Optional[float] = None) -> None:
+        ts = time.time() if now is None else float(now)
+        with self._lock:
+            self._conn.execute("UPDATE outbox SET delivered_at = ? WHERE id = ?", (ts, int(outbox_id)))
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+            undelivered = self._conn.execute("SELECT COUNT(*) FROM outbox WHERE delivered_at IS NULL").fetchone()[0]
+        out = {status: 0 for status in ("queued", "running", "done", "failed")}
+        out.update({status: int(n) for status, n in rows})
+        out["outbox_undelivered"] = int(undelivered)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counts(),
+            "completed": self.completed,
+            "retries": self.retries,
+            "failed_total": self.failed,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "pruned": self.pruned,
+            "queue_ms": self.queue_ms.snapshot(),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class TransientTurnError(RuntimeError):
+    """Raised by a turn handler when the job should be retried later."""
+
+
+TurnHandler = Callable[[TurnJob], List[str]]
+ReplySink = Callable[[str, List[str]], None]
+
+
+class TurnWorkers:
+    """Fixed set of threads draining a TurnQueue into its outbox."""
+
+    def __init__(
+        self,
+        queue: TurnQueue,
+        handler: TurnHandler,
+        workers: int = 2,
+        poll_sec: float = 0.5,
+        sink: Optional[ReplySink] = None,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.sink = sink
+        self.poll_sec = float(poll_sec)
+        self.run_ms = LatencyStats()
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._loop, name=f"turn-worker-{idx}", daemon=True) for idx in range(max(1, int(workers)))
+        ]
+
+    def start(self) -> "TurnWorkers":
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def run_once(self) -> bool:
+        job = self.queue.claim()
+        if job is None:
+            return False
+        started = time.perf_counter()
+        outbox_id: Optional[int]
+        try:
+            outbox_id = self.queue.complete(job, self.handler(job))
+        except TransientTurnError as exc:
+            outbox_id = self.queue.retry(job, str(exc) or type(exc).__name__)
+        except Exception as exc:  # noqa: BLE001 - report the failure to the group instead of dropping it
+            outbox_id = self.queue.fail(job, f"{type(exc).__name__}: {exc}")
+        self.run_ms.record((time.perf_counter() - started) * 1000)
+        if outbox_id is not None:
+            self._push(outbox_id)
+        return True
+
+    def _push(self, outbox_id: int) -> None:
+        if self.sink is None:
+            return
+        rows = self.queue.outbox(after_id=outbox_id - 1, limit=1)
+        if not rows or rows[0]["id"] != outbox_id:
+            return
+        try:
+            self.sink(rows[0]["group_id"], rows[0]["replies"])
+        except Exception:  # noqa: BLE001 - stays in the outbox for polling
+            return
+        self.queue.mark_delivered(outbox_id)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            if not self.run_once():
+                self.queue.wait(self.poll_sec)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        with self.queue._wakeup:
+            self.queue._wakeup.notify_all()
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join(timeout)
@@ -11,9 +11,17 @@ class LLMCallResult:
     raw_text: str
     latency_ms: int
     tokens: Optional[int] = None
+    # Provider failure kind ("quota", "network", ...); error replies are never cached.
+    error: Optional[str] = None
+    cached: bool = False
+    model: Optional[str] = None
 
 
 class LLMProvider(Protocol):
     def generate(self, dm_system: str, dm_context: str, player_input: str) -> LLMCallResult:
         ...
 
+
+# Providers may also define ``for_turn_class(turn_class) -> LLMProvider`` to pick a model
+# per turn class (see llm/tiers.py); the engine falls back to the provider itself.
+
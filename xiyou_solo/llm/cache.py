@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from xiyou_solo.infra.session_store import DATA_DIR
+
+
+CACHE_PATH = DATA_DIR / "llm_cache.sqlite3"
+KEY_POLICIES = ("exact", "normalized")
+
+# (raw_text, tokens) as returned by the provider.
+CachedCompletion = Tuple[str, Optional[int]]
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").split()).lower()
+
+
+def completion_key(model: str, dm_system: str, dm_context: str, player_input: str, policy: str = "exact", **params: Any) -> str:
+    """
+    sha256 over everything that shapes the completion.
+
+    "exact" hashes the strings as sent. "normalized" collapses whitespace and
+    case first, so "Attack " and "attack" share an entry.
+    """
+    if policy not in KEY_POLICIES:
+        raise ValueError(f"unknown cache key policy: {policy}")
+    parts = [model, dm_system, dm_context, player_input]
+    if policy == "normalized":
+        parts = [_normalize(p) for p in parts]
+    payload = json.dumps([parts, sorted(params.items())], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """
+    Two-tier completion cache: an in-memory LRU in front of an optional
+    SQLite file shared across processes. Entries expire after ttl_sec.
+    Only successful completions should be put; errors are never cached.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 256,
+        ttl_sec: float = 3600.0,
+        path: Optional[Path] = None,
+        key_policy: str = "exact",
+        disk_capacity: int = 10000,
+    ):
+        if key_policy not in KEY_POLICIES:
+            raise ValueError(f"unknown cache key policy: {key_policy}")
+        self.capacity = max(1, int(capacity))
+        self.ttl_sec = float(ttl_sec)
+        self.key_policy = key_policy
+        self.disk_capacity = max(1, int(disk_capacity))
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[float, str, Optional[int]]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.path = Path(path) if path is not None else None
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, raw_text TEXT NOT NULL, tokens INTEGER, expires_at REAL NOT NULL)"
+            )
+        self._puts = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def key(self, model: str, dm_system: str, dm_context: str, player_input: str, **params: Any) -> str:
+        return completion_key(model, dm_system, dm_context, player_input, self.key_policy, **params)
+
+    def get(self, key: str, now: Optional[float] = None) -> Optional[CachedCompletion]:
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[1], entry[2]
+                del self._memory[key]
+                self.expired += 1
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT raw_text, tokens, expires_at FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and float(row[2]) > now:
+                    self._remember(key, float(row[2]), str(row[0]), row[1])
+                    self.disk_hits += 1
+                    return str(row[0]), row[1]
+                if row is not None:
+                    self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    self.expired += 1
+            self.misses += 1
+            return None
+
+    def put(self, key: str, raw_text: str, tokens: Optional[int] = None, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        expires_at = now + self.ttl_sec
+        with self._lock:
+            self._remember(key, expires_at, raw_text, tokens)
+            if self._conn is None:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, raw_text, tokens, expires_at) VALUES (?, ?, ?, ?)",
+                (key, raw_text, tokens, expires_at),
+            )
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self._conn.execute("DELETE FROM completions WHERE expires_at <= ?", (now,))
+                self._conn.execute(
+                    "DELETE FROM completions WHERE key IN (SELECT key FROM completions ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_capacity,),
+                )
+
+    def _remember(self, key: str, expires_at: float, raw_text: str, tokens: Optional[int]) -> None:
+        self._memory[key] = (expires_at, raw_text, tokens)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "size": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "key_policy": self.key_policy,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_CACHE: Optional[CompletionCache] = None
+_CACHE_LOCK = threading.Lock()
+_CACHE_LOADED = False
+
+
+def get_completion_cache() -> Optional[CompletionCache]:
+    """
+    Process-wide cache from env, or None when disabled.
+
+    LLM_CACHE=off|memory|disk (default off), LLM_CACHE_SIZE, LLM_CACHE_TTL_SEC,
+    LLM_CACHE_KEY=exact|normalized, LLM_CACHE_PATH (disk tier file).
+    """
+    global _CACHE, _CACHE_LOADED
+    if not _CACHE_LOADED:
+        with _CACHE_LOCK:
+            if not _CACHE_LOADED:
+                mode = os.getenv("LLM_CACHE", "off").strip().lower()
+                if mode in {"memory", "disk"}:
+                    _CACHE = CompletionCache(
+                        capacity=int(os.getenv("LLM_CACHE_SIZE", "256")),
+                        ttl_sec=float(os.getenv("LLM_CACHE_TTL_SEC", "3600")),
+                        path=Path(os.getenv("LLM_CACHE_PATH", "") or CACHE_PATH) if mode == "disk" else None,
+                        key_policy=os.getenv("LLM_CACHE_KEY", "exact").strip().lower() or "exact",
+                    )
+                _CACHE_LOADED = True
+    return _CACHE
+
+
+def completion_cache_stats() -> Dict[str, Any]:
+    cache = get_completion_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
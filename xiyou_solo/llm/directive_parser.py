@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import json
 import re
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 
 ALLOWED_ATTR: frozenset = frozenset({"Body", "Mind", "Spirit", "Luck"})
@@ -91,3 +91,25 @@ def parse_dm_output(text: str) -> Tuple[str, Dict[str, Any]]:
     narrative = text.replace(blob, "")
     narrative = re.sub(r"```json|```", "", narrative, flags=re.IGNORECASE).strip()
     return narrative, directive
+
+
+def load_structured(text: str) -> Optional[Dict[str, Any]]:
+    """The reply as one JSON object (code fences allowed); None when it is not one."""
+    body = re.sub(r"^```(?:json)?\s*|\s*```$", "", (text or "").strip(), flags=re.IGNORECASE)
+    try:
+        raw = json.loads(body)
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return None
+    return raw if isinstance(raw, dict) else None
+
+
+def parse_structured(text: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Parse a structured-output reply {"narrative": ..., "directive": {...}}; None when it is not one."""
+    raw = load_structured(text)
+    if raw is None:
+        return None
+    narrative = raw.get("narrative")
+    directive = raw.get("directive")
+    if not isinstance(narrative, str) or not narrative.strip() or not isinstance(directive, dict):
+        return None
+    return narrative.strip(), _normalize_directive(directive)
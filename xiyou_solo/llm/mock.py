@@ -55,4 +55,5 @@ class MockProvider:
             raw_text=narrative,
             latency_ms=latency_ms,
             tokens=64,
+            model="mock",
         )
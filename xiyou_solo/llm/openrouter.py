@@ -1,19 +1,155 @@
 from __future__ import annotations
 
+import http.client
 import json
 import os
+import random
 import re
+import threading
 import time
-import urllib.error
-import urllib.request
-from typing import Any, Dict, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
 
-from xiyou_solo.llm.base import LLMCallResult
+from xiyou_solo.infra.circuit_breaker import CircuitBreaker
+from xiyou_solo.infra.http_pool import HTTPStatusError, get_pool
+from xiyou_solo.infra.metrics import LatencyStats
+from xiyou_solo.infra.rate_limit import key_fingerprint
+from xiyou_solo.llm import structured
+from xiyou_solo.llm.base import LLMCallResult, LLMProvider
+from xiyou_solo.llm.cache import CompletionCache, get_completion_cache
 from xiyou_solo.llm.directive_parser import parse_dm_output
+from xiyou_solo.llm.tiers import get_model_tiers
 
 
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
 DEFAULT_MODEL = "openai/gpt-4o-mini"
+TEMPERATURE = 0.8
+# 429 and upstream failures are worth another attempt; 401/402/403 are not.
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+BREAKER_FAILURES = int(os.getenv("OPENROUTER_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SEC = float(os.getenv("OPENROUTER_BREAKER_RESET_SEC", "30"))
+
+
+@dataclass
+class CallPolicy:
+    timeout_sec: float = 30.0
+    max_attempts: int = 3
+    backoff_base_sec: float = 0.5
+    max_backoff_sec: float = 8.0
+    # A longer Retry-After than this is not waited out; the turn fails (or falls back) instead.
+    max_retry_after_sec: float = 20.0
+    hedge: bool = False
+    hedge_min_samples: int = 20
+    hedge_min_delay_sec: float = 0.5
+
+    @classmethod
+    def from_env(cls) -> "CallPolicy":
+        return cls(
+            timeout_sec=float(os.getenv("OPENROUTER_TIMEOUT_SEC", "30")),
+            max_attempts=max(1, int(os.getenv("OPENROUTER_MAX_ATTEMPTS", "3"))),
+            backoff_base_sec=float(os.getenv("OPENROUTER_BACKOFF_BASE_SEC", "0.5")),
+            max_backoff_sec=float(os.getenv("OPENROUTER_MAX_BACKOFF_SEC", "8")),
+            max_retry_after_sec=float(os.getenv("OPENROUTER_MAX_RETRY_AFTER_SEC", "20")),
+            hedge=os.getenv("OPENROUTER_HEDGE", "0").strip().lower() in {"1", "true", "yes", "on"},
+            hedge_min_samples=int(os.getenv("OPENROUTER_HEDGE_MIN_SAMPLES", "20")),
+            hedge_min_delay_sec=float(os.getenv("OPENROUTER_HEDGE_MIN_DELAY_SEC", "0.5")),
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, base * 2^(attempt-1)], capped."""
+        return random.uniform(0.0, min(self.max_backoff_sec, self.backoff_base_sec * (2 ** (attempt - 1))))
+
+
+class _CallMetrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+        self.latency: Dict[str, LatencyStats] = {}
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def model_latency(self, model: str) -> LatencyStats:
+        with self._lock:
+            stats = self.latency.get(model)
+            if stats is None:
+                stats = self.latency[model] = LatencyStats()
+            return stats
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            models = dict(self.latency)
+        return {**counters, "latency_ms": {model: stats.snapshot() for model, stats in models.items()}}
+
+
+_METRICS = _CallMetrics()
+_BREAKERS: Dict[Tuple[str, str], CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+_HEDGE_POOL: Optional[ThreadPoolExecutor] = None
+_HEDGE_POOL_LOCK = threading.Lock()
+
+
+def _get_hedge_pool() -> ThreadPoolExecutor:
+    """Threads for hedged calls, started on the first hedge so unhedged processes never create them."""
+    global _HEDGE_POOL
+    if _HEDGE_POOL is None:
+        with _HEDGE_POOL_LOCK:
+            if _HEDGE_POOL is None:
+                _HEDGE_POOL = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("OPENROUTER_HEDGE_WORKERS", "8")), thread_name_prefix="or-hedge"
+                )
+    return _HEDGE_POOL
+
+
+def get_breaker(api_key: str, model: str) -> CircuitBreaker:
+    """One breaker per (key, model), so a fallback model on the same key stays usable."""
+    bucket = (key_fingerprint(api_key), model)
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(bucket)
+        if breaker is None:
+            breaker = _BREAKERS[bucket] = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET_SEC)
+        return breaker
+
+
+def call_stats() -> Dict[str, Any]:
+    with _BREAKERS_LOCK:
+        breakers = {f"{key}:{model}": b.stats() for (key, model), b in _BREAKERS.items()}
+    return {**_METRICS.snapshot(), "breakers": breakers}
+
+
+# Outage-style failures are handed to the fallback provider; key problems are shown to the player.
+FALLBACK_ERRORS = {"unavailable", "network", "quota"}
+_FROM_ENV: Any = object()
+
+
+def _env_fallback(api_key: Optional[str], model: Optional[str], base_url: Optional[str] = None) -> Optional[LLMProvider]:
+    """OPENROUTER_FALLBACK_MODEL: same key, another model; the fallback itself does not fall back."""
+    fallback_model = os.getenv("OPENROUTER_FALLBACK_MODEL", "").strip()
+    primary = model or os.getenv("OPENROUTER_MODEL", DEFAULT_MODEL).strip() or DEFAULT_MODEL
+    if not fallback_model or fallback_model == primary:
+        return None
+    return OpenRouterProvider(api_key=api_key, model=fallback_model, fallback=None, base_url=base_url)
+
+
+def _is_outage(exc: BaseException) -> bool:
+    """Failures that say the upstream is unhealthy, as opposed to a bad request or key."""
+    if isinstance(exc, HTTPStatusError):
+        return exc.code in RETRY_STATUSES
+    return isinstance(exc, (OSError, http.client.HTTPException))
+
+
+def chat_url(base_url: Optional[str] = None) -> str:
+    """Chat completions endpoint under base_url, else OPENROUTER_BASE_URL (e.g. a local fake server), else OpenRouter."""
+    base = (base_url or "").strip() or os.getenv("OPENROUTER_BASE_URL", "").strip() or DEFAULT_BASE_URL
+    return f"{base.rstrip('/')}/chat/completions"
+
+
+def prewarm(count: int = 1) -> int:
+    """Open pooled connections to OpenRouter ahead of the first turn."""
+    return get_pool().prewarm(chat_url(), count)
 
 
 def _infer_lang(dm_context: str) -> str:
@@ -109,9 +245,117 @@ def _error_reply(lang: str, kind: str) -> str:
 
 
 class OpenRouterProvider:
-    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        cache: Optional[CompletionCache] = None,
+        policy: Optional[CallPolicy] = None,
+        fallback: Optional[LLMProvider] = _FROM_ENV,
+        sleep: Callable[[float], None] = time.sleep,
+        base_url: Optional[str] = None,
+    ):
         self.api_key = (api_key or "").strip() or None
         self.model = (model or "").strip() or None
+        self.base_url = (base_url or "").strip() or None
+        self.cache = cache if cache is not None else get_completion_cache()
+        self.policy = policy or CallPolicy.from_env()
+        self.fallback = _env_fallback(self.api_key, self.model, self.base_url) if fallback is _FROM_ENV else fallback
+        self._sleep = sleep
+
+    def for_turn_class(self, turn_class: str) -> "OpenRouterProvider":
+        """Same key, cache and policy on the tier's model; self when the tier has no model configured."""
+        model = get_model_tiers().model_for(turn_class)
+        if not model or model == self.model:
+            return self
+        return OpenRouterProvider(
+            api_key=self.api_key,
+            model=model,
+            cache=self.cache,
+            policy=self.policy,
+            fallback=self.fallback,
+            sleep=self._sleep,
+            base_url=self.base_url,
+        )
+
+    def _cache_key(self, api_key: str, model: str, dm_system: str, dm_context: str, player_input: str, mode: str) -> str:
+        # Partitioned per key: a hit must never hand one key's paid completion to another, nor skip
+        # that key's own invalid-key/quota check.
+        assert self.cache is not None
+        return self.cache.key(
+            model, dm_system, dm_context, player_input, temperature=TEMPERATURE, structured=mode, key_id=key_fingerprint(api_key)
+        )
+
+    def _post_once(self, model: str, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        obj = get_pool().request_json(
+            "POST", chat_url(self.base_url), payload=payload, headers=headers, timeout=self.policy.timeout_sec
+        )
+        _METRICS.model_latency(model).record((time.perf_counter() - started) * 1000)
+        return obj
+
+    def _hedge_delay(self, model: str) -> Optional[float]:
+        if not self.policy.hedge:
+            return None
+        stats = _METRICS.model_latency(model)
+        if stats.count < self.policy.hedge_min_samples:
+            return None
+        return max(self.policy.hedge_min_delay_sec, stats.percentile(95) / 1000.0)
+
+    def _post_hedged(self, model: str, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        """One logical attempt; a second copy is sent if the first outlives the model's p95."""
+        delay = self._hedge_delay(model)
+        if delay is None:
+            return self._post_once(model, payload, headers)
+        executor = _get_hedge_pool()
+        primary = executor.submit(self._post_once, model, payload, headers)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        hedge = executor.submit(self._post_once, model, payload, headers)
+        _METRICS.count("hedges")
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is None:
+                    if fut is hedge:
+                        _METRICS.count("hedges_won")
+                    return fut.result()
+                error = fut.exception()
+        assert error is not None
+        raise error
+
+    def _post(self, model: str, payload: Dict[str, Any], headers: Dict[str, str], breaker: CircuitBreaker) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            attempt += 1
+            _METRICS.count("attempts")
+            try:
+                obj = self._post_hedged(model, payload, headers)
+                breaker.record_success()
+                return obj
+            except Exception as exc:
+                if not _is_outage(exc):
+                    # The upstream answered (bad key, bad JSON, ...); that is not an outage.
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if attempt >= self.policy.max_attempts:
+                    raise
+                if not breaker.allow():
+                    # Our own failures opened it; go to the fallback now instead of retrying into it.
+                    _METRICS.count("breaker_rejected")
+                    raise
+                delay = self.policy.backoff(attempt)
+                retry_after = exc.retry_after if isinstance(exc, HTTPStatusError) else None
+                if retry_after is not None:
+                    if retry_after > self.policy.max_retry_after_sec:
+                        raise
+                    delay = max(delay, retry_after)
+            _METRICS.count("retries")
+            self._sleep(delay)
 
     def generate(self, dm_system: str, dm_context: str, player_input: str) -> LLMCallResult:
         started = time.perf_counter()
@@ -120,53 +364,83 @@ class OpenRouterProvider:
         model = self.model if self.model is not None else os.getenv("OPENROUTER_MODEL", DEFAULT_MODEL).strip() or DEFAULT_MODEL
         raw_text = ""
         token_usage = None
+        error: Optional[str] = None
+        cache_key = ""
+        cached = None
+        mode = structured.mode_for(model)
 
         if not api_key:
-            raw_text = _error_reply(lang, "missing_key")
-        else:
-            payload: Dict[str, Any] = {
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": dm_system},
-                    {"role": "user", "content": f"[Context]\n{dm_context}\n\n[Player Input]\n{player_input}"},
-                ],
-                "temperature": 0.8,
+            error = "missing_key"
+        elif self.cache is not None:
+            cache_key = self._cache_key(api_key, model, dm_system, dm_context, player_input, mode)
+            cached = self.cache.get(cache_key)
+
+        if cached is not None:
+            raw_text = cached[0]
+        elif error is None:
+            breaker = get_breaker(api_key, model)
+            if not breaker.allow():
+                _METRICS.count("breaker_rejected")
+                error = "unavailable"
+        if cached is None and error is None:
+            headers = {
+                "Authorization": f"Bearer {api_key}",
+                "HTTP-Referer": "http://localhost",
+                "X-Title": "xiyou_solo",
             }
-            req = urllib.request.Request(
-                OPENROUTER_URL,
-                data=json.dumps(payload).encode("utf-8"),
-                method="POST",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "http://localhost",
-                    "X-Title": "xiyou_solo",
-                },
-            )
-            try:
-                with urllib.request.urlopen(req, timeout=30) as resp:
-                    body = resp.read().decode("utf-8")
-                obj = json.loads(body)
-                raw_text = obj.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-                usage = obj.get("usage", {}) if isinstance(obj.get("usage"), dict) else {}
-                total_tokens = usage.get("total_tokens")
-                if isinstance(total_tokens, int):
-                    token_usage = total_tokens
-                if not raw_text:
-                    raw_text = _error_reply(lang, "other")
-            except urllib.error.HTTPError as exc:
-                if exc.code in {401, 403}:
-                    raw_text = _error_reply(lang, "invalid_key")
-                elif exc.code in {402, 429}:
-                    raw_text = _error_reply(lang, "quota")
-                else:
-                    raw_text = _error_reply(lang, "other")
-            except (urllib.error.URLError, TimeoutError):
-                raw_text = _error_reply(lang, "network")
-            except (ValueError, json.JSONDecodeError):
-                raw_text = _error_reply(lang, "other")
-
-        narrative, directive = parse_dm_output(raw_text)
+            while True:
+                payload: Dict[str, Any] = {
+                    "model": model,
+                    "messages": [
+                        {"role": "system", "content": dm_system + (structured.STRUCTURED_NOTE if mode != structured.OFF else "")},
+                        {"role": "user", "content": f"[Context]\n{dm_context}\n\n[Player Input]\n{player_input}"},
+                    ],
+                    "temperature": TEMPERATURE,
+                    **structured.request_fields(mode),
+                }
+                try:
+                    obj = self._post(model, payload, headers, breaker)
+                    raw_text = structured.message_text(obj.get("choices", [{}])[0].get("message", {}), mode)
+                    usage = obj.get("usage", {}) if isinstance(obj.get("usage"), dict) else {}
+                    total_tokens = usage.get("total_tokens")
+                    if isinstance(total_tokens, int):
+                        token_usage = total_tokens
+                    if not raw_text:
+                        error = "other"
+                except HTTPStatusError as exc:
+                    if exc.code == 400 and mode != structured.OFF and structured.rejects_mode(exc.body):
+                        # The model (or its upstream) refused response_format/tools; ask again as text.
+                        structured.mark_unsupported(model, mode)
+                        mode = structured.OFF
+                        continue
+                    if exc.code in {401, 403}:
+                        error = "invalid_key"
+                    elif exc.code in {402, 429}:
+                        error = "quota"
+                    elif exc.code in RETRY_STATUSES:
+                        error = "unavailable"
+                    else:
+                        error = "other"
+                except (OSError, http.client.HTTPException):
+                    error = "network"
+                except (ValueError, json.JSONDecodeError):
+                    error = "other"
+                break
+            if error is None and self.cache is not None:
+                cache_key = self._cache_key(api_key, model, dm_system, dm_context, player_input, mode)
+                self.cache.put(cache_key, raw_text, token_usage)
+
+        if error in FALLBACK_ERRORS and self.fallback is not None:
+            _METRICS.count("fallbacks")
+            result = self.fallback.generate(dm_system, dm_context, player_input)
+            result.latency_ms = int((time.perf_counter() - started) * 1000)
+            return result
+        if error is not None:
+            _METRICS.count(f"errors.{error}")
+            raw_text = _error_reply(lang, error)
+            narrative, directive = parse_dm_output(raw_text)
+        else:
+            narrative, directive = structured.parse_reply(model, raw_text, mode)
         latency_ms = int((time.perf_counter() - started) * 1000)
         return LLMCallResult(
             narrative=narrative,
@@ -174,4 +448,8 @@ class OpenRouterProvider:
             raw_text=raw_text,
             latency_ms=latency_ms,
             tokens=token_usage,
+            error=error,
+            cached=cached is not None,
+            model=model,
         )
+
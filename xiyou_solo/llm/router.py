@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import dataclasses
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from xiyou_solo.infra.rate_limit import key_fingerprint
+from xiyou_solo.llm.base import LLMCallResult, LLMProvider
+from xiyou_solo.llm.cache import CompletionCache
+from xiyou_solo.llm.openrouter import DEFAULT_MODEL, CallPolicy, OpenRouterProvider, get_breaker
+from xiyou_solo.llm.tiers import get_model_tiers
+
+
+POLICIES = ("fastest", "ordered")
+# How long a target sits out after each error kind before it is tried again.
+ERROR_COOLDOWN_SEC = {
+    "quota": float(os.getenv("OPENROUTER_ROUTER_QUOTA_COOLDOWN_SEC", "60")),
+    "invalid_key": float(os.getenv("OPENROUTER_ROUTER_INVALID_KEY_COOLDOWN_SEC", "3600")),
+    "unavailable": 5.0,
+    "network": 5.0,
+}
+# Failures that belong to the key itself. On a player's own key (tier 0) they are the
+# player's to fix, so they are surfaced instead of quietly spending server keys.
+USER_KEY_ERRORS = ("invalid_key", "quota")
+
+
+def _split_env(name: str) -> List[str]:
+    return [part.strip() for part in os.getenv(name, "").split(",") if part.strip()]
+
+
+@dataclass(frozen=True)
+class RouteTarget:
+    api_key: str
+    model: str
+    # Lower tiers are always preferred while healthy: a player's own key (0) before server keys (1).
+    tier: int = 0
+
+
+class RouteHealth:
+    """
+    Rolling view of one (key, model): EWMA latency, error rate over the last
+    window calls within window_sec, and a cooldown after quota/key errors.
+    Old outcomes age out, so a degraded target recovers without traffic.
+    """
+
+    def __init__(self, window: int = 20, window_sec: float = 300.0, alpha: float = 0.2):
+        self._lock = threading.Lock()
+        self.alpha = alpha
+        self.ewma_ms: Optional[float] = None
+        self.window_sec = float(window_sec)
+        self._outcomes: Deque[Tuple[float, bool]] = deque(maxlen=max(1, int(window)))
+        self.cooldown_until = 0.0
+        self.last_error = ""
+        self.calls = 0
+        self.errors = 0
+
+    def record(self, result: LLMCallResult, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.calls += 1
+            self._outcomes.append((now, result.error is None))
+            if result.error is None:
+                if not result.cached:
+                    latency = float(result.latency_ms)
+                    self.ewma_ms = latency if self.ewma_ms is None else self.ewma_ms + self.alpha * (latency - self.ewma_ms)
+                return
+            self.errors += 1
+            self.last_error = result.error
+            cooldown = ERROR_COOLDOWN_SEC.get(result.error, 0.0)
+            if cooldown:
+                self.cooldown_until = max(self.cooldown_until, now + cooldown)
+
+    def error_rate(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            recent = [ok for ts, ok in self._outcomes if now - ts <= self.window_sec]
+        if not recent:
+            return 0.0
+        return 1.0 - sum(recent) / len(recent)
+
+    def available(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return now >= self.cooldown_until
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.monotonic() if now is None else now
+        error_rate = self.error_rate(now)
+        with self._lock:
+            return {
+                "ewma_ms": self.ewma_ms,
+                "error_rate": error_rate,
+                "calls": self.calls,
+                "errors": self.errors,
+                "cooldown_sec": max(0.0, self.cooldown_until - now),
+                "last_error": self.last_error,
+            }
+
+
+_HEALTH: Dict[Tuple[str, str], RouteHealth] = {}
+_HEALTH_LOCK = threading.Lock()
+
+_COUNTERS: Dict[str, int] = {}
+_COUNTERS_LOCK = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _COUNTERS_LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + 1
+
+
+def route_health(target: RouteTarget) -> RouteHealth:
+    bucket = (key_fingerprint(target.api_key), target.model)
+    with _HEALTH_LOCK:
+        health = _HEALTH.get(bucket)
+        if health is None:
+            health = _HEALTH[bucket] = RouteHealth()
+        return health
+
+
+def router_stats() -> Dict[str, Any]:
+    with _HEALTH_LOCK:
+        items = list(_HEALTH.items())
+    return {f"{key}:{model}": health.snapshot() for (key, model), health in items}
+
+
+class RouterProvider:
+    """
+    LLMProvider over several (key, model) targets.
+
+    Each turn goes to the best healthy target: lowest tier first, then the
+    lowest EWMA latency ("fastest") or configured order ("ordered"). Targets
+    with an open circuit breaker, a quota/key cooldown or an error rate over
+    max_error_rate are only used after every healthy one has failed. Failed
+    calls move on to the next target, up to max_tries. A player's own key
+    that is rejected or out of quota ends the turn with that error unless
+    byok_fallback allows moving on to server keys.
+    """
+
+    def __init__(
+        self,
+        targets: List[RouteTarget],
+        policy: str = "fastest",
+        max_tries: int = 2,
+        max_error_rate: float = 0.5,
+        call_policy: Optional[CallPolicy] = None,
+        cache: Optional[CompletionCache] = None,
+        byok_fallback: bool = False,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown routing policy: {policy}")
+        self.targets = [t for t in targets if t.api_key and t.model]
+        if not self.targets:
+            raise ValueError("RouterProvider needs at least one target with a key and a model")
+        self.policy = policy
+        self.max_tries = max(1, int(max_tries))
+        self.max_error_rate = float(max_error_rate)
+        call_policy = call_policy or CallPolicy.from_env()
+        if len(self.targets) > 1:
+            # Moving to the next target is the retry; don't burn time retrying a sick one first.
+            call_policy = dataclasses.replace(call_policy, max_attempts=1)
+        self.call_policy = call_policy
+        self.cache = cache
+        self.byok_fallback = bool(byok_fallback)
+
+    @classmethod
+    def from_env(cls, user_key: Optional[str] = None) -> "RouterProvider":
+        """
+        OPENROUTER_ROUTER_MODELS and OPENROUTER_ROUTER_KEYS are comma lists;
+        every key is paired with every model. A player's own key forms tier 0;
+        OPENROUTER_ROUTER_BYOK_FALLBACK=1 lets its auth/quota failures fall
+        through to the server keys.
+        """
+        models = _split_env("OPENROUTER_ROUTER_MODELS") or [os.getenv("OPENROUTER_MODEL", DEFAULT_MODEL).strip() or DEFAULT_MODEL]
+        server_keys = _split_env("OPENROUTER_ROUTER_KEYS") or [os.getenv("OPENROUTER_API_KEY", "").strip()]
+        targets: List[RouteTarget] = []
+        user_key = (user_key or "").strip()
+        if user_key:
+            targets.extend(RouteTarget(user_key, model, tier=0) for model in models)
+        targets.extend(RouteTarget(key, model, tier=1) for key in server_keys if key and key != user_key for model in models)
+        return cls(
+            targets,
+            policy=os.getenv("OPENROUTER_ROUTER_POLICY", "fastest").strip().lower() or "fastest",
+            max_tries=int(os.getenv("OPENROUTER_ROUTER_MAX_TRIES", "2")),
+            max_error_rate=float(os.getenv("OPENROUTER_ROUTER_MAX_ERROR_RATE", "0.5")),
+            byok_fallback=os.getenv("OPENROUTER_ROUTER_BYOK_FALLBACK", "0").strip() == "1",
+        )
+
+    def for_turn_class(self, turn_class: str) -> "RouterProvider":
+        """Keep every key but route only to the tier's model, when one is configured."""
+        model = get_model_tiers().model_for(turn_class)
+        if not model:
+            return self
+        targets: List[RouteTarget] = []
+        for target in self.targets:
+            retargeted = RouteTarget(target.api_key, model, target.tier)
+            if retargeted not in targets:
+                targets.append(retargeted)
+        return RouterProvider(
+            targets,
+            policy=self.policy,
+            max_tries=self.max_tries,
+            max_error_rate=self.max_error_rate,
+            call_policy=self.call_policy,
+            cache=self.cache,
+            byok_fallback=self.byok_fallback,
+        )
+
+    def _healthy(self, target: RouteTarget, now: float) -> bool:
+        health = route_health(target)
+        return (
+            health.available(now)
+            and health.error_rate(now) <= self.max_error_rate
+            and get_breaker(target.api_key, target.model).state != "open"
+        )
+
+    def _own_key_benched(self, now: float) -> bool:
+        """A tier-0 target is cooling down after an auth or quota failure."""
+        for target in self.targets:
+            if target.tier != 0:
+                continue
+            health = route_health(target)
+            if health.last_error in USER_KEY_ERRORS and not health.available(now):
+                return True
+        return False
+
+    def rank(self, now: Optional[float] = None) -> List[RouteTarget]:
+        now = time.monotonic() if now is None else now
+        healthy: List[Tuple[Any, ...]] = []
+        degraded: List[Tuple[Any, ...]] = []
+        for idx, target in enumerate(self.targets):
+            health = route_health(target)
+            if self._healthy(target, now):
+                # Untried targets rank as 0 ms so each one gets measured.
+                speed = (health.ewma_ms or 0.0) if self.policy == "fastest" else 0.0
+                healthy.append((target.tier, speed, idx, target))
+            else:
+                degraded.append((health.cooldown_until, health.error_rate(now), idx, target))
+        ranked = [row[-1] for row in sorted(healthy)] + [row[-1] for row in sorted(degraded)]
+        if not self.byok_fallback and self._own_key_benched(now):
+            # Keep hitting the player's key so they keep seeing why, rather than serving them on ours.
+            ranked = [target for target in ranked if target.tier == 0]
+        return ranked
+
+    def generate(self, dm_system: str, dm_context: str, player_input: str) -> LLMCallResult:
+        started = time.perf_counter()
+        result: Optional[LLMCallResult] = None
+        for attempt, target in enumerate(self.rank()[: self.max_tries]):
+            if attempt:
+                _count("reroutes")
+            provider = OpenRouterProvider(
+                api_key=target.api_key, model=target.model, cache=self.cache, policy=self.call_policy, fallback=None
+            )
+            result = provider.generate(dm_system, dm_context, player_input)
+            route_health(target).record(result)
+            if result.error is None:
+                break
+            if target.tier == 0 and result.error in USER_KEY_ERRORS and not self.byok_fallback:
+                _count("byok_errors")
+                break
+        assert result is not None
+        result.latency_ms = int((time.perf_counter() - started) * 1000)
+        return result
+
+
+def routing_enabled() -> bool:
+    return bool(_split_env("OPENROUTER_ROUTER_MODELS") or _split_env("OPENROUTER_ROUTER_KEYS"))
+
+
+def make_provider(api_key: Optional[str] = None) -> LLMProvider:
+    """RouterProvider when OPENROUTER_ROUTER_MODELS/KEYS are set, else a single OpenRouterProvider."""
+    if routing_enabled():
+        try:
+            return RouterProvider.from_env(api_key)
+        except ValueError:
+            pass
+    return OpenRouterProvider(api_key=api_key)
+
+
+def routing_stats() -> Dict[str, Any]:
+    with _COUNTERS_LOCK:
+        counters = dict(_COUNTERS)
+    return {"enabled": routing_enabled(), **counters, "targets": router_stats()}
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import copy
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Set, Tuple
+
+from xiyou_solo.infra.metrics import LatencyStats
+from xiyou_solo.llm.directive_parser import load_structured, parse_dm_output, parse_structured
+
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+DIRECTIVE_SCHEMA_PATH = BASE_DIR / "schemas" / "directive_schema.json"
+
+OFF = "off"
+JSON_SCHEMA = "json_schema"
+TOOLS = "tools"
+AUTO = "auto"
+MODES = (OFF, JSON_SCHEMA, TOOLS, AUTO)
+TOOL_NAME = "dm_turn"
+
+# What "auto" picks per model family; anything else stays on the two-part text format.
+JSON_SCHEMA_PREFIXES = ("openai/", "google/gemini")
+TOOLS_PREFIXES = ("anthropic/", "mistralai/", "qwen/")
+
+STRUCTURED_NOTE = (
+    "\n\n[Output format]\n"
+    'Reply with one JSON object {"narrative": <Part A text>, "directive": <Part B object>} '
+    "instead of the two-part text. No code fences."
+)
+
+
+@lru_cache(maxsize=1)
+def turn_schema() -> Dict[str, Any]:
+    """JSON schema of a whole DM reply: the narrative plus directive_schema.json."""
+    directive = json.loads(DIRECTIVE_SCHEMA_PATH.read_text(encoding="utf-8"))
+    directive.pop("$schema", None)
+    return {
+        "type": "object",
+        "properties": {"narrative": {"type": "string"}, "directive": directive},
+        "required": ["narrative", "directive"],
+    }
+
+
+# (model, mode) pairs the upstream rejected with a 400; they drop back to text for the process lifetime.
+_UNSUPPORTED: Set[Tuple[str, str]] = set()
+_UNSUPPORTED_LOCK = threading.Lock()
+_REJECTION_WORDS = ("response_format", "json_schema", "tool_choice", "tools", "tool use", "function call")
+
+
+def configured_mode() -> str:
+    mode = os.getenv("OPENROUTER_STRUCTURED", AUTO).strip().lower()
+    return mode if mode in MODES else AUTO
+
+
+def mode_for(model: str) -> str:
+    mode = configured_mode()
+    if mode == AUTO:
+        if model.startswith(JSON_SCHEMA_PREFIXES):
+            mode = JSON_SCHEMA
+        elif model.startswith(TOOLS_PREFIXES):
+            mode = TOOLS
+        else:
+            mode = OFF
+    with _UNSUPPORTED_LOCK:
+        if (model, mode) in _UNSUPPORTED:
+            return OFF
+    return mode
+
+
+def rejects_mode(body: bytes) -> bool:
+    """Whether a 400 body is about the structured fields, rather than e.g. context length or a bad model id."""
+    text = body.decode("utf-8", "replace").lower()
+    return any(word in text for word in _REJECTION_WORDS)
+
+
+def mark_unsupported(model: str, mode: str) -> None:
+    with _UNSUPPORTED_LOCK:
+        _UNSUPPORTED.add((model, mode))
+    _STATS.count(model, "rejected")
+
+
+def request_fields(mode: str) -> Dict[str, Any]:
+    """Extra chat-completions fields for the mode (empty for text)."""
+    if mode == JSON_SCHEMA:
+        # Not strict: the schema leaves fields optional and the reply is normalized anyway.
+        return {
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": TOOL_NAME, "strict": False, "schema": copy.deepcopy(turn_schema())},
+            }
+        }
+    if mode == TOOLS:
+        return {
+            "tools": [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": TOOL_NAME,
+                        "description": "Narrate the turn and return the rules directive.",
+                        "parameters": copy.deepcopy(turn_schema()),
+                    },
+                }
+            ],
+            "tool_choice": {"type": "function", "function": {"name": TOOL_NAME}},
+        }
+    return {}
+
+
+def message_text(message: Dict[str, Any], mode: str) -> str:
+    """The reply body to parse: the forced tool call's arguments in tools mode, else the content."""
+    if mode == TOOLS:
+        for call in message.get("tool_calls") or []:
+            fn = call.get("function", {}) if isinstance(call, dict) else {}
+            if fn.get("name") == TOOL_NAME and isinstance(fn.get("arguments"), str):
+                return fn["arguments"].strip()
+    content = message.get("content")
+    return content.strip() if isinstance(content, str) else ""
+
+
+class ParseStats:
+    """Per-model parse time and how often a structured reply had to be parsed as text."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, Any]] = {}
+
+    def _row(self, model: str) -> Dict[str, Any]:
+        row = self._models.get(model)
+        if row is None:
+            row = self._models[model] = {"structured": 0, "fallback": 0, "text": 0, "rejected": 0, "parse_ms": LatencyStats()}
+        return row
+
+    def count(self, model: str, outcome: str) -> None:
+        with self._lock:
+            self._row(model)[outcome] += 1
+
+    def record(self, model: str, outcome: str, parse_ms: float) -> None:
+        with self._lock:
+            row = self._row(model)
+            row[outcome] += 1
+        row["parse_ms"].record(parse_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = {model: dict(row) for model, row in self._models.items()}
+        out: Dict[str, Any] = {}
+        for model, row in rows.items():
+            asked = row["structured"] + row["fallback"]
+            out[model] = {
+                "structured": row["structured"],
+                "fallback": row["fallback"],
+                "text": row["text"],
+                "rejected": row["rejected"],
+                "fallback_rate": row["fallback"] / asked if asked else 0.0,
+                "parse_ms": row["parse_ms"].snapshot(),
+            }
+        return out
+
+
+_STATS = ParseStats()
+
+
+def parse_reply(model: str, raw_text: str, mode: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Structured replies are read directly; text replies (or broken structured
+    ones) go through parse_dm_output, keeping a structured reply's narrative
+    field when only its directive is unusable.
+    """
+    started = time.perf_counter()
+    parsed = parse_structured(raw_text) if mode != OFF else None
+    if parsed is None:
+        parsed = parse_dm_output(raw_text)
+        outcome = "text" if mode == OFF else "fallback"
+        obj = load_structured(raw_text) if mode != OFF else None
+        narrative = obj.get("narrative") if obj is not None else None
+        if isinstance(narrative, str) and narrative.strip():
+            # A JSON object with a bad directive: the whole reply is the JSON blob, so keep its narrative.
+            parsed = (narrative.strip(), parsed[1])
+    else:
+        outcome = "structured"
+    _STATS.record(model, outcome, (time.perf_counter() - started) * 1000)
+    return parsed
+
+
+def parse_stats() -> Dict[str, Any]:
+    return _STATS.snapshot()
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from xiyou_solo.core.turn_class import COMBAT_ENTRY, FINALE, TURN_CLASSES
+from xiyou_solo.infra.metrics import LatencyStats
+from xiyou_solo.llm.base import LLMCallResult
+
+
+LIGHT = "light"
+STRONG = "strong"
+DEFAULT_TIER_MAP = {cls: STRONG if cls in {COMBAT_ENTRY, FINALE} else LIGHT for cls in TURN_CLASSES}
+
+
+@dataclass
+class ModelTiers:
+    """Turn class -> tier -> model. A tier without a model keeps the provider's own model."""
+
+    tier_map: Dict[str, str] = field(default_factory=lambda: dict(DEFAULT_TIER_MAP))
+    models: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_env(cls) -> "ModelTiers":
+        """
+        TURN_TIERS="routine=light,finale=strong,..." overrides the class map;
+        OPENROUTER_MODEL_<TIER> (e.g. OPENROUTER_MODEL_LIGHT) names each tier's model.
+        """
+        tier_map = dict(DEFAULT_TIER_MAP)
+        for part in os.getenv("TURN_TIERS", "").split(","):
+            name, _, tier = part.partition("=")
+            if name.strip() in tier_map and tier.strip():
+                tier_map[name.strip()] = tier.strip().lower()
+        models: Dict[str, str] = {}
+        for tier in set(tier_map.values()):
+            model = os.getenv(f"OPENROUTER_MODEL_{tier.upper()}", "").strip()
+            if model:
+                models[tier] = model
+        return cls(tier_map=tier_map, models=models)
+
+    def tier_for(self, turn_class: str) -> str:
+        return self.tier_map.get(turn_class, LIGHT)
+
+    def model_for(self, turn_class: str) -> Optional[str]:
+        return self.models.get(self.tier_for(turn_class))
+
+
+_TIERS: Optional[ModelTiers] = None
+_TIERS_LOCK = threading.Lock()
+
+
+def get_model_tiers() -> ModelTiers:
+    global _TIERS
+    if _TIERS is None:
+        with _TIERS_LOCK:
+            if _TIERS is None:
+                _TIERS = ModelTiers.from_env()
+    return _TIERS
+
+
+class TierReport:
+    """Per-tier turn counts, latency and token usage, to compare what each tier costs."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._tiers: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, tier: str, turn_class: str, result: LLMCallResult) -> None:
+        with self._lock:
+            row = self._tiers.get(tier)
+            if row is None:
+                row = self._tiers[tier] = {"turns": 0, "classes": {}, "models": {}, "tokens": 0, "errors": 0, "latency": LatencyStats()}
+            row["turns"] += 1
+            row["classes"][turn_class] = row["classes"].get(turn_class, 0) + 1
+            model = result.model or "default"
+            row["models"][model] = row["models"].get(model, 0) + 1
+            row["tokens"] += int(result.tokens or 0)
+            if result.error is not None:
+                row["errors"] += 1
+        row["latency"].record(float(result.latency_ms))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = {tier: dict(row) for tier, row in self._tiers.items()}
+        out: Dict[str, Any] = {}
+        for tier, row in rows.items():
+            turns = row["turns"]
+            out[tier] = {
+                "turns": turns,
+                "classes": dict(row["classes"]),
+                "models": dict(row["models"]),
+                "tokens": row["tokens"],
+                "tokens_per_turn": row["tokens"] / turns if turns else 0.0,
+                "errors": row["errors"],
+                "latency_ms": row["latency"].snapshot(),
+            }
+        return out
+
+
+_REPORT = TierReport()
+
+
+def record_turn(turn_class: str, result: LLMCallResult) -> str:
+    """Book one LLM turn under its tier; returns the tier name."""
+    tier = get_model_tiers().tier_for(turn_class)
+    _REPORT.record(tier, turn_class, result)
+    return tier
+
+
+def tier_report() -> Dict[str, Any]:
+    return _REPORT.snapshot()
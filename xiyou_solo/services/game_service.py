@@ -1,15 +1,33 @@
 from __future__ import annotations
 
+import os
+import threading
 import time
+import warnings
+from concurrent.futures import Future
 from typing import Any, Callable, Dict, List, Optional
 
+from xiyou_solo.infra.dispatcher import KeyedDispatcher
+from xiyou_solo.infra.rate_limit import RateLimiter
 from xiyou_solo.infra.session_store import make_session_id
+from xiyou_solo.infra.turn_queue import TransientTurnError
 
 from . import room_repo
 
 
 TurnExecutor = Callable[[str, str, str, Dict[str, Any]], str]
 
+_DISPATCHER: Optional[KeyedDispatcher] = None
+_DISPATCHER_LOCK = threading.Lock()
+_LIMITS: Optional[Dict[str, RateLimiter]] = None
+_LIMITS_LOCK = threading.Lock()
+
+_LIMIT_REPLIES = {
+    "user": "Too many commands. Please wait a moment.",
+    "group": "This group is sending commands too fast. Please wait a moment.",
+    "global": "Server is busy. Please try again shortly.",
+}
+
 
 def _help_text() -> str:
     return (
@@ -30,6 +48,10 @@ def _parse_cmd(text: str) -> tuple[str, str]:
     return cmd, arg
 
 
+def is_turn_command(text: str) -> bool:
+    return _parse_cmd(text)[0] == "act"
+
+
 def _room_summary(group_id: str, data: Dict[str, Any]) -> str:
     room = room_repo.get_room(data, group_id)
     if not room:
@@ -43,6 +65,85 @@ def _room_summary(group_id: str, data: Dict[str, Any]) -> str:
     )
 
 
+def build_limits(
+    user_rate: float = 1.0,
+    user_burst: float = 10,
+    group_rate: float = 3.0,
+    group_burst: float = 30,
+    global_rate: float = 50.0,
+    global_burst: float = 200,
+) -> Dict[str, RateLimiter]:
+    """Token buckets checked in order user -> group -> global; rate <= 0 disables one."""
+    return {
+        "user": RateLimiter(user_rate, user_burst),
+        "group": RateLimiter(group_rate, group_burst),
+        "global": RateLimiter(global_rate, global_burst),
+    }
+
+
+def get_limits() -> Dict[str, RateLimiter]:
+    global _LIMITS
+    if _LIMITS is None:
+        with _LIMITS_LOCK:
+            if _LIMITS is None:
+                _LIMITS = build_limits(
+                    user_rate=float(os.getenv("GAME_USER_RATE", "1.0")),
+                    user_burst=float(os.getenv("GAME_USER_BURST", "10")),
+                    group_rate=float(os.getenv("GAME_GROUP_RATE", "3.0")),
+                    group_burst=float(os.getenv("GAME_GROUP_BURST", "30")),
+                    global_rate=float(os.getenv("GAME_GLOBAL_RATE", "50")),
+                    global_burst=float(os.getenv("GAME_GLOBAL_BURST", "200")),
+                )
+    return _LIMITS
+
+
+def check_limits(group_id: str, user_id: str, now: Optional[float] = None) -> Optional[str]:
+    """
+    Return the scope that rejected the message, or None when it may proceed.
+    A rejected message costs nothing: tokens already taken from the earlier
+    scopes are refunded, so a busy group does not drain its users' buckets.
+    """
+    keys = {"user": (group_id, user_id), "group": group_id, "global": ""}
+    taken: List[tuple[RateLimiter, Any]] = []
+    for scope, limiter in get_limits().items():
+        if not limiter.allow(keys[scope], now):
+            for earlier, key in taken:
+                earlier.refund(key)
+            return scope
+        taken.append((limiter, keys[scope]))
+    return None
+
+
+def admit_message(group_id: str, user_id: str, message_id: str, now_ts: Optional[float] = None) -> Optional[str]:
+    """
+    Dedup and rate-limit a message before it is queued for later; returns
+    the reply that ends it here, or None when it may be queued. A message
+    admitted here must then run with ``check_rate=False``.
+    """
+    ts = float(now_ts if now_ts is not None else time.time())
+    # Read-only and without the group lock, which a running turn of this group may hold for a while;
+    # ids that are queued but not yet processed are caught by the queue's own message-id index.
+    if message_id and room_repo.is_processed(room_repo.load_group(group_id), group_id, message_id, now=ts):
+        return "Duplicate message ignored."
+    rejected = check_limits(group_id, user_id, now_ts)
+    return _LIMIT_REPLIES[rejected] if rejected else None
+
+
+def limit_stats() -> Dict[str, Any]:
+    return {scope: limiter.stats() for scope, limiter in get_limits().items()}
+
+
+def _warn_min_interval(min_interval_sec: Optional[float]) -> None:
+    # Kept for one release so existing callers do not break; remove afterwards.
+    if min_interval_sec is not None:
+        warnings.warn(
+            "min_interval_sec is ignored: per-user/group/global token buckets (GAME_USER_RATE, "
+            "GAME_USER_BURST, ...) now limit every message; set a rate to 0 to disable that scope",
+            DeprecationWarning,
+            stacklevel=3,
+        )
+
+
 def handle_message(
     group_id: str,
     user_id: str,
@@ -50,31 +151,49 @@ def handle_message(
     message_id: str,
     turn_executor: Optional[TurnExecutor] = None,
     now_ts: Optional[float] = None,
-    min_interval_sec: float = 0.0,
+    min_interval_sec: Optional[float] = None,
+    *,
+    check_rate: bool = True,
 ) -> List[str]:
     """
     Message entry for adapters (wechat/telegram/discord).
 
     turn_executor receives: session_id, user_id, action_text, metadata
-    and should return text reply for group broadcast.
+    and should return text reply for group broadcast. check_rate=False skips
+    the rate limits for messages already admitted by admit_message.
+    min_interval_sec is deprecated and ignored; see get_limits().
     """
+    _warn_min_interval(min_interval_sec)
+    # Only this group's shard is loaded and locked; other groups proceed in parallel.
+    with room_repo.group_lock(group_id):
+        return _handle_locked(group_id, user_id, text, message_id, turn_executor, now_ts, check_rate)
+
+
+def _handle_locked(
+    group_id: str,
+    user_id: str,
+    text: str,
+    message_id: str,
+    turn_executor: Optional[TurnExecutor],
+    now_ts: Optional[float],
+    check_rate: bool = True,
+) -> List[str]:
     ts = float(now_ts if now_ts is not None else time.time())
-    data = room_repo.load_rooms()
+    data = room_repo.load_group(group_id)
     replies: List[str] = []
-    dedup_id = f"{group_id}:{message_id}" if message_id else ""
-
-    if dedup_id and room_repo.is_processed(data, dedup_id):
+    if message_id and room_repo.is_processed(data, group_id, message_id, now=ts):
         return ["Duplicate message ignored."]
-
-    last_ts = room_repo.get_rate_limit_ts(data, group_id, user_id)
-    if min_interval_sec > 0 and ts - last_ts < float(min_interval_sec):
-        return ["Too many commands. Please wait a moment."]
-    room_repo.set_rate_limit_ts(data, group_id, user_id, ts)
+    # Limits come after dedup, so a platform redelivery never spends a token or gets a rate-limit reply.
+    # The injected clock, not ts: the limiters run on time.monotonic() unless a caller supplies one.
+    rejected = check_limits(group_id, user_id, now_ts) if check_rate else None
+    if rejected:
+        return [_LIMIT_REPLIES[rejected]]
 
     cmd, arg = _parse_cmd(text)
     if not cmd:
-        room_repo.mark_processed(data, dedup_id)
-        room_repo.save_rooms(data)
+        if message_id:
+            room_repo.mark_processed(data, group_id, message_id, now=ts)
+        room_repo.save_group(group_id, data)
         return [_help_text()]
 
     room = room_repo.get_room(data, group_id)
@@ -199,6 +318,9 @@ def handle_message(
                     try:
                         reply = turn_executor(sid, user_id, arg, {"group_id": group_id, "message_id": message_id})
                         replies.append(reply)
+                    except TransientTurnError:
+                        # Nothing saved yet; the turn queue retries the whole message.
+                        raise
                     except Exception as exc:  # pragma: no cover
                         replies.append(f"Action failed: {exc}")
                 nxt = room_repo.next_turn_user(room)
@@ -208,7 +330,51 @@ def handle_message(
     else:
         replies.append(_help_text())
 
-    if dedup_id:
-        room_repo.mark_processed(data, dedup_id)
-    room_repo.save_rooms(data)
+    if message_id:
+        room_repo.mark_processed(data, group_id, message_id, now=ts)
+    room_repo.save_group(group_id, data)
     return replies
+
+
+def get_dispatcher() -> KeyedDispatcher:
+    global _DISPATCHER
+    if _DISPATCHER is None:
+        with _DISPATCHER_LOCK:
+            if _DISPATCHER is None:
+                _DISPATCHER = KeyedDispatcher(
+                    max_workers=int(os.getenv("GAME_SERVICE_WORKERS", "8")),
+                    max_queue_per_key=int(os.getenv("GAME_SERVICE_MAX_GROUP_QUEUE", "32")),
+                    name="group",
+                )
+    return _DISPATCHER
+
+
+def dispatch_message(
+    group_id: str,
+    user_id: str,
+    text: str,
+    message_id: str,
+    turn_executor: Optional[TurnExecutor] = None,
+    now_ts: Optional[float] = None,
+    min_interval_sec: Optional[float] = None,
+) -> "Future[List[str]]":
+    """
+    Queue handle_message on the group's FIFO. Messages of one group run in
+    arrival order; different groups run concurrently on the shared pool.
+    Raises infra.dispatcher.QueueFullError when the group's queue is full.
+    """
+    _warn_min_interval(min_interval_sec)
+    return get_dispatcher().submit(
+        group_id,
+        handle_message,
+        group_id,
+        user_id,
+        text,
+        message_id,
+        turn_executor=turn_executor,
+        now_ts=now_ts,
+    )
+
+
+def dispatcher_stats() -> Dict[str, Any]:
+    return get_dispatcher().stats()
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from xiyou_solo.llm.cache import completion_cache_stats
+from xiyou_solo.llm.openrouter import call_stats as openrouter_call_stats
+from xiyou_solo.llm.router import routing_stats
+from xiyou_solo.llm.structured import parse_stats
+from xiyou_solo.llm.tiers import tier_report
+from xiyou_solo.ui.bot_runner import turn_slot_stats
+
+
+def metrics_snapshot(limits: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    The turn and LLM sections every /metrics endpoint reports. ``limits``
+    adds a front end's own limiter stats next to the shared turn slots.
+    """
+    return {
+        "limits": {**(limits or {}), "turn_slots": turn_slot_stats()},
+        "llm_cache": completion_cache_stats(),
+        "openrouter": openrouter_call_stats(),
+        "routing": routing_stats(),
+        "turn_tiers": tier_report(),
+        "parsing": parse_stats(),
+    }
@@ -1,12 +1,31 @@
 from __future__ import annotations
 
+import hashlib
+import os
+import re
+import threading
 from dataclasses import dataclass
+from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+from xiyou_solo.infra.dedup import TTLDedupCache
 from xiyou_solo.infra.session_store import DATA_DIR, read_json, write_json
 
 
+# Legacy single-file store; split into per-group shards on first access.
 ROOMS_PATH = DATA_DIR / "rooms.json"
+ROOMS_DIR = DATA_DIR / "rooms"
+
+_LOCKS: Dict[str, threading.RLock] = {}
+_LOCKS_GUARD = threading.Lock()
+_MIGRATION_LOCK = threading.Lock()
+_LEGACY_CHECKED: Optional[Path] = None
+
+DEDUP_CAPACITY = int(os.getenv("ROOM_DEDUP_CAPACITY", "500"))
+DEDUP_TTL_SEC = float(os.getenv("ROOM_DEDUP_TTL_SEC", "86400"))
+# Keyed by shard path; hydrated from the shard's compact "processed" rows.
+_DEDUP: Dict[str, TTLDedupCache] = {}
+_DEDUP_GUARD = threading.Lock()
 
 
 @dataclass
@@ -20,20 +39,105 @@ class Room:
 
 
 def _default_rooms() -> Dict[str, Any]:
-    return {"rooms": {}, "bindings": {}, "processed": {}, "rate_limit": {}}
-
-
-def load_rooms() -> Dict[str, Any]:
-    data = read_json(ROOMS_PATH, _default_rooms())
+    return {"rooms": {}, "bindings": {}, "processed": []}
+
+
+def group_lock(group_id: str) -> threading.RLock:
+    """Per-group lock; hold it across load_group -> mutate -> save_group."""
+    lock = _LOCKS.get(group_id)
+    if lock is None:
+        with _LOCKS_GUARD:
+            lock = _LOCKS.setdefault(group_id, threading.RLock())
+    return lock
+
+
+def shard_path(group_id: str) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "_", group_id)[:40] or "group"
+    digest = hashlib.sha1(group_id.encode("utf-8")).hexdigest()[:10]
+    return ROOMS_DIR / f"{slug}-{digest}.json"
+
+
+def _legacy_group_of(key: str, group_ids: List[str]) -> str:
+    for gid in group_ids:
+        if key.startswith(f"{gid}:"):
+            return gid
+    return key.split(":", 1)[0]
+
+
+def migrate_legacy_rooms() -> int:
+    """Split a legacy rooms.json into per-group shards. Returns the number of shards written."""
+    global _LEGACY_CHECKED
+    if _LEGACY_CHECKED == ROOMS_PATH:
+        return 0
+    if not ROOMS_PATH.exists():
+        _LEGACY_CHECKED = ROOMS_PATH
+        return 0
+    with _MIGRATION_LOCK:
+        if not ROOMS_PATH.exists():
+            return 0
+        legacy = read_json(ROOMS_PATH, _default_rooms())
+        rooms = legacy.get("rooms", {}) if isinstance(legacy.get("rooms"), dict) else {}
+        # Longest ids first so "g:1" wins over "g" for key "g:1:user".
+        known = sorted(rooms.keys(), key=len, reverse=True)
+        shards: Dict[str, Dict[str, Any]] = {}
+
+        def shard(gid: str) -> Dict[str, Any]:
+            if gid not in shards:
+                # Legacy dict sections; "processed" is turned into dedup rows on first use.
+                shards[gid] = {"rooms": {}, "bindings": {}, "processed": {}}
+            return shards[gid]
+
+        for gid, room in rooms.items():
+            shard(gid)["rooms"][gid] = room
+        # The old persisted "rate_limit" timestamps are dropped; limits are in memory now.
+        for section in ("bindings", "processed"):
+            rows = legacy.get(section, {})
+            for key, val in (rows.items() if isinstance(rows, dict) else []):
+                shard(_legacy_group_of(str(key), known))[section][key] = val
+        # No group locks here: every load_group waits on _MIGRATION_LOCK first,
+        # so nobody can be holding a shard loaded before the split.
+        for gid, data in shards.items():
+            current = read_json(shard_path(gid), _default_rooms())
+            for section, rows in data.items():
+                if section == "processed" and isinstance(current.get(section), list):
+                    if rows:
+                        current[section] = dict.fromkeys([row[0] for row in current[section]] + list(rows), True)
+                    continue
+                current.setdefault(section, {}).update(rows)
+            write_json(shard_path(gid), current)
+        ROOMS_PATH.replace(ROOMS_PATH.with_suffix(".json.migrated"))
+        _LEGACY_CHECKED = ROOMS_PATH
+        return len(shards)
+
+
+def _nest_bindings(bindings: Any, group_id: str) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Fold flat "group:user" binding keys into {group_id: {user_id: binding}}."""
+    if not isinstance(bindings, dict):
+        return {}
+    prefix = f"{group_id}:"
+    flat = [key for key in bindings if key != group_id and key.startswith(prefix)]
+    if not flat:
+        return bindings
+    group = bindings.setdefault(group_id, {})
+    for key in flat:
+        val = bindings.pop(key)
+        if isinstance(val, dict):
+            group.setdefault(key[len(prefix) :], val)
+    return bindings
+
+
+def load_group(group_id: str) -> Dict[str, Any]:
+    migrate_legacy_rooms()
+    data = read_json(shard_path(group_id), _default_rooms())
     data.setdefault("rooms", {})
-    data.setdefault("bindings", {})
-    data.setdefault("processed", {})
-    data.setdefault("rate_limit", {})
+    data["bindings"] = _nest_bindings(data.get("bindings", {}), group_id)
+    data.setdefault("processed", [])
+    data.pop("rate_limit", None)
     return data
 
 
-def save_rooms(data: Dict[str, Any]) -> None:
-    write_json(ROOMS_PATH, data)
+def save_group(group_id: str, data: Dict[str, Any]) -> None:
+    write_json(shard_path(group_id), data)
 
 
 def get_room(data: Dict[str, Any], group_id: str) -> Optional[Dict[str, Any]]:
@@ -47,28 +151,31 @@ def set_room(data: Dict[str, Any], group_id: str, room: Dict[str, Any]) -> None:
 
 def remove_room(data: Dict[str, Any], group_id: str) -> None:
     data.setdefault("rooms", {}).pop(group_id, None)
-    key_prefix = f"{group_id}:"
+    data.setdefault("bindings", {}).pop(group_id, None)
+
+
+def _group_bindings(data: Dict[str, Any], group_id: str) -> Dict[str, Dict[str, Any]]:
     bindings = data.setdefault("bindings", {})
-    for key in [k for k in list(bindings.keys()) if k.startswith(key_prefix)]:
-        bindings.pop(key, None)
+    group = bindings.get(group_id)
+    if not isinstance(group, dict):
+        group = bindings[group_id] = {}
+    return group
 
 
 def bind_player(data: Dict[str, Any], group_id: str, user_id: str, role_name: str) -> None:
-    key = f"{group_id}:{user_id}"
-    data.setdefault("bindings", {})[key] = {"role_name": role_name}
+    _group_bindings(data, group_id)[user_id] = {"role_name": role_name}
 
 
 def get_binding(data: Dict[str, Any], group_id: str, user_id: str) -> Optional[Dict[str, Any]]:
-    return data.setdefault("bindings", {}).get(f"{group_id}:{user_id}")
+    group = data.setdefault("bindings", {}).get(group_id)
+    return group.get(user_id) if isinstance(group, dict) else None
 
 
 def list_group_bindings(data: Dict[str, Any], group_id: str) -> Dict[str, Dict[str, Any]]:
-    prefix = f"{group_id}:"
-    out: Dict[str, Dict[str, Any]] = {}
-    for key, val in data.setdefault("bindings", {}).items():
-        if key.startswith(prefix) and isinstance(val, dict):
-            out[key[len(prefix) :]] = val
-    return out
+    group = data.setdefault("bindings", {}).get(group_id)
+    if not isinstance(group, dict):
+        return {}
+    return {uid: val for uid, val in group.items() if isinstance(val, dict)}
 
 
 def ensure_room_shape(group_id: str, room: Dict[str, Any]) -> Dict[str, Any]:
@@ -100,28 +207,43 @@ def next_turn_user(room: Dict[str, Any]) -> str:
     return nxt
 
 
-def mark_processed(data: Dict[str, Any], message_id: str) -> None:
-    data.setdefault("processed", {})[message_id] = True
-    # Keep last 500 ids to avoid infinite growth.
-    keys = list(data["processed"].keys())
-    if len(keys) > 500:
-        for k in keys[:-500]:
-            data["processed"].pop(k, None)
-
-
-def is_processed(data: Dict[str, Any], message_id: str) -> bool:
-    return bool(data.setdefault("processed", {}).get(message_id))
-
-
-def get_rate_limit_ts(data: Dict[str, Any], group_id: str, user_id: str) -> float:
-    key = f"{group_id}:{user_id}"
-    raw = data.setdefault("rate_limit", {}).get(key, 0.0)
-    try:
-        return float(raw)
-    except (TypeError, ValueError):
-        return 0.0
-
-
-def set_rate_limit_ts(data: Dict[str, Any], group_id: str, user_id: str, ts: float) -> None:
-    key = f"{group_id}:{user_id}"
-    data.setdefault("rate_limit", {})[key] = float(ts)
+def dedup_cache(data: Dict[str, Any], group_id: str, now: Optional[float] = None) -> TTLDedupCache:
+    key = str(shard_path(group_id))
+    cache = _DEDUP.get(key)
+    if cache is None:
+        with _DEDUP_GUARD:
+            cache = _DEDUP.get(key)
+            if cache is None:
+                rows = data.get("processed", [])
+                if isinstance(rows, dict):
+                    # Pre-shard ids were stored as "<group>:<message>".
+                    prefix = f"{group_id}:"
+                    rows = {k[len(prefix) :] if k.startswith(prefix) else k: v for k, v in rows.items()}
+                cache = TTLDedupCache.from_compact(rows, capacity=DEDUP_CAPACITY, ttl_sec=DEDUP_TTL_SEC, now=now)
+                _DEDUP[key] = cache
+    return cache
+
+
+def mark_processed(data: Dict[str, Any], group_id: str, message_id: str, now: Optional[float] = None) -> None:
+    cache = dedup_cache(data, group_id, now)
+    cache.add(message_id, now)
+    data["processed"] = cache.to_compact()
+
+
+def is_processed(data: Dict[str, Any], group_id: str, message_id: str, now: Optional[float] = None) -> bool:
+    return dedup_cache(data, group_id, now).seen(message_id, now)
+
+
+def dedup_stats() -> Dict[str, Any]:
+    with _DEDUP_GUARD:
+        caches = list(_DEDUP.values())
+    hits = sum(c.hits for c in caches)
+    misses = sum(c.misses for c in caches)
+    return {
+        "groups": len(caches),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        "evicted": sum(c.evicted for c in caches),
+        "expired": sum(c.expired for c in caches),
+    }
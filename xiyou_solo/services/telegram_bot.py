@@ -1,54 +1,68 @@
 from __future__ import annotations
 
+import http.client
 import json
 import os
+import threading
 import time
-import urllib.error
 import urllib.parse
-import urllib.request
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-from xiyou_solo.services.tg_handler import handle_chat_text
+from xiyou_solo.infra.dispatcher import KeyedDispatcher, QueueFullError
+from xiyou_solo.infra.http_pool import HTTPStatusError, get_pool
+from xiyou_solo.llm import openrouter
+from xiyou_solo.services.telegram_sender import OutboundQueue
+from xiyou_solo.services.telegram_state import OffsetStore, ReplyCache
+from xiyou_solo.services.tg_handler import ServerBusy, handle_chat_text
 
 
-MAX_REPLY_LEN = 3500
+# Point at a local fake in tests or at a self-hosted Bot API server.
+API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").strip().rstrip("/") or "https://api.telegram.org"
+# Updates run on a pool keyed by chat_id: one chat stays in order, chats run in parallel.
+WORKERS = int(os.getenv("TELEGRAM_WORKERS", "8"))
+MAX_CHAT_QUEUE = int(os.getenv("TELEGRAM_MAX_CHAT_QUEUE", "16"))
+# Stop long-polling for more updates while this many are still pending.
+MAX_PENDING = int(os.getenv("TELEGRAM_MAX_PENDING", "256"))
+REPLY_CACHE_SIZE = int(os.getenv("TELEGRAM_REPLY_CACHE_SIZE", "1000"))
+INTERNAL_ERROR_REPLY = "Something went wrong while playing that. Please send it again."
+
+_REPLY_CACHE: Optional[ReplyCache] = None
+_REPLY_CACHE_LOCK = threading.Lock()
+_SENDERS: Dict[str, OutboundQueue] = {}
+_SENDERS_LOCK = threading.Lock()
 
 
 def _api_base(token: str) -> str:
-    return f"https://api.telegram.org/bot{token}"
+    return f"{API_BASE}/bot{token}"
 
 
 def _http_get_json(url: str, timeout: int = 40) -> Dict[str, Any]:
-    with urllib.request.urlopen(url, timeout=timeout) as resp:
-        body = resp.read().decode("utf-8")
-    return json.loads(body)
+    return get_pool().request_json("GET", url, timeout=timeout)
 
 
 def _http_post_json(url: str, payload: Dict[str, Any], timeout: int = 20) -> Dict[str, Any]:
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        url,
-        data=data,
-        method="POST",
-        headers={"Content-Type": "application/json"},
-    )
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        body = resp.read().decode("utf-8")
-    return json.loads(body)
+    return get_pool().request_json("POST", url, payload=payload, timeout=timeout)
+
+
+def get_sender(token: str) -> OutboundQueue:
+    sender = _SENDERS.get(token)
+    if sender is None:
+        with _SENDERS_LOCK:
+            sender = _SENDERS.get(token)
+            if sender is None:
+                sender = _SENDERS[token] = OutboundQueue(
+                    lambda chat_id, text: _http_post_json(f"{_api_base(token)}/sendMessage", {"chat_id": chat_id, "text": text}),
+                    per_chat_rate=float(os.getenv("TELEGRAM_CHAT_SEND_RATE", "1")),
+                    per_chat_burst=float(os.getenv("TELEGRAM_CHAT_SEND_BURST", "3")),
+                    global_rate=float(os.getenv("TELEGRAM_GLOBAL_SEND_RATE", "30")),
+                    global_burst=float(os.getenv("TELEGRAM_GLOBAL_SEND_BURST", "30")),
+                )
+    return sender
 
 
 def send_message(token: str, chat_id: int, text: str) -> None:
-    safe_text = (text or "").strip()
-    if not safe_text:
-        return
-    if len(safe_text) > MAX_REPLY_LEN:
-        safe_text = safe_text[:MAX_REPLY_LEN] + "\n...[truncated]"
-    url = f"{_api_base(token)}/sendMessage"
-    payload = {"chat_id": chat_id, "text": safe_text}
-    try:
-        _http_post_json(url, payload)
-    except Exception as exc:
-        print(f"[warn] sendMessage failed: {exc}")
+    """Queue a reply for delivery; long replies are split rather than truncated."""
+    get_sender(token).send(chat_id, text)
 
 
 def _extract_messages(updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -71,40 +85,110 @@ def _extract_messages(updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     return out
 
 
+def get_reply_cache() -> ReplyCache:
+    global _REPLY_CACHE
+    if _REPLY_CACHE is None:
+        with _REPLY_CACHE_LOCK:
+            if _REPLY_CACHE is None:
+                _REPLY_CACHE = ReplyCache(capacity=REPLY_CACHE_SIZE)
+    return _REPLY_CACHE
+
+
+def _process_update(token: str, chat_id: int, text: str, update_id: Optional[int] = None) -> None:
+    cache = get_reply_cache() if update_id is not None else None
+    reply = cache.get(update_id) if cache is not None else None
+    if reply is None:
+        try:
+            reply = handle_chat_text(chat_id, text)
+        except Exception as exc:
+            # Only played turns are cached. A failed one releases its claim, so a redelivery runs it again.
+            if cache is not None:
+                cache.release(update_id)
+            if not isinstance(exc, ServerBusy):
+                print(f"[warn] update {update_id} for chat {chat_id} failed: {exc!r}")
+            send_message(token, chat_id, str(exc) if isinstance(exc, ServerBusy) else INTERNAL_ERROR_REPLY)
+            return
+        # Cached before sending: a crash after this point resends, it never replays the turn.
+        if cache is not None:
+            cache.put(update_id, chat_id, reply)
+    send_message(token, chat_id, reply)
+
+
+def _process_tracked(token: str, chat_id: int, text: str, update_id: int, offsets: OffsetStore) -> None:
+    try:
+        _process_update(token, chat_id, text, update_id)
+    finally:
+        offsets.done(update_id)
+
+
+def make_dispatcher() -> KeyedDispatcher:
+    return KeyedDispatcher(max_workers=WORKERS, max_queue_per_key=MAX_CHAT_QUEUE, name="tg-chat")
+
+
+def poll_once(
+    token: str, offset: int, dispatcher: KeyedDispatcher, timeout: int = 30, offsets: Optional[OffsetStore] = None
+) -> int:
+    """Fetch one getUpdates batch, hand it to the dispatcher and return the next offset."""
+    params = urllib.parse.urlencode({"timeout": timeout, "offset": offset})
+    obj = _http_get_json(f"{_api_base(token)}/getUpdates?{params}", timeout=timeout + 10)
+    if not obj.get("ok", False):
+        print(f"[warn] getUpdates not ok: {obj}")
+        time.sleep(2)
+        return offset
+    updates = obj.get("result", [])
+    if not isinstance(updates, list):
+        time.sleep(1)
+        return offset
+    for item in updates:
+        # Advance past every update, including ones that carry no text message.
+        if isinstance(item, dict) and isinstance(item.get("update_id"), int):
+            offset = max(offset, item["update_id"] + 1)
+    for row in _extract_messages(updates):
+        chat_id = int(row["chat_id"])
+        update_id = int(row["update_id"])
+        try:
+            if offsets is None:
+                dispatcher.submit(chat_id, _process_update, token, chat_id, str(row["text"]), update_id)
+            else:
+                offsets.begin(update_id)
+                dispatcher.submit(chat_id, _process_tracked, token, chat_id, str(row["text"]), update_id, offsets)
+        except QueueFullError:
+            if offsets is not None:
+                offsets.done(update_id)
+            send_message(token, chat_id, "Too many pending messages. Please wait for the current reply.")
+    if offsets is not None:
+        offsets.advance(offset)
+        offsets.save()
+    return offset
+
+
 def run_polling() -> None:
     token = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
     if not token:
         print("Missing TELEGRAM_BOT_TOKEN. Please set environment variable first.")
         return
 
-    offset = 0
-    print("Telegram bot polling started.")
+    offsets = OffsetStore()
+    offset = offsets.next_offset
+    dispatcher = make_dispatcher()
+    # Open the Telegram and OpenRouter connections before the first update arrives.
+    get_pool().prewarm(_api_base(token), 2)
+    openrouter.prewarm(1)
+    print(f"Telegram bot polling started ({WORKERS} workers).")
     while True:
         try:
-            params = urllib.parse.urlencode({"timeout": 30, "offset": offset})
-            url = f"{_api_base(token)}/getUpdates?{params}"
-            obj = _http_get_json(url, timeout=40)
-            if not obj.get("ok", False):
-                print(f"[warn] getUpdates not ok: {obj}")
-                time.sleep(2)
-                continue
-            updates = obj.get("result", [])
-            if not isinstance(updates, list):
-                time.sleep(1)
+            if dispatcher.queue_depth() >= MAX_PENDING:
+                time.sleep(0.2)
                 continue
-
-            for row in _extract_messages(updates):
-                offset = max(offset, int(row["update_id"]) + 1)
-                try:
-                    reply = handle_chat_text(int(row["chat_id"]), str(row["text"]))
-                except Exception as exc:
-                    reply = f"Internal error: {exc}"
-                send_message(token, int(row["chat_id"]), reply)
-        except (urllib.error.URLError, urllib.error.HTTPError, TimeoutError, json.JSONDecodeError) as exc:
+            offset = poll_once(token, offset, dispatcher, offsets=offsets)
+        except (HTTPStatusError, OSError, http.client.HTTPException, json.JSONDecodeError) as exc:
             print(f"[warn] polling error: {exc}")
             time.sleep(2)
         except KeyboardInterrupt:
             print("Telegram bot stopped.")
+            dispatcher.shutdown(wait=True)
+            offsets.save()
+            get_sender(token).close()
             break
         except Exception as exc:
             print(f"[warn] unexpected error: {exc}")
@@ -112,4 +196,9 @@ def run_polling() -> None:
 
 
 if __name__ == "__main__":
-    run_polling()
+    if os.getenv("TELEGRAM_MODE", "polling").strip().lower() == "webhook":
+        from xiyou_solo.services.telegram_webhook import run_webhook
+
+        run_webhook()
+    else:
+        run_polling()
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from xiyou_solo.infra.http_pool import HTTPStatusError
+from xiyou_solo.infra.metrics import LatencyStats
+from xiyou_solo.infra.rate_limit import RateLimiter
+
+
+# Telegram's hard limit for one sendMessage text.
+MAX_MESSAGE_LEN = 4096
+
+PostFn = Callable[[int, str], Any]
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LEN) -> List[str]:
+    """Split on paragraph, then line, then word boundaries; hard-cut only unbroken runs."""
+    rest = (text or "").strip()
+    parts: List[str] = []
+    while len(rest) > limit:
+        window = rest[:limit]
+        # A boundary in the first half would leave a tiny part (and spend a send on it): hard-cut instead.
+        cut = limit
+        for sep in ("\n\n", "\n", " "):
+            found = window.rfind(sep)
+            if found > limit // 2:
+                cut = found
+                break
+        parts.append(rest[:cut].rstrip())
+        rest = rest[cut:].lstrip()
+    if rest:
+        parts.append(rest)
+    return parts
+
+
+def _retry_after(exc: HTTPStatusError) -> Optional[float]:
+    """Telegram puts retry_after in the JSON body; fall back to the header."""
+    try:
+        body = json.loads(exc.body.decode("utf-8") or "{}")
+        value = body.get("parameters", {}).get("retry_after")
+        if isinstance(value, (int, float)):
+            return float(value)
+    except (UnicodeDecodeError, ValueError, AttributeError):
+        pass
+    return exc.retry_after
+
+
+@dataclass
+class _Outgoing:
+    chat_id: int
+    text: str
+    enqueued: float
+    attempts: int = 0
+
+
+class OutboundQueue:
+    """
+    Per-chat FIFO of outgoing messages drained by a few sender threads.
+
+    A chat is handed to one sender at a time, so its messages keep their
+    order. Each send takes a token from the chat's bucket and the global
+    bucket. A 429 parks the chat for Telegram's retry_after. Network and
+    5xx errors back off exponentially. Other 4xx responses are dropped.
+    """
+
+    def __init__(
+        self,
+        post: PostFn,
+        per_chat_rate: float = 1.0,
+        per_chat_burst: float = 3,
+        global_rate: float = 30.0,
+        global_burst: float = 30,
+        senders: int = 4,
+        max_attempts: int = 5,
+        backoff_base: float = 1.0,
+        max_backoff: float = 30.0,
+    ):
+        self.post = post
+        self.chat_limit = RateLimiter(per_chat_rate, per_chat_burst, idle_sec=300)
+        self.global_limit = RateLimiter(global_rate, global_burst)
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_base = float(backoff_base)
+        self.max_backoff = float(max_backoff)
+        self._cond = threading.Condition()
+        self._chats: Dict[int, Deque[_Outgoing]] = {}
+        self._ready: List[Tuple[float, int, int]] = []
+        self._seq = itertools.count()
+        self._busy = 0
+        self._stop = False
+        self.delivery_ms = LatencyStats()
+        self.delivered = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.throttled = 0
+        self.dropped = 0
+        self._threads = [
+            threading.Thread(target=self._loop, name=f"tg-send-{idx}", daemon=True) for idx in range(max(1, int(senders)))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def send(self, chat_id: int, text: str) -> int:
+        """Queue a reply, split into Telegram-sized parts; returns the number of parts."""
+        parts = split_message(text)
+        if not parts:
+            return 0
+        now = time.monotonic()
+        with self._cond:
+            queue = self._chats.get(chat_id)
+            idle = queue is None
+            if idle:
+                queue = self._chats[chat_id] = deque()
+            queue.extend(_Outgoing(chat_id, part, now) for part in parts)
+            if idle:
+                self._schedule(chat_id, now)
+        return len(parts)
+
+    def _schedule(self, chat_id: int, at: float) -> None:
+        heapq.heappush(self._ready, (at, next(self._seq), chat_id))
+        self._cond.notify()
+
+    def _next_chat(self) -> Optional[int]:
+        with self._cond:
+            while not self._stop:
+                now = time.monotonic()
+                if self._ready and self._ready[0][0] <= now:
+                    _at, _seq, chat_id = heapq.heappop(self._ready)
+                    self._busy += 1
+                    return chat_id
+                self._cond.wait(self._ready[0][0] - now if self._ready else None)
+            return None
+
+    def _loop(self) -> None:
+        while True:
+            chat_id = self._next_chat()
+            if chat_id is None:
+                return
+            delay = self._send_head(chat_id)
+            with self._cond:
+                self._busy -= 1
+                queue = self._chats.get(chat_id)
+                if queue:
+                    self._schedule(chat_id, time.monotonic() + delay)
+                else:
+                    self._chats.pop(chat_id, None)
+                self._cond.notify_all()
+
+    def _send_head(self, chat_id: int) -> float:
+        """Try the chat's oldest message; returns how long the chat should wait before its next one."""
+        with self._cond:
+            item = self._chats[chat_id][0]
+        now = time.monotonic()
+        if not self.chat_limit.allow(chat_id, now):
+            self._count("throttled")
+            return 1.0 / max(self.chat_limit.rate, 1e-6)
+        if not self.global_limit.allow("", now):
+            self._count("throttled")
+            return 1.0 / max(self.global_limit.rate, 1e-6)
+        item.attempts += 1
+        try:
+            self.post(chat_id, item.text)
+        except HTTPStatusError as exc:
+            if exc.code == 429:
+                self._count("rate_limited")
+                return self._retry(item, _retry_after(exc) or self._backoff(item))
+            if exc.code < 500:
+                return self._drop(item, f"HTTP {exc.code}")
+            return self._retry(item, self._backoff(item))
+        except Exception:  # noqa: BLE001 - network errors are retried with backoff
+            return self._retry(item, self._backoff(item))
+        self._pop(item)
+        self._count("delivered")
+        self.delivery_ms.record((time.monotonic() - item.enqueued) * 1000)
+        return 0.0
+
+    def _count(self, name: str) -> None:
+        with self._cond:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _backoff(self, item: _Outgoing) -> float:
+        return min(self.max_backoff, self.backoff_base * (2 ** (item.attempts - 1)))
+
+    def _retry(self, item: _Outgoing, delay: float) -> float:
+        if item.attempts >= self.max_attempts:
+            return self._drop(item, "too many attempts")
+        self._count("retries")
+        return delay
+
+    def _drop(self, item: _Outgoing, reason: str) -> float:
+        self._pop(item)
+        self._count("dropped")
+        print(f"[warn] sendMessage to {item.chat_id} dropped: {reason}")
+        return 0.0
+
+    def _pop(self, item: _Outgoing) -> None:
+        with self._cond:
+            queue = self._chats.get(item.chat_id)
+            if queue and queue[0] is item:
+                queue.popleft()
+
+    def pending(self) -> int:
+        with self._cond:
+            return sum(len(q) for q in self._chats.values())
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._chats or self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending(),
+            "delivered": self.delivered,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "throttled": self.throttled,
+            "dropped": self.dropped,
+            "delivery_ms": self.delivery_ms.snapshot(),
+        }
+
+    def close(self, timeout: float = 10.0) -> None:
+        self.flush(timeout)
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1)
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+from xiyou_solo.infra.session_store import DATA_DIR, read_json, write_json
+
+
+OFFSET_PATH = DATA_DIR / "telegram_offset.json"
+REPLY_CACHE_PATH = DATA_DIR / "telegram_replies.sqlite3"
+CHAT_INDEX_PATH = DATA_DIR / "telegram_chats.sqlite3"
+LEGACY_CHAT_MAP_PATH = DATA_DIR / "telegram_map.json"
+
+
+class OffsetStore:
+    """
+    getUpdates offset persisted with an atomic replace after every batch.
+
+    The saved value never moves past an update that is still being worked
+    on, so a restart re-fetches unfinished updates; finished ones are then
+    answered from the ReplyCache instead of running the turn again.
+    """
+
+    def __init__(self, path: Path = OFFSET_PATH):
+        self.path = Path(path)
+        raw = read_json(self.path, {}).get("offset", 0)
+        self.next_offset = int(raw) if isinstance(raw, int) else 0
+        self._in_flight: Set[int] = set()
+        self._saved: Optional[int] = self.next_offset
+        self._lock = threading.Lock()
+
+    def begin(self, update_id: int) -> None:
+        with self._lock:
+            self._in_flight.add(int(update_id))
+
+    def done(self, update_id: int) -> None:
+        with self._lock:
+            self._in_flight.discard(int(update_id))
+
+    def advance(self, offset: int) -> None:
+        with self._lock:
+            self.next_offset = max(self.next_offset, int(offset))
+
+    def durable_offset(self) -> int:
+        with self._lock:
+            return min(self._in_flight) if self._in_flight else self.next_offset
+
+    def save(self) -> bool:
+        offset = self.durable_offset()
+        if offset == self._saved:
+            return False
+        write_json(self.path, {"offset": offset, "saved_at": time.time()})
+        self._saved = offset
+        return True
+
+
+class ReplyCache:
+    """
+    Bounded update_id -> reply map in SQLite, shared by every bot process on this data dir.
+
+    ``claim`` lets webhook processes behind one URL agree on which of them
+    runs an update: the first claim wins until its lease runs out without a
+    reply being stored (the claiming process died mid-turn).
+    """
+
+    def __init__(self, path: Path = REPLY_CACHE_PATH, capacity: int = 1000, claim_lease_sec: float = 600.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.capacity = max(1, int(capacity))
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS replies (update_id INTEGER PRIMARY KEY, chat_id INTEGER NOT NULL, reply TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS claims (update_id INTEGER PRIMARY KEY, claimed_at REAL NOT NULL)")
+        self.claim_lease_sec = float(claim_lease_sec)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, update_id: int) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT reply FROM replies WHERE update_id = ?", (int(update_id),)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return str(row[0])
+
+    def claim(self, update_id: int, now: Optional[float] = None) -> bool:
+        """True for the one process that should run this update; False when another has it or has answered it."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._conn.execute("SELECT 1 FROM replies WHERE update_id = ?", (int(update_id),)).fetchone():
+                    won = False
+                else:
+                    row = self._conn.execute("SELECT claimed_at FROM claims WHERE update_id = ?", (int(update_id),)).fetchone()
+                    won = row is None or now - float(row[0]) >= self.claim_lease_sec
+                    if won:
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO claims (update_id, claimed_at) VALUES (?, ?)", (int(update_id), now)
+                        )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+            return won
+
+    def release(self, update_id: int) -> None:
+        """Give up a claim without answering, so a redelivery is run again."""
+        with self._lock:
+            self._conn.execute("DELETE FROM claims WHERE update_id = ?", (int(update_id),))
+
+    def put(self, update_id: int, chat_id: int, reply: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO replies (update_id, chat_id, reply, created_at) VALUES (?, ?, ?, ?)",
+                (int(update_id), int(chat_id), reply, time.time()),
+            )
+            self._puts += 1
+            # Update ids only grow, so the oldest rows have the smallest ids; prune in batches.
+            if self._puts % 50 == 0:
+                self._conn.execute(
+                    "DELETE FROM replies WHERE update_id < (SELECT update_id FROM replies ORDER BY update_id DESC LIMIT 1 OFFSET ?)",
+                    (self.capacity - 1,),
+                )
+                self._conn.execute("DELETE FROM claims WHERE update_id < (SELECT MIN(update_id) FROM replies)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT COUNT(*) FROM replies").fetchone()[0])
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {"size": len(self), "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ChatIndex:
+    """
+    chat_id -> session_id in SQLite with an in-memory read cache.
+
+    Lookups and updates touch one row. Writes from another process (polling
+    and webhook workers share the data dir) bump PRAGMA data_version, which
+    is checked before each lookup and drops the cache when it moves.
+    """
+
+    def __init__(self, path: Path = CHAT_INDEX_PATH, legacy_path: Optional[Path] = LEGACY_CHAT_MAP_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chats (chat_key TEXT PRIMARY KEY, session_id TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._cache: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        if legacy_path is not None:
+            self._import_legacy(Path(legacy_path))
+        self._version = self._data_version()
+
+    def _data_version(self) -> int:
+        return int(self._conn.execute("PRAGMA data_version").fetchone()[0])
+
+    def _import_legacy(self, legacy_path: Path) -> None:
+        """One-time import of telegram_map.json; user_version marks it done."""
+        with self._lock:
+            if int(self._conn.execute("PRAGMA user_version").fetchone()[0]) >= 1:
+                return
+            raw = read_json(legacy_path, {})
+            rows = [(k, v, time.time()) for k, v in raw.items() if isinstance(k, str) and isinstance(v, str)]
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("INSERT OR IGNORE INTO chats (chat_key, session_id, updated_at) VALUES (?, ?, ?)", rows)
+                self._conn.execute("PRAGMA user_version = 1")
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _check_version(self) -> None:
+        version = self._data_version()
+        if version != self._version:
+            self._version = version
+            self._cache.clear()
+            self.invalidations += 1
+
+    def get(self, chat_key: str) -> str:
+        """Session id for a chat, or "" when the chat has none yet."""
+        with self._lock:
+            self._check_version()
+            sid = self._cache.get(chat_key)
+            if sid is not None:
+                self.hits += 1
+                return sid
+            self.misses += 1
+            row = self._conn.execute("SELECT session_id FROM chats WHERE chat_key = ?", (chat_key,)).fetchone()
+            sid = str(row[0]) if row else ""
+            if sid:
+                self._cache[chat_key] = sid
+            return sid
+
+    def set(self, chat_key: str, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chats (chat_key, session_id, updated_at) VALUES (?, ?, ?)",
+                (chat_key, session_id, time.time()),
+            )
+            self._cache[chat_key] = session_id
+
+    def items(self) -> Dict[str, str]:
+        with self._lock:
+            return {str(k): str(v) for k, v in self._conn.execute("SELECT chat_key, session_id FROM chats")}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT COUNT(*) FROM chats").fetchone()[0])
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
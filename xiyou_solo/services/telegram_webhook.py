@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import hmac
+import json
+import os
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler
+from typing import Any, Dict, Optional
+
+from xiyou_solo.infra.dedup import TTLDedupCache
+from xiyou_solo.infra.dispatcher import KeyedDispatcher, QueueFullError
+from xiyou_solo.infra.http_pool import get_pool
+from xiyou_solo.infra.http_server import PooledHTTPServer
+from xiyou_solo.llm import openrouter
+from xiyou_solo.services import telegram_bot
+from xiyou_solo.services.metrics import metrics_snapshot
+from xiyou_solo.services.tg_handler import get_chat_index
+
+
+HOST = os.getenv("TELEGRAM_WEBHOOK_HOST", "127.0.0.1").strip() or "127.0.0.1"
+PORT = int(os.getenv("TELEGRAM_WEBHOOK_PORT", "8091"))
+WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram/webhook").strip() or "/telegram/webhook"
+# Public https URL registered with setWebhook; leave empty to register it out of band.
+PUBLIC_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "").strip()
+SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "").strip()
+MAX_BODY = 1 << 20
+
+
+class WebhookApp:
+    """
+    Shared state for one webhook process: token, secret, dedup and the
+    per-chat pool. Several processes may serve the same webhook; they
+    dedup redeliveries through the shared SQLite ReplyCache.
+    """
+
+    def __init__(self, token: str, secret: str, dispatcher: Optional[KeyedDispatcher] = None, dedup_capacity: int = 5000):
+        self.token = token
+        self.secret = secret
+        self.dispatcher = dispatcher or telegram_bot.make_dispatcher()
+        # Telegram redelivers an update until it gets a 2xx, so ids repeat within minutes.
+        self.seen = TTLDedupCache(capacity=dedup_capacity, ttl_sec=3600)
+        self._accept_lock = threading.Lock()
+        self.accepted = 0
+        self.ignored = 0
+        self.forbidden = 0
+        self.overloaded = 0
+
+    def check_secret(self, header: str) -> bool:
+        # No secret configured means nothing can be verified: fail closed.
+        if not self.secret:
+            return False
+        return hmac.compare_digest(header.encode("utf-8"), self.secret.encode("utf-8"))
+
+    def accept(self, update: Dict[str, Any]) -> int:
+        """Queue one update; returns the HTTP status to answer Telegram with."""
+        update_id = update.get("update_id")
+        if not isinstance(update_id, int):
+            return HTTPStatus.BAD_REQUEST
+        key = str(update_id)
+        with self._accept_lock:
+            if self.seen.seen(key):
+                self.ignored += 1
+                return HTTPStatus.OK
+            rows = telegram_bot._extract_messages([update])
+            if not rows:
+                self.seen.add(key)
+                self.ignored += 1
+                return HTTPStatus.OK
+            # self.seen only covers this process; the claim in the shared SQLite reply cache covers the others.
+            replies = telegram_bot.get_reply_cache()
+            if not replies.claim(update_id):
+                self.seen.add(key)
+                self.ignored += 1
+                return HTTPStatus.OK
+            chat_id = int(rows[0]["chat_id"])
+            try:
+                self.dispatcher.submit(
+                    chat_id, telegram_bot._process_update, self.token, chat_id, str(rows[0]["text"]), update_id
+                )
+            except QueueFullError:
+                # Not recorded as seen and the claim is dropped: Telegram retries it later.
+                replies.release(update_id)
+                self.overloaded += 1
+                return HTTPStatus.SERVICE_UNAVAILABLE
+            self.seen.add(key)
+            self.accepted += 1
+            return HTTPStatus.OK
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "accepted": self.accepted,
+            "ignored": self.ignored,
+            "forbidden": self.forbidden,
+            "overloaded": self.overloaded,
+            "dedup": self.seen.stats(),
+            "dispatcher": self.dispatcher.stats(),
+            "http_pool": get_pool().stats(),
+            "reply_cache": telegram_bot.get_reply_cache().stats(),
+            "outbound": telegram_bot.get_sender(self.token).stats(),
+            "chat_index": get_chat_index().stats(),
+            **metrics_snapshot(),
+        }
+
+
+class TelegramWebhookHandler(BaseHTTPRequestHandler):
+    server_version = "xiyou-telegram-webhook/0.1"
+    protocol_version = "HTTP/1.1"
+    timeout = 5
+    app: WebhookApp
+
+    def _send_json(self, status: int, obj: Dict[str, Any]) -> None:
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if status == HTTPStatus.SERVICE_UNAVAILABLE:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/metrics":
+            payload = {"ok": True, **self.app.stats()}
+            if isinstance(self.server, PooledHTTPServer):
+                payload["http"] = self.server.stats()
+            self._send_json(HTTPStatus.OK, payload)
+            return
+        self._send_json(HTTPStatus.NOT_FOUND, {"ok": False, "error": "not found"})
+
+    def do_POST(self) -> None:
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            length = -1
+        if self.path != WEBHOOK_PATH or length < 0 or length > MAX_BODY:
+            # The body is left unread, so this keep-alive connection cannot be reused.
+            self.close_connection = True
+            self._send_json(HTTPStatus.NOT_FOUND if self.path != WEBHOOK_PATH else HTTPStatus.BAD_REQUEST, {"ok": False})
+            return
+        body = self.rfile.read(length)
+        if not self.app.check_secret(self.headers.get("X-Telegram-Bot-Api-Secret-Token", "")):
+            self.app.forbidden += 1
+            self._send_json(HTTPStatus.FORBIDDEN, {"ok": False, "error": "bad secret token"})
+            return
+        try:
+            update = json.loads(body.decode("utf-8") if body else "{}")
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            self._send_json(HTTPStatus.BAD_REQUEST, {"ok": False, "error": "invalid json"})
+            return
+        status = self.app.accept(update if isinstance(update, dict) else {})
+        self._send_json(status, {"ok": status == HTTPStatus.OK})
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A003
+        return
+
+
+def make_webhook_server(app: WebhookApp, host: str = HOST, port: int = PORT) -> PooledHTTPServer:
+    handler = type("BoundTelegramWebhookHandler", (TelegramWebhookHandler,), {"app": app})
+    return PooledHTTPServer((host, port), handler, workers=int(os.getenv("TELEGRAM_WEBHOOK_HTTP_WORKERS", "8")))
+
+
+def set_webhook(token: str, url: str, secret: str) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {"url": url, "allowed_updates": ["message"]}
+    if secret:
+        payload["secret_token"] = secret
+    return telegram_bot._http_post_json(f"{telegram_bot._api_base(token)}/setWebhook", payload)
+
+
+def run_webhook(host: str = HOST, port: int = PORT) -> None:
+    token = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
+    if not token:
+        print("Missing TELEGRAM_BOT_TOKEN. Please set environment variable first.")
+        return
+    if not SECRET:
+        print("Missing TELEGRAM_WEBHOOK_SECRET. Webhook updates cannot be authenticated without it.")
+        return
+    app = WebhookApp(token, SECRET)
+    server = make_webhook_server(app, host, port)
+    get_pool().prewarm(telegram_bot._api_base(token), 2)
+    openrouter.prewarm(1)
+    if PUBLIC_URL:
+        print(f"setWebhook: {set_webhook(token, PUBLIC_URL, SECRET)}")
+    print(f"Telegram webhook listening on http://{host}:{port}{WEBHOOK_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Telegram webhook stopped.")
+    finally:
+        server.server_close()
+        app.dispatcher.shutdown(wait=True)
+        telegram_bot.get_sender(token).close()
+
+
+if __name__ == "__main__":
+    run_webhook()
@@ -1,46 +1,35 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Tuple
+import threading
+from typing import Any, Dict, Optional, Tuple
 
-from xiyou_solo.infra.session_store import DATA_DIR, GameSessionStore, read_json, write_json
+from xiyou_solo.core.scenarios import SCENARIO_ORDER, SCENARIOS
+from xiyou_solo.infra.rate_limit import LimitExceeded
+from xiyou_solo.infra.session_store import SessionUnitOfWork
+from xiyou_solo.services.telegram_state import ChatIndex
 from xiyou_solo.ui.bot_runner import create_bot_session, run_turn, run_utility_command
 
 
-TG_MAP_PATH = DATA_DIR / "telegram_map.json"
 ONBOARD_STAGES = {"choose_language", "input_api_key", "choose_scenario", "create_character", "playing"}
 
-SCENARIOS: Dict[str, Dict[str, Dict[str, str]]] = {
-    "huangfeng": {
-        "title": {"zh": "黄风岭迷雾", "en": "Mist of Huangfeng Ridge"},
-        "goal": {"zh": "找出真路并护送药材通过山口", "en": "Find the true route and escort medicine through the pass"},
-        "location": {"zh": "黄风岭前哨", "en": "Huangfeng Outpost"},
-    },
-    "baigu": {
-        "title": {"zh": "白骨疑影", "en": "Shadows at White Bone Ridge"},
-        "goal": {"zh": "辨明身份并避免误伤无辜", "en": "Identify the truth and avoid harming innocents"},
-        "location": {"zh": "白骨岭驿站", "en": "White Bone Ridge Post"},
-    },
-    "huoyan": {
-        "title": {"zh": "火焰山借扇", "en": "Borrow the Fan at Flame Mountain"},
-        "goal": {"zh": "借来宝扇缓解热浪", "en": "Borrow the fan to ease the heatwave"},
-        "location": {"zh": "火焰山脚", "en": "Foot of Flame Mountain"},
-    },
-}
-
-SCENARIO_ORDER = ["huangfeng", "baigu", "huoyan"]
-
-
-def load_map() -> Dict[str, str]:
-    raw = read_json(TG_MAP_PATH, {})
-    out: Dict[str, str] = {}
-    for k, v in raw.items():
-        if isinstance(k, str) and isinstance(v, str):
-            out[k] = v
-    return out
+_CHAT_INDEX: Optional[ChatIndex] = None
+_CHAT_INDEX_LOCK = threading.Lock()
+
 
+def get_chat_index() -> ChatIndex:
+    global _CHAT_INDEX
+    if _CHAT_INDEX is None:
+        with _CHAT_INDEX_LOCK:
+            if _CHAT_INDEX is None:
+                _CHAT_INDEX = ChatIndex()
+    return _CHAT_INDEX
 
-def save_map(chat_map: Dict[str, str]) -> None:
-    write_json(TG_MAP_PATH, chat_map)
+
+class ServerBusy(Exception):
+    """
+    The turn could not get an API-key slot in time. str(exc) is the reply to
+    send; it is not cached, so a redelivered update runs the turn again.
+    """
 
 
 def _default_onboarding() -> Dict[str, Any]:
@@ -138,28 +127,57 @@ def _is_api_key_like(raw: str) -> bool:
     return (s.startswith("sk-or-") or s.startswith("sk-")) and len(s) >= 20
 
 
-def _init_session_for_chat(chat_id: int, *, force_new: bool) -> Tuple[str, bool]:
-    chat_key = str(chat_id)
-    chat_map = load_map()
-    sid = chat_map.get(chat_key, "")
-    store = GameSessionStore()
+class ChatRequest:
+    """
+    Unit of work for one Telegram message: the chat's session id, game and
+    meta are read at most once and written once in commit().
+    """
+
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.chat_key = str(chat_id)
+        self.store = SessionUnitOfWork()
+        self._sid: Optional[str] = None
+        self._bound = False
+
+    def session_id(self) -> str:
+        if self._sid is None:
+            self._sid = get_chat_index().get(self.chat_key)
+        return self._sid
+
+    def bind_session(self, sid: str) -> None:
+        self._sid = sid
+        self._bound = True
+
+    def meta(self, sid: str) -> Dict[str, Any]:
+        return _ensure_onboarding_meta(self.store.load_meta(sid), force_reset=False)
+
+    def commit(self) -> None:
+        # Session files first, so the index never points at a half-written session.
+        self.store.commit()
+        if self._bound and self._sid:
+            get_chat_index().set(self.chat_key, self._sid)
+            self._bound = False
+
+
+def _init_session_for_chat(req: ChatRequest, *, force_new: bool) -> Tuple[str, bool]:
+    sid = req.session_id()
+    store = req.store
 
     if force_new or not sid:
         sid = store.create_session(
-            player_id=f"telegram:{chat_key}",
-            meta={"source": "telegram", "created_by": "services.tg_handler"},
+            player_id=f"telegram:{req.chat_key}",
+            meta=_ensure_onboarding_meta(
+                {"source": "telegram", "created_by": "services.tg_handler"}, force_reset=True
+            ),
         )
-        create_bot_session(sid, language="zh", player_name=f"tg_{chat_key}")
-        meta = _ensure_onboarding_meta(store.load_meta(sid), force_reset=True)
-        store.save_meta(sid, meta)
-        chat_map[chat_key] = sid
-        save_map(chat_map)
+        create_bot_session(sid, language="zh", player_name=f"tg_{req.chat_key}", store=store)
+        req.bind_session(sid)
         return sid, True
 
     if not store.load_game(sid):
-        create_bot_session(sid, language="zh", player_name=f"tg_{chat_key}")
-    meta = _ensure_onboarding_meta(store.load_meta(sid), force_reset=False)
-    store.save_meta(sid, meta)
+        create_bot_session(sid, language="zh", player_name=f"tg_{req.chat_key}", store=store)
+    store.save_meta(sid, req.meta(sid))
     return sid, False
 
 
@@ -183,17 +201,17 @@ def format_reply(narrative: str, directive: Dict[str, Any], state_summary: str)
     return txt.strip()
 
 
-def _handle_onboarding(chat_id: int, sid: str, raw: str) -> str:
-    store = GameSessionStore()
+def _handle_onboarding(req: ChatRequest, sid: str, raw: str) -> str:
+    store = req.store
     loaded = store.load_game(sid)
     if not loaded:
-        create_bot_session(sid, language="zh", player_name=f"tg_{chat_id}")
+        create_bot_session(sid, language="zh", player_name=f"tg_{req.chat_key}", store=store)
         loaded = store.load_game(sid)
     if not loaded:
         return "Failed to initialize session."
     state, log_data = loaded
 
-    meta = _ensure_onboarding_meta(store.load_meta(sid), force_reset=False)
+    meta = req.meta(sid)
     ob = meta["onboarding"]
     stage = str(ob.get("stage", "choose_language"))
     lang = str(ob.get("language", "zh"))
@@ -232,9 +250,9 @@ def _handle_onboarding(chat_id: int, sid: str, raw: str) -> str:
         if not sid_choice:
             return _scenario_prompt(lang)
         sc = SCENARIOS[sid_choice]
-        state.quest_title = dict(sc["title"])
-        state.current_goal = dict(sc["goal"])
-        state.location = dict(sc["location"])
+        state.quest_title = sc["title"]
+        state.current_goal = sc["goal"]
+        state.location = sc["location"]
         state.progress = 0
         state.threat_level = 1
         ob["scenario_id"] = sid_choice
@@ -253,15 +271,22 @@ def _handle_onboarding(chat_id: int, sid: str, raw: str) -> str:
         store.save_game(state, log_data)
         store.save_meta(sid, meta)
         if lang == "en":
-            return f"Character created: {state.player_name}\n\n{run_utility_command(sid, 'status')}"
-        return f"角色创建完成：{state.player_name}\n\n{run_utility_command(sid, 'status')}"
+            return f"Character created: {state.player_name}\n\n{run_utility_command(sid, 'status', store)}"
+        return f"角色创建完成：{state.player_name}\n\n{run_utility_command(sid, 'status', store)}"
 
-    return run_utility_command(sid, "status")
+    return run_utility_command(sid, "status", store)
 
 
 def handle_chat_text(chat_id: int, text: str) -> str:
-    raw = (text or "").strip()
-    sid, _ = _init_session_for_chat(chat_id, force_new=False)
+    req = ChatRequest(chat_id)
+    try:
+        return _handle_chat_text(req, (text or "").strip())
+    finally:
+        req.commit()
+
+
+def _handle_chat_text(req: ChatRequest, raw: str) -> str:
+    sid, _ = _init_session_for_chat(req, force_new=False)
 
     if not raw:
         return "Send /start to begin onboarding, or /help for commands."
@@ -272,7 +297,7 @@ def handle_chat_text(chat_id: int, text: str) -> str:
         arg = parts[1].strip() if len(parts) > 1 else ""
 
         if cmd in {"/start", "/new"}:
-            sid, _ = _init_session_for_chat(chat_id, force_new=True)
+            sid, _ = _init_session_for_chat(req, force_new=True)
             return _language_prompt()
         if cmd == "/help":
             return (
@@ -287,33 +312,26 @@ def handle_chat_text(chat_id: int, text: str) -> str:
                 "/lang zh|en\n"
                 "/skip - skip API key step during onboarding"
             )
-        if cmd == "/status":
-            return run_utility_command(sid, "status")
-        if cmd == "/inv":
-            return run_utility_command(sid, "inv")
-        if cmd == "/shop":
-            return run_utility_command(sid, "shop")
-        if cmd == "/buy":
-            return run_utility_command(sid, f"buy {arg}".strip())
-        if cmd == "/use":
-            return run_utility_command(sid, f"use {arg}".strip())
-        if cmd == "/lang":
-            return run_utility_command(sid, f"lang {arg}".strip())
+        utility = {"/status": "status", "/inv": "inv", "/shop": "shop", "/buy": "buy", "/use": "use", "/lang": "lang"}
+        if cmd in utility:
+            return run_utility_command(sid, f"{utility[cmd]} {arg}".strip(), req.store)
         if cmd == "/skip":
             # Only meaningful during onboarding API-key stage.
-            return _handle_onboarding(chat_id, sid, "/skip")
+            return _handle_onboarding(req, sid, "/skip")
         return "Unknown command. Use /help."
 
-    store = GameSessionStore()
-    meta = _ensure_onboarding_meta(store.load_meta(sid), force_reset=False)
-    stage = str(meta.get("onboarding", {}).get("stage", "choose_language"))
-    if stage != "playing":
-        reply = _handle_onboarding(chat_id, sid, raw)
-        meta2 = _ensure_onboarding_meta(store.load_meta(sid), force_reset=False)
-        if str(meta2.get("onboarding", {}).get("stage", "choose_language")) != "playing":
+    if str(req.meta(sid)["onboarding"].get("stage", "choose_language")) != "playing":
+        reply = _handle_onboarding(req, sid, raw)
+        if str(req.meta(sid)["onboarding"].get("stage", "choose_language")) != "playing":
             return reply
 
-    meta = _ensure_onboarding_meta(store.load_meta(sid), force_reset=False)
-    api_key = str(meta.get("onboarding", {}).get("api_key", "")).strip() or None
-    narrative, directive, state_summary = run_turn(sid, raw, api_key=api_key)
+    api_key = str(req.meta(sid)["onboarding"].get("api_key", "")).strip() or None
+    # Onboarding edits are persisted before the slow LLM call; a failed turn must not flush a half-applied state.
+    req.commit()
+    try:
+        narrative, directive, state_summary = run_turn(sid, raw, api_key=api_key, group_id=str(req.chat_id), store=req.store)
+    except LimitExceeded as exc:
+        if exc.scope == "group_turns":
+            return "A turn is already in progress. Please wait a moment."
+        raise ServerBusy("The server is busy right now. Please send your action again in a moment.") from exc
     return format_reply(narrative, directive, state_summary)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+
+class FakeTelegram:
+    """
+    Minimal local stand-in for the Bot API: records sendMessage/setWebhook
+    calls and serves queued updates from getUpdates. Point
+    telegram_bot.API_BASE at ``base_url``.
+    """
+
+    def __init__(self) -> None:
+        self.sent: List[Dict[str, Any]] = []
+        self.webhooks: List[Dict[str, Any]] = []
+        self.updates: List[Dict[str, Any]] = []
+        self.get_updates_calls: List[Dict[str, str]] = []
+        # Responses to return from the next sendMessage calls, e.g. (429, {"retry_after": 1}).
+        self.send_failures: List[tuple] = []
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status: int, obj: Dict[str, Any]) -> None:
+                body = json.dumps(obj).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _method(self) -> str:
+                m = re.match(r"^/bot[^/]+/(\w+)", urlsplit(self.path).path)
+                return m.group(1) if m else ""
+
+            def do_GET(self) -> None:
+                if self._method() != "getUpdates":
+                    self._reply(404, {"ok": False})
+                    return
+                query = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+                offset = int(query.get("offset", "0"))
+                with fake.lock:
+                    fake.get_updates_calls.append(query)
+                    result = [u for u in fake.updates if u["update_id"] >= offset]
+                self._reply(200, {"ok": True, "result": result})
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", "0"))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                method = self._method()
+                if method == "sendMessage":
+                    with fake.lock:
+                        failure = fake.send_failures.pop(0) if fake.send_failures else None
+                        if failure is None:
+                            fake.sent.append(payload)
+                    if failure is not None:
+                        status, params = failure
+                        self._reply(status, {"ok": False, "error_code": status, "parameters": params})
+                        return
+                    self._reply(200, {"ok": True, "result": {"message_id": len(fake.sent)}})
+                elif method == "setWebhook":
+                    with fake.lock:
+                        fake.webhooks.append(payload)
+                    self._reply(200, {"ok": True, "result": True})
+                else:
+                    self._reply(404, {"ok": False})
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A003
+                return
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "FakeTelegram":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def texts(self, chat_id: Optional[int] = None) -> List[str]:
+        with self.lock:
+            return [m["text"] for m in self.sent if chat_id is None or m.get("chat_id") == chat_id]
+
+    def wait_for(self, count: int, timeout: float = 5.0) -> bool:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self.lock:
+                if len(self.sent) >= count:
+                    return True
+            time.sleep(0.01)
+        return False
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from xiyou_solo.services.telegram_state import ChatIndex
+
+
+class ChatIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.legacy = self.root / "telegram_map.json"
+        self.legacy.write_text(json.dumps({"1": "sess_a", "2": "sess_b", "bad": 3}), encoding="utf-8")
+
+    def _open(self) -> ChatIndex:
+        index = ChatIndex(self.root / "chats.sqlite3", legacy_path=self.legacy)
+        self.addCleanup(index.close)
+        return index
+
+    def test_legacy_map_is_imported_once(self) -> None:
+        index = self._open()
+        self.assertEqual(index.items(), {"1": "sess_a", "2": "sess_b"})
+        index.set("1", "sess_new")
+        self.legacy.write_text(json.dumps({"3": "sess_c"}), encoding="utf-8")
+        again = self._open()
+        self.assertEqual(again.get("1"), "sess_new")
+        self.assertEqual(again.get("3"), "")
+
+    def test_lookups_are_cached(self) -> None:
+        index = self._open()
+        self.assertEqual(index.get("1"), "sess_a")
+        self.assertEqual(index.get("1"), "sess_a")
+        self.assertEqual(index.get("9"), "")
+        stats = index.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+
+    def test_write_from_another_connection_invalidates_cache(self) -> None:
+        reader = self._open()
+        writer = self._open()
+        self.assertEqual(reader.get("2"), "sess_b")
+        writer.set("2", "sess_other")
+        self.assertEqual(reader.get("2"), "sess_other")
+        self.assertEqual(reader.stats()["invalidations"], 1)
+        # Own writes do not bump data_version, and stay cached.
+        reader.set("4", "sess_d")
+        self.assertEqual(reader.get("4"), "sess_d")
+        self.assertEqual(reader.stats()["invalidations"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
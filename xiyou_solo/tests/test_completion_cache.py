@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, Dict, List
+from unittest import mock
+
+from xiyou_solo.infra.http_pool import HTTPStatusError
+from xiyou_solo.llm import openrouter
+from xiyou_solo.llm.cache import CompletionCache, completion_key
+
+
+class CompletionCacheTests(unittest.TestCase):
+    def test_lru_evicts_least_recently_used(self) -> None:
+        cache = CompletionCache(capacity=2)
+        cache.put("a", "A")
+        cache.put("b", "B")
+        self.assertEqual(cache.get("a"), ("A", None))
+        cache.put("c", "C")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_entries_expire_after_ttl(self) -> None:
+        cache = CompletionCache(ttl_sec=10)
+        cache.put("k", "v", 5, now=100.0)
+        self.assertEqual(cache.get("k", now=109.0), ("v", 5))
+        self.assertIsNone(cache.get("k", now=111.0))
+        self.assertEqual(cache.stats()["expired"], 1)
+
+    def test_disk_tier_survives_restart(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "llm.sqlite3"
+            first = CompletionCache(path=path)
+            first.put("k", "stored", 42)
+            first.close()
+            second = CompletionCache(path=path)
+            self.addCleanup(second.close)
+            self.assertEqual(second.get("k"), ("stored", 42))
+            self.assertEqual(second.get("k"), ("stored", 42))
+            stats = second.stats()
+            self.assertEqual((stats["disk_hits"], stats["memory_hits"]), (1, 1))
+
+    def test_key_policies(self) -> None:
+        exact = [completion_key("m", "sys", "ctx", text) for text in ("Attack", " attack ")]
+        normalized = [completion_key("m", "sys", "ctx", text, "normalized") for text in ("Attack", " attack ")]
+        self.assertNotEqual(exact[0], exact[1])
+        self.assertEqual(normalized[0], normalized[1])
+        self.assertNotEqual(completion_key("m1", "s", "c", "i"), completion_key("m2", "s", "c", "i"))
+        with self.assertRaises(ValueError):
+            CompletionCache(key_policy="fuzzy")
+
+
+class _FakePool:
+    def __init__(self, responses: List[Any]):
+        self.responses = responses
+        self.calls: List[Dict[str, Any]] = []
+
+    def request_json(self, method: str, url: str, payload: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        self.calls.append(payload)
+        item = self.responses.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+
+class ProviderCacheTests(unittest.TestCase):
+    def _provider(self, responses: List[Any]) -> tuple:
+        pool = _FakePool(responses)
+        patcher = mock.patch.object(openrouter, "get_pool", lambda: pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        provider = openrouter.OpenRouterProvider(
+            api_key="sk-test", model="m", cache=CompletionCache(), policy=openrouter.CallPolicy(max_attempts=1), fallback=None
+        )
+        return provider, pool
+
+    def test_repeated_prompt_is_served_from_cache(self) -> None:
+        ok = {"choices": [{"message": {"content": 'Hi.\n```json\n{"need_check": false}\n```'}}], "usage": {"total_tokens": 30}}
+        provider, pool = self._provider([ok])
+        first = provider.generate("sys", "language: en", "look")
+        second = provider.generate("sys", "language: en", "look")
+        self.assertEqual(len(pool.calls), 1)
+        self.assertEqual((first.cached, second.cached), (False, True))
+        self.assertEqual(second.narrative, first.narrative)
+        self.assertEqual(provider.cache.stats()["hit_rate"], 0.5)
+
+    def test_cache_is_partitioned_per_api_key(self) -> None:
+        ok = {"choices": [{"message": {"content": "Hi."}}]}
+        provider, pool = self._provider([ok, HTTPStatusError(401, b"{}", {})])
+        provider.generate("sys", "language: en", "look")
+        other = openrouter.OpenRouterProvider(
+            api_key="sk-other", model="m", cache=provider.cache, policy=provider.policy, fallback=None
+        )
+        result = other.generate("sys", "language: en", "look")
+        self.assertEqual((result.cached, result.error), (False, "invalid_key"))
+        self.assertEqual(len(pool.calls), 2)
+
+    def test_errors_are_not_cached(self) -> None:
+        ok = {"choices": [{"message": {"content": "Recovered."}}]}
+        provider, pool = self._provider([HTTPStatusError(429, b"{}", {}), ok])
+        failed = provider.generate("sys", "language: en", "look")
+        self.assertEqual(failed.error, "quota")
+        retried = provider.generate("sys", "language: en", "look")
+        self.assertIsNone(retried.error)
+        self.assertFalse(retried.cached)
+        self.assertEqual(len(pool.calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from xiyou_solo.infra.dedup import TTLDedupCache
+from xiyou_solo.services import game_service, room_repo
+
+
+class TTLDedupCacheTests(unittest.TestCase):
+    def test_capacity_evicts_oldest(self) -> None:
+        cache = TTLDedupCache(capacity=3, ttl_sec=0)
+        for idx in range(5):
+            cache.add(f"m{idx}", now=idx)
+        self.assertFalse(cache.seen("m0", now=5))
+        self.assertTrue(cache.seen("m4", now=5))
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.stats()["evicted"], 2)
+
+    def test_ttl_expiry_and_counters(self) -> None:
+        cache = TTLDedupCache(capacity=10, ttl_sec=60)
+        self.assertFalse(cache.check_and_add("a", now=100))
+        self.assertTrue(cache.check_and_add("a", now=120))
+        self.assertFalse(cache.seen("a", now=161))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["expired"]), (1, 2, 1))
+
+    def test_compact_round_trip_and_legacy_form(self) -> None:
+        cache = TTLDedupCache(capacity=10, ttl_sec=60)
+        cache.add("x", now=10)
+        cache.add("y", now=50)
+        restored = TTLDedupCache.from_compact(cache.to_compact(), capacity=10, ttl_sec=60, now=80)
+        self.assertEqual([row[0] for row in restored.to_compact()], ["y"])
+        legacy = TTLDedupCache.from_compact({"old": True}, now=5)
+        self.assertTrue(legacy.seen("old", now=6))
+
+
+class RoomDedupTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        base = Path(self._tmp.name)
+        for patcher in (
+            mock.patch.object(room_repo, "ROOMS_DIR", base / "rooms"),
+            mock.patch.object(room_repo, "ROOMS_PATH", base / "rooms.json"),
+            mock.patch.object(room_repo, "DEDUP_CAPACITY", 3),
+            mock.patch.dict(room_repo._DEDUP, clear=True),
+            mock.patch.object(game_service, "_LIMITS", game_service.build_limits(user_rate=0, group_rate=0, global_rate=0)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self._tmp.cleanup)
+
+    def test_busy_group_does_not_evict_quiet_group(self) -> None:
+        game_service.handle_message("quiet", "u", "/help", "q1", now_ts=1000)
+        for idx in range(10):
+            game_service.handle_message("busy", "u", "/help", f"b{idx}", now_ts=1000 + idx)
+        self.assertEqual(game_service.handle_message("quiet", "u", "/help", "q1", now_ts=1020), ["Duplicate message ignored."])
+        self.assertNotEqual(game_service.handle_message("busy", "u", "/help", "b0", now_ts=1020), ["Duplicate message ignored."])
+
+    def test_ids_survive_restart(self) -> None:
+        game_service.handle_message("g", "u", "/help", "m1", now_ts=1000)
+        stored = json.loads(room_repo.shard_path("g").read_text(encoding="utf-8"))["processed"]
+        self.assertEqual(stored, [["m1", 1000.0]])
+        room_repo._DEDUP.clear()
+        self.assertEqual(game_service.handle_message("g", "u", "/help", "m1", now_ts=1001), ["Duplicate message ignored."])
+        stats = room_repo.dedup_stats()
+        self.assertEqual((stats["groups"], stats["hits"]), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from xiyou_solo.infra.dispatcher import KeyedDispatcher, QueueFullError
+from xiyou_solo.services import game_service, room_repo
+
+
+class KeyedDispatcherTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dispatcher = KeyedDispatcher(max_workers=4, max_queue_per_key=50)
+        self.addCleanup(self.dispatcher.shutdown)
+
+    def test_same_key_runs_in_order(self) -> None:
+        seen: list[int] = []
+
+        def job(n: int) -> int:
+            time.sleep(0.001 * (5 - n % 5))
+            seen.append(n)
+            return n
+
+        futures = [self.dispatcher.submit("g1", job, n) for n in range(20)]
+        self.assertEqual([f.result(timeout=5) for f in futures], list(range(20)))
+        self.assertEqual(seen, list(range(20)))
+
+    def test_blocked_key_does_not_block_others(self) -> None:
+        gate = threading.Event()
+        slow = self.dispatcher.submit("slow", gate.wait, 5)
+        fast = self.dispatcher.submit("fast", lambda: "done")
+        self.assertEqual(fast.result(timeout=2), "done")
+        self.assertFalse(slow.done())
+        gate.set()
+        self.assertTrue(slow.result(timeout=2))
+
+    def test_queue_limit_rejects_and_counts(self) -> None:
+        dispatcher = KeyedDispatcher(max_workers=1, max_queue_per_key=2)
+        self.addCleanup(dispatcher.shutdown)
+        gate = threading.Event()
+        dispatcher.submit("g", gate.wait, 5)
+        dispatcher.submit("g", lambda: None)
+        # The running job has left the queue; two more fit, the next is rejected.
+        deadline = time.time() + 2
+        while dispatcher.queue_depth("g") > 1 and time.time() < deadline:
+            time.sleep(0.005)
+        dispatcher.submit("g", lambda: None)
+        with self.assertRaises(QueueFullError):
+            dispatcher.submit("g", lambda: None)
+        gate.set()
+        self.assertEqual(dispatcher.stats()["rejected"], 1)
+
+    def test_exceptions_reach_the_caller(self) -> None:
+        fut = self.dispatcher.submit("g", lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            fut.result(timeout=2)
+        self.assertEqual(self.dispatcher.submit("g", lambda: 7).result(timeout=2), 7)
+        stats = self.dispatcher.stats()
+        self.assertEqual(stats["completed"], 2)
+        self.assertEqual(stats["wait_ms"]["count"], 2)
+
+
+class DispatchMessageTests(unittest.TestCase):
+    def test_group_messages_keep_turn_order(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            with mock.patch.object(room_repo, "ROOMS_DIR", Path(tmp) / "rooms"), mock.patch.object(
+                room_repo, "ROOMS_PATH", Path(tmp) / "rooms.json"
+            ):
+                texts = ["/new", "/join", "/start", "/act look", "/act run"]
+                users = ["a", "b", "a", "a", "b"]
+                futures = [
+                    game_service.dispatch_message("grp", uid, text, f"m{idx}")
+                    for idx, (uid, text) in enumerate(zip(users, texts))
+                ]
+                replies = [f.result(timeout=5) for f in futures]
+        self.assertIn("Next turn: b", replies[3])
+        self.assertIn("Next turn: a", replies[4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import json
+import os
+import unittest
+import uuid
+from unittest import mock
+
+from xiyou_solo.benchmarks.bench_openrouter import stream_probe
+from xiyou_solo.benchmarks.fake_openrouter import FakeConfig, FakeOpenRouter, parse_faults
+from xiyou_solo.infra.http_pool import ConnectionPool
+from xiyou_solo.llm import openrouter, structured
+
+
+class FakeOpenRouterTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.fake = FakeOpenRouter(FakeConfig(retry_after_sec=0, hang_sec=2)).start()
+        self.addCleanup(self.fake.stop)
+        self.pool = ConnectionPool(max_per_host=4)
+        self.addCleanup(self.pool.close)
+        patcher = mock.patch.object(openrouter, "get_pool", lambda: self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Breakers and parse stats are per model; a fresh name keeps tests apart.
+        self.model = f"fake/{uuid.uuid4().hex[:6]}"
+
+    def _provider(self, **policy: float) -> openrouter.OpenRouterProvider:
+        return openrouter.OpenRouterProvider(
+            api_key="sk-x",
+            model=self.model,
+            cache=None,
+            policy=openrouter.CallPolicy(backoff_base_sec=0, **policy),
+            fallback=None,
+            base_url=self.fake.base_url,
+        )
+
+    def test_turns_go_over_pooled_http(self) -> None:
+        provider = self._provider()
+        first = provider.generate("sys", "language: en", "look")
+        provider.generate("sys", "language: en", "look again")
+        self.assertIsNone(first.error)
+        self.assertEqual(first.narrative, "The scene answers: look")
+        self.assertEqual(first.directive["offer_actions"], ["Look around", "Move on"])
+        self.assertEqual((self.pool.stats()["created"], self.pool.stats()["reused"]), (1, 1))
+
+    def test_injected_errors_drive_retries_and_error_kinds(self) -> None:
+        self.fake.script = ["429", "503", ""]
+        self.assertIsNone(self._provider().generate("sys", "language: en", "look").error)
+        self.assertEqual(len(self.fake.requests), 3)
+        self.fake.script = ["401"]
+        self.assertEqual(self._provider().generate("sys", "language: en", "look").error, "invalid_key")
+        self.fake.script = ["malformed"]
+        self.assertEqual(self._provider().generate("sys", "language: en", "look").error, "other")
+        self.assertEqual(len(self.fake.requests), 5)
+
+    def test_timeout_is_a_network_error(self) -> None:
+        self.fake.script = ["timeout"]
+        result = self._provider(timeout_sec=0.2, max_attempts=1).generate("sys", "language: en", "look")
+        self.assertEqual(result.error, "network")
+
+    def test_structured_request_is_answered_structured(self) -> None:
+        with mock.patch.dict(os.environ, {"OPENROUTER_STRUCTURED": structured.TOOLS}):
+            result = self._provider().generate("sys", "language: en", "look")
+        self.assertEqual(json.loads(result.raw_text)["narrative"], "The scene answers: look")
+        self.assertEqual(structured.parse_stats()[self.model]["structured"], 1)
+
+    def test_stream_sends_sse_chunks(self) -> None:
+        probe = stream_probe(self.fake.base_url, self.model, timeout=2)
+        self.assertEqual((probe["status"], probe["malformed"]), (200, 0))
+        self.assertGreater(probe["chunks"], 1)
+        self.fake.script = ["malformed"]
+        self.assertEqual(stream_probe(self.fake.base_url, self.model, timeout=2)["malformed"], 1)
+
+
+def test_parse_faults() -> None:
+    assert parse_faults("429=0.1, timeout=0.01") == {"429": 0.1, "timeout": 0.01}
+    try:
+        parse_faults("418=1")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown fault accepted")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import http.client
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from xiyou_solo.infra.http_pool import ConnectionPool, HTTPStatusError
+from xiyou_solo.llm import openrouter
+
+
+class _EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = 5
+
+    def _reply(self, status: int, obj: dict, close: bool = False) -> None:
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if close:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/close":
+            self._reply(200, {"closed": True}, close=True)
+        elif self.path == "/quota":
+            self.send_response(429)
+            self.send_header("Retry-After", "3")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self._reply(200, {"path": self.path})
+
+    posts = 0
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", "0"))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        type(self).posts += 1
+        if self.path == "/drop":
+            # Processed, then the connection dies before the response.
+            self.close_connection = True
+            return
+        self._reply(
+            200,
+            {
+                "choices": [{"message": {"content": 'Done.\n\n```json\n{"need_check": false}\n```'}}],
+                "usage": {"total_tokens": len(payload.get("messages", []))},
+            },
+        )
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A003
+        return
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _EchoHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.pool = ConnectionPool(max_per_host=2, idle_timeout=30, timeout=5)
+        self.addCleanup(self.pool.close)
+
+    def test_keep_alive_connection_is_reused(self) -> None:
+        self.assertEqual(self.pool.request_json("GET", f"{self.base}/a?x=1"), {"path": "/a?x=1"})
+        self.pool.request_json("GET", f"{self.base}/b")
+        stats = self.pool.stats()
+        self.assertEqual((stats["created"], stats["reused"], stats["requests"]), (1, 1, 2))
+
+    def test_connection_close_and_idle_timeout_open_new_connections(self) -> None:
+        self.pool.request_json("GET", f"{self.base}/close")
+        self.pool.request_json("GET", f"{self.base}/a")
+        self.pool.idle_timeout = 0.01
+        time.sleep(0.05)
+        self.pool.request_json("GET", f"{self.base}/a")
+        stats = self.pool.stats()
+        self.assertEqual((stats["created"], stats["reused"], stats["idle_closed"]), (3, 0, 1))
+
+    def test_server_closed_idle_connection_is_not_reused(self) -> None:
+        with mock.patch.object(_EchoHandler, "timeout", 0.05):
+            self.pool.request_json("GET", f"{self.base}/a")
+            time.sleep(0.3)
+            self.assertEqual(self.pool.request_json("GET", f"{self.base}/b"), {"path": "/b"})
+        stats = self.pool.stats()
+        self.assertEqual((stats["dropped"], stats["created"], stats["stale_retries"]), (1, 2, 0))
+
+    def test_post_that_reached_the_server_is_not_resent(self) -> None:
+        _EchoHandler.posts = 0
+        self.pool.request_json("GET", f"{self.base}/a")
+        with self.assertRaises(http.client.RemoteDisconnected):
+            self.pool.request_json("POST", f"{self.base}/drop", payload={})
+        self.assertEqual((_EchoHandler.posts, self.pool.stats()["stale_retries"]), (1, 0))
+
+    def test_plain_http_goes_through_proxy_as_absolute_url(self) -> None:
+        port = self.server.server_address[1]
+        pool = ConnectionPool(proxies={"http": f"http://user:pw@127.0.0.1:{port}", "no": "skip.example"})
+        self.addCleanup(pool.close)
+        self.assertEqual(pool.request_json("GET", "http://far.example/a"), {"path": "http://far.example:80/a"})
+        self.assertEqual(pool._proxy(("https", "far.example", 443)), None)
+        self.assertIsNone(pool._proxy(("http", "skip.example", 80)))
+        host, proxy_port, headers = pool._proxy(("http", "far.example", 80))
+        self.assertEqual((host, proxy_port, headers["Proxy-Authorization"]), ("127.0.0.1", port, "Basic dXNlcjpwdw=="))
+
+    def test_status_errors_carry_retry_after(self) -> None:
+        with self.assertRaises(HTTPStatusError) as ctx:
+            self.pool.request_json("GET", f"{self.base}/quota")
+        self.assertEqual((ctx.exception.code, ctx.exception.retry_after), (429, 3.0))
+        # The connection survives an error status.
+        self.pool.request_json("GET", f"{self.base}/a")
+        self.assertEqual(self.pool.stats()["reused"], 1)
+
+    def test_prewarm_then_openrouter_turns_reuse(self) -> None:
+        self.assertEqual(self.pool.prewarm(self.base, 1), 1)
+        with mock.patch.object(openrouter, "get_pool", return_value=self.pool):
+            provider = openrouter.OpenRouterProvider(api_key="sk-test", base_url=f"{self.base}/api/v1")
+            first = provider.generate("sys", "language: en", "look")
+            provider.generate("sys", "language: en", "look again")
+        self.assertEqual(first.narrative, "Done.")
+        self.assertEqual(first.tokens, 2)
+        stats = self.pool.stats()
+        self.assertEqual((stats["created"], stats["reused"]), (1, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
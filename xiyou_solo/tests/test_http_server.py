@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import http.client
+import json
+import socket
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler
+
+from xiyou_solo.adapters import wechat_adapter
+from xiyou_solo.infra.http_server import PooledHTTPServer
+from xiyou_solo.services.metrics import metrics_snapshot
+
+
+class _GateHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    gate = threading.Event()
+
+    def do_GET(self) -> None:
+        if self.path == "/slow":
+            self.gate.wait(5)
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A003
+        return
+
+
+def _serve(server: PooledHTTPServer, case: unittest.TestCase) -> int:
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    case.addCleanup(server.server_close)
+    case.addCleanup(server.shutdown)
+    return server.server_address[1]
+
+
+class PooledHTTPServerTests(unittest.TestCase):
+    def test_full_queue_sheds_with_retry_after(self) -> None:
+        _GateHandler.gate = threading.Event()
+        server = PooledHTTPServer(("127.0.0.1", 0), _GateHandler, workers=1, max_queue=1, retry_after_sec=2)
+        port = _serve(server, self)
+        self.addCleanup(_GateHandler.gate.set)
+
+        def fetch() -> None:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/slow")
+            conn.getresponse().read()
+            conn.close()
+
+        busy = [threading.Thread(target=fetch) for _ in range(2)]
+        for thread in busy:
+            thread.start()
+            deadline = time.time() + 2
+            while server.stats()["in_flight"] + server.stats()["queued"] < busy.index(thread) + 1 and time.time() < deadline:
+                time.sleep(0.005)
+
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request("GET", "/fast")
+        resp = conn.getresponse()
+        self.assertEqual(resp.status, 503)
+        self.assertEqual(resp.getheader("Retry-After"), "2")
+        resp.read()
+        conn.close()
+
+        _GateHandler.gate.set()
+        for thread in busy:
+            thread.join(5)
+        stats = server.stats()
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual(stats["max_in_flight"], 1)
+
+    def test_trickling_client_does_not_stall_rejects(self) -> None:
+        server = PooledHTTPServer(("127.0.0.1", 0), _GateHandler, workers=1, max_queue=1, reject_deadline_sec=0.2)
+        self.addCleanup(server.server_close)
+        ours, theirs = socket.socketpair()
+        self.addCleanup(theirs.close)
+        stop = threading.Event()
+        self.addCleanup(stop.set)
+
+        def trickle() -> None:
+            while not stop.wait(0.02):
+                try:
+                    theirs.send(b"x")
+                except OSError:
+                    return
+
+        threading.Thread(target=trickle, daemon=True).start()
+        started = time.monotonic()
+        server._reject(ours)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertTrue(theirs.recv(4096).startswith(b"HTTP/1.1 503"))
+        ours.close()
+
+    def test_keep_alive_reuses_connection(self) -> None:
+        server = PooledHTTPServer(("127.0.0.1", 0), _GateHandler, workers=2, max_queue=4)
+        port = _serve(server, self)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        self.addCleanup(conn.close)
+        conn.request("GET", "/a")
+        conn.getresponse().read()
+        sock = conn.sock
+        conn.request("GET", "/b")
+        self.assertEqual(conn.getresponse().read(), b"ok")
+        self.assertIs(conn.sock, sock)
+
+
+class WeChatPooledServerTests(unittest.TestCase):
+    def test_metrics_report_http_pool(self) -> None:
+        server = wechat_adapter.make_server("127.0.0.1", 0, mode="pool")
+        port = _serve(server, self)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        self.addCleanup(conn.close)
+        conn.request("GET", "/metrics")
+        payload = json.loads(conn.getresponse().read())
+        self.assertEqual(payload["http"]["in_flight"], 1)
+        self.assertEqual(payload["http"]["rejected"], 0)
+        self.assertLessEqual(set(metrics_snapshot()), set(payload))
+        self.assertIn("turn_slots", payload["limits"])
+
+
+if __name__ == "__main__":
+    unittest.main()
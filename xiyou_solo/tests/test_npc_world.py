@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import unittest
+from typing import Any, Dict
+
+from xiyou_solo.core.engine import GameEngine
+from xiyou_solo.core.scenarios import SCENARIOS
+from xiyou_solo.core.state import GameState, new_game_state
+from xiyou_solo.core.world import NpcTable
+from xiyou_solo.llm.base import LLMCallResult
+from xiyou_solo.llm.directive_parser import DEFAULT_DIRECTIVE
+
+
+class _ScriptedProvider:
+    def __init__(self, changes_per_turn: list[list[Any]]) -> None:
+        self.changes_per_turn = changes_per_turn
+        self.contexts: list[str] = []
+
+    def generate(self, dm_system: str, dm_context: str, player_input: str) -> LLMCallResult:
+        self.contexts.append(dm_context)
+        directive = dict(DEFAULT_DIRECTIVE)
+        idx = len(self.contexts) - 1
+        directive["npc_attitude_changes"] = self.changes_per_turn[idx] if idx < len(self.changes_per_turn) else []
+        return LLMCallResult(narrative="ok", directive=directive, raw_text="ok", latency_ms=0)
+
+
+class NpcTableTests(unittest.TestCase):
+    def test_delta_and_set_to(self) -> None:
+        table = NpcTable()
+        table.apply_change({"npc_id": "Tea Seller", "delta": 1, "reason": "paid well"}, turn=1, location_id=0)
+        rec = table.get("tea_seller")
+        self.assertIsNotNone(rec)
+        self.assertEqual(rec.attitude_label, "friendly")
+        table.apply_change({"npc_id": "tea_seller", "delta": 9}, turn=2, location_id=0)
+        self.assertEqual(rec.attitude_label, "allied")
+        table.apply_change({"npc_id": "tea_seller", "set_to": "hostile"}, turn=3, location_id=0)
+        self.assertEqual(rec.attitude_label, "hostile")
+        self.assertEqual(rec.notes, ["paid well"])
+
+    def test_invalid_entries_ignored(self) -> None:
+        table = NpcTable()
+        for bad in ("x", {}, {"npc_id": "  "}, {"delta": 1}):
+            self.assertIsNone(table.apply_change(bad, turn=1, location_id=0))
+        self.assertEqual(len(table), 0)
+
+    def test_location_index_moves_with_npc(self) -> None:
+        table = NpcTable()
+        table.apply_change({"npc_id": "monk"}, turn=1, location_id=1)
+        table.apply_change({"npc_id": "monk"}, turn=2, location_id=2)
+        self.assertEqual(table.at_location(1), [])
+        self.assertEqual([r.npc_id for r in table.at_location(2)], ["monk"])
+
+
+class EngineNpcTests(unittest.TestCase):
+    def test_changes_applied_and_only_local_npcs_in_context(self) -> None:
+        provider = _ScriptedProvider(
+            [
+                [{"npc_id": "bandit_chief", "name": "Chief Wu", "set_to": "hostile", "reason": "ambushed the cart"}],
+                [{"npc_id": "outpost_guard", "delta": 1}],
+                [],
+            ]
+        )
+        state = new_game_state("sess_npc", language="en")
+        log_data: Dict[str, Any] = {"events": []}
+        engine = GameEngine(provider=provider)
+        engine.run_turn(state, log_data, "look", "DM")
+        state.location = SCENARIOS["huangfeng"]["location"]
+        engine.run_turn(state, log_data, "talk", "DM")
+        engine.run_turn(state, log_data, "wait", "DM")
+
+        self.assertEqual(state.npcs.get("bandit_chief").attitude_label, "hostile")
+        self.assertEqual(state.npcs.get("outpost_guard").last_seen_turn, 2)
+        last = provider.contexts[-1]
+        self.assertIn("- outpost_guard outpost_guard: friendly", last)
+        self.assertNotIn("bandit_chief", last)
+
+    def test_npcs_survive_serialization(self) -> None:
+        state = new_game_state("sess_npc")
+        state.npcs.apply_change({"npc_id": "monk", "set_to": "allied", "reason": "shared tea"}, turn=3, location_id=state.location_id)
+        restored = GameState.from_dict(state.to_dict())
+        rec = restored.npcs.get("monk")
+        self.assertEqual(rec.attitude_label, "allied")
+        self.assertEqual(rec.notes, ["shared tea"])
+        self.assertEqual([r.npc_id for r in restored.npcs.at_location(restored.location_id)], ["monk"])
+
+
+if __name__ == "__main__":
+    unittest.main()
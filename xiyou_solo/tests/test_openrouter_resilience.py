@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import threading
+import time
+import unittest
+import uuid
+from typing import Any, Dict, List
+from unittest import mock
+
+from xiyou_solo.infra.circuit_breaker import CircuitBreaker
+from xiyou_solo.infra.http_pool import HTTPStatusError
+from xiyou_solo.llm import openrouter
+from xiyou_solo.llm.mock import MockProvider
+
+
+OK = {"choices": [{"message": {"content": 'Fine.\n```json\n{"need_check": false}\n```'}}], "usage": {"total_tokens": 12}}
+
+
+class _ScriptedPool:
+    """Plays back responses in order; an item may be an exception or (delay_sec, response)."""
+
+    def __init__(self, script: List[Any]):
+        self.script = list(script)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def request_json(self, method: str, url: str, payload: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        with self._lock:
+            self.calls += 1
+            item = self.script.pop(0) if self.script else OK
+        if isinstance(item, tuple):
+            time.sleep(item[0])
+            item = item[1]
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def test_opens_then_half_opens_then_closes(self) -> None:
+        breaker = CircuitBreaker(failure_threshold=2, reset_sec=10)
+        breaker.record_failure(now=0)
+        self.assertTrue(breaker.allow(now=0))
+        breaker.record_failure(now=1)
+        self.assertFalse(breaker.allow(now=5))
+        self.assertTrue(breaker.allow(now=11))
+        self.assertFalse(breaker.allow(now=11))  # only one trial while half-open
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.stats()["opened"], 1)
+
+    def test_failed_trial_reopens(self) -> None:
+        breaker = CircuitBreaker(failure_threshold=1, reset_sec=10)
+        breaker.record_failure(now=0)
+        self.assertTrue(breaker.allow(now=10))
+        breaker.record_failure(now=10)
+        self.assertFalse(breaker.allow(now=15))
+        self.assertTrue(breaker.allow(now=20))
+
+
+class ProviderResilienceTests(unittest.TestCase):
+    def setUp(self) -> None:
+        # Breakers and latency stats are per (key, model); a fresh model keeps tests independent.
+        self.model = f"test/{uuid.uuid4().hex[:8]}"
+        self.sleeps: List[float] = []
+
+    def _provider(self, script: List[Any], **policy: Any) -> tuple:
+        pool = _ScriptedPool(script)
+        patcher = mock.patch.object(openrouter, "get_pool", lambda: pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        fallback = policy.pop("fallback", None)
+        provider = openrouter.OpenRouterProvider(
+            api_key="sk-test",
+            model=self.model,
+            policy=openrouter.CallPolicy(backoff_base_sec=0.01, **policy),
+            fallback=fallback,
+            sleep=self.sleeps.append,
+        )
+        provider.cache = None
+        return provider, pool
+
+    def test_server_errors_are_retried_with_backoff(self) -> None:
+        provider, pool = self._provider([HTTPStatusError(503, b"", {}), OSError("reset")])
+        result = provider.generate("sys", "language: en", "look")
+        self.assertIsNone(result.error)
+        self.assertEqual(pool.calls, 3)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertTrue(all(0 <= s <= 0.02 for s in self.sleeps))
+
+    def test_retry_after_is_respected_and_capped(self) -> None:
+        provider, _ = self._provider([HTTPStatusError(429, b"", {"retry-after": "2"})])
+        self.assertIsNone(provider.generate("sys", "language: en", "look").error)
+        self.assertEqual(self.sleeps, [2.0])
+        provider, pool = self._provider([HTTPStatusError(429, b"", {"retry-after": "120"})])
+        self.assertEqual(provider.generate("sys", "language: en", "look").error, "quota")
+        self.assertEqual(pool.calls, 1)
+
+    def test_key_errors_are_not_retried(self) -> None:
+        provider, pool = self._provider([HTTPStatusError(401, b"", {})])
+        self.assertEqual(provider.generate("sys", "language: en", "look").error, "invalid_key")
+        self.assertEqual(pool.calls, 1)
+
+    def test_open_breaker_fails_fast_to_fallback(self) -> None:
+        provider, pool = self._provider([], max_attempts=1, fallback=MockProvider())
+        breaker = openrouter.get_breaker("sk-test", self.model)
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        result = provider.generate("sys", "language: en", "inspect the cart")
+        self.assertEqual(pool.calls, 0)
+        self.assertIsNone(result.error)
+        self.assertTrue(result.directive["need_check"])
+        self.assertGreaterEqual(openrouter.call_stats()["fallbacks"], 1)
+
+    def test_breaker_opened_by_own_failures_stops_retrying(self) -> None:
+        provider, pool = self._provider([HTTPStatusError(503, b"", {})] * 5, max_attempts=5, fallback=MockProvider())
+        breaker = openrouter.get_breaker("sk-test", self.model)
+        for _ in range(breaker.failure_threshold - 1):
+            breaker.record_failure()
+        result = provider.generate("sys", "language: en", "look")
+        self.assertIsNone(result.error)
+        self.assertEqual(pool.calls, 1)
+        self.assertEqual(self.sleeps, [])
+        self.assertEqual(breaker.state, "open")
+
+    def test_outage_without_fallback_reports_unavailable(self) -> None:
+        provider, _ = self._provider([HTTPStatusError(502, b"", {})] * 3)
+        result = provider.generate("sys", "language: en", "look")
+        self.assertEqual(result.error, "unavailable")
+        self.assertEqual(len(self.sleeps), 2)
+
+    def test_slow_request_is_hedged(self) -> None:
+        patcher = mock.patch.object(openrouter, "_HEDGE_POOL", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        provider, _ = self._provider([], hedge=True)
+        provider.generate("sys", "language: en", "look")
+        self.assertIsNone(openrouter._HEDGE_POOL)
+        latency = openrouter._METRICS.model_latency(self.model)
+        for _ in range(20):
+            latency.record(10.0)
+        provider, pool = self._provider([(1.0, OK), OK], hedge=True, hedge_min_delay_sec=0.05)
+        before = openrouter.call_stats().get("hedges_won", 0)
+        started = time.monotonic()
+        result = provider.generate("sys", "language: en", "look")
+        self.assertIsNone(result.error)
+        self.assertLess(time.monotonic() - started, 0.8)
+        self.assertEqual(pool.calls, 2)
+        self.assertEqual(openrouter.call_stats()["hedges_won"], before + 1)
+        self.assertIsNotNone(openrouter._HEDGE_POOL)
+
+
+if __name__ == "__main__":
+    unittest.main()
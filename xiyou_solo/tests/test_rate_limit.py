@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from xiyou_solo.infra.rate_limit import ConcurrencyLimiter, LimitExceeded, RateLimiter, key_fingerprint
+from xiyou_solo.services import game_service, room_repo
+
+
+class RateLimiterTests(unittest.TestCase):
+    def test_burst_then_refill(self) -> None:
+        limiter = RateLimiter(rate=1.0, burst=3)
+        self.assertEqual([limiter.allow("u", now=0) for _ in range(4)], [True, True, True, False])
+        self.assertTrue(limiter.allow("u", now=1.0))
+        self.assertFalse(limiter.allow("u", now=1.5))
+        self.assertEqual(limiter.stats()["rejected"], 2)
+
+    def test_idle_buckets_are_evicted(self) -> None:
+        limiter = RateLimiter(rate=1.0, burst=2, idle_sec=10, max_keys=100)
+        for idx in range(5):
+            limiter.allow(f"k{idx}", now=0)
+        limiter.allow("fresh", now=20)
+        self.assertEqual(len(limiter), 1)
+        self.assertEqual(limiter.stats()["evicted"], 5)
+
+    def test_max_keys_bounds_table(self) -> None:
+        limiter = RateLimiter(rate=1.0, burst=2, idle_sec=3600, max_keys=3)
+        for idx in range(10):
+            limiter.allow(f"k{idx}", now=idx)
+        self.assertEqual(len(limiter), 3)
+
+    def test_zero_rate_disables(self) -> None:
+        limiter = RateLimiter(rate=0, burst=1)
+        self.assertTrue(all(limiter.allow("u", now=0) for _ in range(100)))
+        self.assertEqual(len(limiter), 0)
+
+
+class ConcurrencyLimiterTests(unittest.TestCase):
+    def test_slot_cap_and_release(self) -> None:
+        limiter = ConcurrencyLimiter(1, scope="group_turns")
+        with limiter.slot("g"):
+            with self.assertRaises(LimitExceeded) as ctx:
+                with limiter.slot("g"):
+                    pass
+            self.assertEqual(ctx.exception.scope, "group_turns")
+            with limiter.slot("other"):
+                self.assertEqual(limiter.in_flight(), 2)
+        self.assertEqual(limiter.in_flight(), 0)
+        self.assertEqual(limiter.stats()["rejected"], 1)
+
+    def test_slot_waits_for_release_up_to_timeout(self) -> None:
+        limiter = ConcurrencyLimiter(1, scope="api_key_turns")
+        self.assertTrue(limiter.acquire("k"))
+        timer = threading.Timer(0.05, limiter.release, args=("k",))
+        timer.start()
+        with limiter.slot("k", timeout=5):
+            self.assertEqual(limiter.in_flight("k"), 1)
+        timer.join()
+        self.assertTrue(limiter.acquire("k"))
+        self.assertFalse(limiter.acquire("k", timeout=0.01))
+        self.assertEqual((limiter.stats()["waited"], limiter.stats()["rejected"]), (2, 1))
+
+    def test_fingerprint_hides_key(self) -> None:
+        fp = key_fingerprint("sk-or-secret")
+        self.assertNotIn("secret", fp)
+        self.assertEqual(fp, key_fingerprint(" sk-or-secret "))
+        self.assertEqual(key_fingerprint(None), "default")
+
+
+class GameServiceLimitTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        base = Path(self._tmp.name)
+        for patcher in (
+            mock.patch.object(room_repo, "ROOMS_DIR", base / "rooms"),
+            mock.patch.object(room_repo, "ROOMS_PATH", base / "rooms.json"),
+            mock.patch.object(game_service, "_LIMITS", game_service.build_limits(user_rate=0.001, user_burst=2)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self._tmp.cleanup)
+
+    def test_user_bucket_rejects_and_reports(self) -> None:
+        replies = [game_service.handle_message("g", "spammer", "/help", f"m{idx}") for idx in range(3)]
+        self.assertEqual(replies[2], ["Too many commands. Please wait a moment."])
+        self.assertNotEqual(game_service.handle_message("g", "calm", "/help", "m9"), replies[2])
+        stats = game_service.limit_stats()
+        self.assertEqual(stats["user"]["rejected"], 1)
+        self.assertEqual(stats["group"]["allowed"], 3)
+        self.assertNotIn("rate_limit", room_repo.load_group("g"))
+
+    def test_group_rejection_refunds_the_user_token(self) -> None:
+        limits = game_service.build_limits(user_rate=0.001, user_burst=2, group_rate=0.001, group_burst=1)
+        with mock.patch.object(game_service, "_LIMITS", limits):
+            self.assertIsNone(game_service.check_limits("g", "a", now=0))
+            self.assertEqual(game_service.check_limits("g", "b", now=0), "group")
+            # b's own bucket was not charged for the message the group turned away.
+            self.assertIsNone(game_service.check_limits("h", "b", now=0))
+            self.assertIsNone(game_service.check_limits("i", "b", now=0))
+            self.assertEqual(limits["user"].stats()["refunded"], 1)
+
+    def test_injected_clock_reaches_the_limits(self) -> None:
+        limits = game_service.build_limits(user_rate=1.0, user_burst=1)
+        with mock.patch.object(game_service, "_LIMITS", limits):
+            self.assertNotIn("Too many", game_service.handle_message("g", "u", "/help", "m1", now_ts=100.0)[0])
+            self.assertIn("Too many", game_service.handle_message("g", "u", "/help", "m2", now_ts=100.1)[0])
+            self.assertNotIn("Too many", game_service.handle_message("g", "u", "/help", "m3", now_ts=102.0)[0])
+
+    def test_min_interval_sec_is_deprecated(self) -> None:
+        with self.assertWarns(DeprecationWarning):
+            game_service.handle_message("g", "u", "/help", "m1", min_interval_sec=2.0)
+
+    def test_redelivery_is_ignored_before_limits(self) -> None:
+        first = game_service.handle_message("g", "u", "/help", "m1")
+        again = [game_service.handle_message("g", "u", "/help", "m1") for _ in range(3)]
+        self.assertEqual(again, [["Duplicate message ignored."]] * 3)
+        self.assertEqual(game_service.handle_message("g", "u", "/help", "m2"), first)
+        self.assertEqual(game_service.limit_stats()["user"]["rejected"], 0)
+
+    def test_busy_api_key_reply_is_not_cached(self) -> None:
+        from xiyou_solo.services import telegram_bot, tg_handler
+        from xiyou_solo.services.telegram_state import ReplyCache
+
+        cache = ReplyCache(Path(self._tmp.name) / "replies.sqlite3")
+        self.addCleanup(cache.close)
+        sent = []
+        busy = tg_handler.ServerBusy("busy")
+        with mock.patch.object(telegram_bot, "get_reply_cache", return_value=cache), mock.patch.object(
+            telegram_bot, "send_message", lambda token, chat_id, text: sent.append(text)
+        ), mock.patch.object(telegram_bot, "handle_chat_text", side_effect=[busy, "played"]):
+            telegram_bot._process_update("t", 1, "look", update_id=7)
+            telegram_bot._process_update("t", 1, "look", update_id=7)
+        self.assertEqual(sent, ["busy", "played"])
+        self.assertEqual(cache.get(7), "played")
+
+    def test_concurrent_turns_per_group_are_capped(self) -> None:
+        from xiyou_solo.ui import bot_runner
+
+        gate = threading.Event()
+        started = threading.Event()
+
+        def slow_turn(*_args):
+            started.set()
+            gate.wait(5)
+            return "n", {}, "s"
+
+        with mock.patch.object(bot_runner, "_run_turn", slow_turn):
+            worker = threading.Thread(target=bot_runner.run_turn, args=("s1", "look"), kwargs={"group_id": "chat"})
+            worker.start()
+            started.wait(5)
+            with self.assertRaises(LimitExceeded):
+                bot_runner.run_turn("s2", "look", group_id="chat")
+            gate.set()
+            worker.join(5)
+        self.assertEqual(bot_runner.turn_slot_stats()["api_key"]["in_flight"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
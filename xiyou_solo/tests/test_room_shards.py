@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from xiyou_solo.services import game_service, room_repo
+
+
+class _TmpRooms(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        base = Path(self._tmp.name)
+        self.rooms_dir = base / "rooms"
+        self.legacy = base / "rooms.json"
+        for patcher in (
+            mock.patch.object(room_repo, "ROOMS_DIR", self.rooms_dir),
+            mock.patch.object(room_repo, "ROOMS_PATH", self.legacy),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self._tmp.cleanup)
+
+
+class ShardedStoreTests(_TmpRooms):
+    def test_each_group_writes_only_its_shard(self) -> None:
+        game_service.handle_message("g1", "u1", "/new", "m1")
+        self.assertEqual([p.name for p in self.rooms_dir.iterdir()], [room_repo.shard_path("g1").name])
+        game_service.handle_message("g2", "u9", "/new", "m1")
+        g1 = json.loads(room_repo.shard_path("g1").read_text(encoding="utf-8"))
+        self.assertEqual(list(g1["rooms"]), ["g1"])
+        self.assertEqual(len(list(self.rooms_dir.iterdir())), 2)
+
+    def test_parallel_groups_do_not_lose_updates(self) -> None:
+        groups = [f"group/{idx}" for idx in range(6)]
+
+        def play(gid: str) -> None:
+            game_service.handle_message(gid, "host", "/new", "m0")
+            for n in range(5):
+                game_service.handle_message(gid, f"p{n}", "/join", f"m{n + 1}")
+
+        threads = [threading.Thread(target=play, args=(gid,)) for gid in groups]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for gid in groups:
+            room = room_repo.get_room(room_repo.load_group(gid), gid)
+            self.assertEqual(room["turn_order"], ["host", "p0", "p1", "p2", "p3", "p4"])
+
+    def test_legacy_rooms_file_is_split(self) -> None:
+        self.legacy.write_text(
+            json.dumps(
+                {
+                    "rooms": {"g:1": {"session_id": "s1", "host_user_id": "a"}, "g": {"session_id": "s2", "host_user_id": "b"}},
+                    "bindings": {"g:1:a": {"role_name": "host"}, "g:b": {"role_name": "host"}},
+                    "processed": {"g:1:m1": True},
+                    "rate_limit": {},
+                }
+            ),
+            encoding="utf-8",
+        )
+        data = room_repo.load_group("g:1")
+        self.assertEqual(room_repo.get_room(data, "g:1")["session_id"], "s1")
+        self.assertEqual(data["bindings"], {"g:1": {"a": {"role_name": "host"}}})
+        self.assertFalse(self.legacy.exists())
+        self.assertEqual(room_repo.list_group_bindings(room_repo.load_group("g"), "g"), {"b": {"role_name": "host"}})
+
+    def test_flat_binding_keys_are_nested_on_load(self) -> None:
+        path = room_repo.shard_path("grp")
+        path.parent.mkdir(parents=True)
+        path.write_text(
+            json.dumps({"rooms": {}, "bindings": {"grp:u1": {"role_name": "monk"}, "grp:u2": {"role_name": "fox"}}}),
+            encoding="utf-8",
+        )
+        data = room_repo.load_group("grp")
+        self.assertEqual(list(data["bindings"]), ["grp"])
+        self.assertEqual(room_repo.get_binding(data, "grp", "u2"), {"role_name": "fox"})
+        room_repo.remove_room(data, "grp")
+        self.assertEqual(room_repo.list_group_bindings(data, "grp"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import os
+import unittest
+import uuid
+from typing import Any, Dict, List
+from unittest import mock
+
+from xiyou_solo.infra.http_pool import HTTPStatusError
+from xiyou_solo.llm import openrouter, router
+from xiyou_solo.llm.base import LLMCallResult
+from xiyou_solo.llm.router import RouteHealth, RouterProvider, RouteTarget
+
+
+def _ok(model: str) -> Dict[str, Any]:
+    return {"choices": [{"message": {"content": f"served by {model}"}}], "usage": {"total_tokens": 10}}
+
+
+class _PerTargetPool:
+    """Answers per (key, model); failures[target] is a list of exceptions raised before succeeding."""
+
+    def __init__(self) -> None:
+        self.failures: Dict[tuple, List[Exception]] = {}
+        self.calls: List[tuple] = []
+
+    def request_json(self, method: str, url: str, payload: Dict[str, Any], headers: Dict[str, str], **kwargs: Any) -> Dict[str, Any]:
+        target = (headers["Authorization"].split()[-1], payload["model"])
+        self.calls.append(target)
+        pending = self.failures.get(target)
+        if pending:
+            raise pending.pop(0)
+        return _ok(payload["model"])
+
+
+class RouteHealthTests(unittest.TestCase):
+    def test_quota_error_starts_cooldown_and_errors_age_out(self) -> None:
+        health = RouteHealth(window_sec=100)
+        health.record(LLMCallResult("", {}, "", 100), now=0)
+        health.record(LLMCallResult("", {}, "", 300), now=1)
+        self.assertAlmostEqual(health.ewma_ms, 140.0)
+        health.record(LLMCallResult("", {}, "", 0, error="quota"), now=2)
+        self.assertFalse(health.available(now=30))
+        self.assertTrue(health.available(now=63))
+        self.assertAlmostEqual(health.error_rate(now=3), 1 / 3)
+        self.assertEqual(health.error_rate(now=500), 0.0)
+
+
+class RouterProviderTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pool = _PerTargetPool()
+        patcher = mock.patch.object(openrouter, "get_pool", lambda: self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Health is process-wide per (key, model); fresh names keep tests apart.
+        tag = uuid.uuid4().hex[:6]
+        self.fast = f"fast-{tag}"
+        self.slow = f"slow-{tag}"
+
+    def _router(self, targets: List[RouteTarget], **kwargs: Any) -> RouterProvider:
+        return RouterProvider(targets, call_policy=openrouter.CallPolicy(max_attempts=1), **kwargs)
+
+    def test_fastest_healthy_target_wins(self) -> None:
+        a, b = RouteTarget("sk-a", self.slow, tier=1), RouteTarget("sk-a", self.fast, tier=1)
+        router.route_health(a).record(LLMCallResult("", {}, "", 900))
+        router.route_health(b).record(LLMCallResult("", {}, "", 100))
+        result = self._router([a, b]).generate("sys", "language: en", "look")
+        self.assertEqual(result.narrative, f"served by {self.fast}")
+        self.assertEqual(self._router([a, b], policy="ordered").rank()[0], a)
+
+    def test_quota_reroutes_and_benches_target(self) -> None:
+        a, b = RouteTarget("sk-a", self.fast, tier=1), RouteTarget("sk-b", self.fast, tier=1)
+        self.pool.failures[("sk-a", self.fast)] = [HTTPStatusError(402, b"", {})]
+        provider = self._router([a, b], policy="ordered")
+        self.assertIsNone(provider.generate("sys", "language: en", "look").error)
+        self.assertEqual(self.pool.calls, [("sk-a", self.fast), ("sk-b", self.fast)])
+        provider.generate("sys", "language: en", "look again")
+        self.assertEqual(self.pool.calls[-1], ("sk-b", self.fast))
+        self.assertEqual(router.router_stats()[f"{router.key_fingerprint('sk-a')}:{self.fast}"]["last_error"], "quota")
+
+    def test_own_key_is_preferred_over_faster_server_key(self) -> None:
+        own, server = RouteTarget("sk-own", self.slow, tier=0), RouteTarget("sk-srv", self.fast, tier=1)
+        router.route_health(own).record(LLMCallResult("", {}, "", 900))
+        router.route_health(server).record(LLMCallResult("", {}, "", 50))
+        self._router([server, own]).generate("sys", "language: en", "look")
+        self.assertEqual(self.pool.calls, [("sk-own", self.slow)])
+
+    def test_rejected_own_key_is_surfaced_not_served_by_server_key(self) -> None:
+        own, server = RouteTarget("sk-own", self.fast, tier=0), RouteTarget("sk-srv", self.fast, tier=1)
+        self.pool.failures[("sk-own", self.fast)] = [HTTPStatusError(401, b"", {}), HTTPStatusError(401, b"", {})]
+        provider = self._router([own, server])
+        self.assertEqual(provider.generate("sys", "language: en", "look").error, "invalid_key")
+        # Benched for an hour, the own key still blocks the server keys on the next turn.
+        self.assertEqual(provider.generate("sys", "language: en", "look again").error, "invalid_key")
+        self.assertEqual(self.pool.calls, [("sk-own", self.fast), ("sk-own", self.fast)])
+
+    def test_own_key_falls_through_on_outage_or_when_opted_in(self) -> None:
+        own, server = RouteTarget("sk-own", self.fast, tier=0), RouteTarget("sk-srv", self.fast, tier=1)
+        self.pool.failures[("sk-own", self.fast)] = [HTTPStatusError(503, b"", {})]
+        self.assertIsNone(self._router([own, server]).generate("sys", "language: en", "look").error)
+        self.assertEqual(self.pool.calls, [("sk-own", self.fast), ("sk-srv", self.fast)])
+        self.pool.calls.clear()
+        own = RouteTarget("sk-own2", self.slow, tier=0)
+        self.pool.failures[("sk-own2", self.slow)] = [HTTPStatusError(402, b"", {})]
+        self.assertIsNone(self._router([own, server], byok_fallback=True).generate("sys", "language: en", "look").error)
+        self.assertEqual(self.pool.calls, [("sk-own2", self.slow), ("sk-srv", self.fast)])
+
+    def test_all_unhealthy_still_tries_soonest_back(self) -> None:
+        a, b = RouteTarget("sk-a", self.slow), RouteTarget("sk-b", self.slow)
+        router.route_health(a).record(LLMCallResult("", {}, "", 0, error="invalid_key"))
+        router.route_health(b).record(LLMCallResult("", {}, "", 0, error="quota"))
+        result = self._router([a, b], max_tries=1).generate("sys", "language: en", "look")
+        self.assertIsNone(result.error)
+        self.assertEqual(self.pool.calls, [("sk-b", self.slow)])
+
+    def test_from_env_pairs_keys_and_models(self) -> None:
+        env = {"OPENROUTER_ROUTER_MODELS": "m1,m2", "OPENROUTER_ROUTER_KEYS": "sk-s1,sk-own"}
+        with mock.patch.dict(os.environ, env):
+            provider = router.make_provider("sk-own")
+        self.assertIsInstance(provider, RouterProvider)
+        self.assertEqual(
+            [(t.api_key, t.model, t.tier) for t in provider.targets],
+            [("sk-own", "m1", 0), ("sk-own", "m2", 0), ("sk-s1", "m1", 1), ("sk-s1", "m2", 1)],
+        )
+        with mock.patch.dict(os.environ, {"OPENROUTER_ROUTER_MODELS": "", "OPENROUTER_ROUTER_KEYS": ""}):
+            self.assertIsInstance(router.make_provider("sk-own"), openrouter.OpenRouterProvider)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from xiyou_solo.core.state import GameState
+from xiyou_solo.infra import serialization
+from xiyou_solo.infra.serialization import (
+    SCHEMA_VERSION,
+    available_serializers,
+    decode_state,
+    encode_state,
+    get_serializer,
+    state_from_doc,
+)
+from xiyou_solo.infra.session_store import GameSessionStore, SessionStore
+
+
+def _state() -> GameState:
+    return GameState(
+        session_id="sess_fmt_001",
+        player_id="telegram:42",
+        language="en",
+        player_name="悟空",
+        stats={"body": 14, "wit": 9, "spirit": 11, "luck": 8},
+        hp=7,
+        max_hp=15,
+        gold=1234567,
+        inventory=["dagger", "healing_herbs", "healing_herbs"],
+        turn=21,
+        progress=3,
+        threat_level=5,
+        threat=4,
+        flags=["clue:map", "finale"],
+        combat_state={"active": True, "round": 2, "enemies": [{"id": "m1", "hp": 0, "loot_gold": [1, 5]}], "ratio": 0.5, "note": None},
+    )
+
+
+class SerializerRoundTripTests(unittest.TestCase):
+    def test_every_codec_round_trips(self) -> None:
+        src = _state()
+        for name in available_serializers():
+            with self.subTest(codec=name):
+                raw = encode_state(src, get_serializer(name))
+                self.assertEqual(decode_state(raw).to_dict(), src.to_dict())
+
+    def test_binary_is_smaller_than_pretty_json(self) -> None:
+        doc = _state().to_dict()
+        pretty = json.dumps(doc, ensure_ascii=False, indent=2).encode("utf-8")
+        self.assertLess(len(get_serializer("binary").dumps(doc)), len(pretty))
+
+    def test_documents_carry_schema_version(self) -> None:
+        doc = _state().to_dict()
+        for name in available_serializers():
+            codec = get_serializer(name)
+            self.assertEqual(codec.loads(codec.dumps(doc))["schema_version"], SCHEMA_VERSION)
+
+    def test_unversioned_document_is_revalidated(self) -> None:
+        doc = _state().to_dict()
+        doc["player"]["inventory"] = "not-a-list"
+        with mock.patch.object(GameState, "from_trusted_dict", side_effect=AssertionError("trusted path used")):
+            restored = state_from_doc(doc)
+        self.assertEqual(restored.inventory, [])
+
+    def test_auto_falls_back_to_json_without_orjson(self) -> None:
+        with mock.patch.object(serialization, "orjson", None):
+            self.assertEqual(get_serializer("auto").name, "json")
+            self.assertEqual(get_serializer("orjson").name, "json")
+
+
+class SessionStoreFormatTests(unittest.TestCase):
+    def test_binary_store_reads_legacy_json_state(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            sessions = Path(tmp)
+            legacy = GameSessionStore(SessionStore(sessions, serializer=get_serializer("json")))
+            legacy.save_game(_state(), {"events": []})
+            sid = "sess_fmt_001"
+            self.assertTrue((sessions / sid / "state.json").exists())
+
+            binary = GameSessionStore(SessionStore(sessions, serializer=get_serializer("binary")))
+            loaded = binary.load_game(sid)
+            self.assertIsNotNone(loaded)
+            state, _log = loaded
+            binary.save_game(state, {"events": []})
+            self.assertTrue((sessions / sid / "state.bin").exists())
+            self.assertEqual(binary.load_game(sid)[0].to_dict(), _state().to_dict())
+
+    def test_switching_format_back_keeps_latest_turns(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            sessions = Path(tmp)
+            as_json = GameSessionStore(SessionStore(sessions, serializer=get_serializer("json")))
+            as_binary = GameSessionStore(SessionStore(sessions, serializer=get_serializer("binary")))
+            as_json.save_game(_state(), {"events": []})
+            state, log = as_binary.load_game("sess_fmt_001")
+            state.turn = 30
+            as_binary.save_game(state, log)
+            self.assertFalse((sessions / "sess_fmt_001" / "state.json").exists())
+            self.assertEqual(as_json.load_game("sess_fmt_001")[0].turn, 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import unittest
+
+from xiyou_solo.core.containers import FlagStore, Inventory
+from xiyou_solo.core.scenarios import SCENARIO_TEXT_IDS, SCENARIOS
+from xiyou_solo.core.state import GameState, new_game_state
+
+
+class SlottedStateTests(unittest.TestCase):
+    def test_state_has_no_instance_dict(self) -> None:
+        state = new_game_state("sess_a")
+        self.assertFalse(hasattr(state, "__dict__"))
+        with self.assertRaises(AttributeError):
+            state.not_a_field = 1  # type: ignore[attr-defined]
+
+    def test_localized_texts_are_shared_between_sessions(self) -> None:
+        a = new_game_state("sess_a")
+        b = GameState.from_dict(new_game_state("sess_b").to_dict())
+        self.assertIs(a.location, b.location)
+        a.location = SCENARIOS["baigu"]["location"]
+        self.assertEqual(a.location_id, SCENARIO_TEXT_IDS["baigu"]["location"])
+        self.assertEqual(a.location["en"], "White Bone Ridge Post")
+        self.assertEqual(b.location["en"], "Roadside Tea Stall")
+
+    def test_to_dict_from_dict_compatible(self) -> None:
+        src = new_game_state("sess_a", language="en")
+        src.inventory.extend(["dagger", "healing_herbs", "healing_herbs"])
+        src.flags.add("clue:map")
+        src.quest_title = SCENARIOS["huoyan"]["title"]
+        dumped = src.to_dict()
+        self.assertIsInstance(dumped["player"]["inventory"], list)
+        self.assertIsInstance(dumped["story"]["quest_title"], dict)
+        restored = GameState.from_dict(dumped)
+        self.assertEqual(restored.to_dict(), dumped)
+        self.assertEqual(restored.quest_title_id, src.quest_title_id)
+
+
+class InventoryTests(unittest.TestCase):
+    def test_counts_and_list_equality(self) -> None:
+        inv = Inventory(["herb", "dagger", "herb"])
+        self.assertEqual(inv.count("herb"), 2)
+        self.assertEqual(len(inv), 3)
+        self.assertEqual(inv, ["dagger", "herb", "herb"])
+        inv.remove("herb")
+        self.assertEqual(inv.count("herb"), 1)
+        self.assertFalse(inv.discard("missing"))
+        with self.assertRaises(ValueError):
+            inv.remove("missing")
+
+
+    def test_keeps_insertion_order(self) -> None:
+        inv = Inventory(["herb", "dagger", "herb"])
+        inv.add("rope", 2)
+        self.assertEqual(inv.to_list(), ["herb", "dagger", "herb", "rope", "rope"])
+        inv.discard("herb")
+        self.assertEqual(list(inv), ["dagger", "herb", "rope", "rope"])
+        self.assertEqual(repr(inv), repr(["dagger", "herb", "rope", "rope"]))
+
+
+class FlagStoreTests(unittest.TestCase):
+    def test_dedup_and_order(self) -> None:
+        flags = FlagStore(["a", "b", "a"])
+        flags.append("c")
+        self.assertEqual(flags, ["a", "b", "c"])
+        self.assertIn("b", flags)
+        self.assertTrue(flags.discard("b"))
+        self.assertFalse(flags.discard("b"))
+
+
+if __name__ == "__main__":
+    unittest.main()
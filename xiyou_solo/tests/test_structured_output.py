@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import json
+import os
+import unittest
+import uuid
+from typing import Any, Dict, List
+from unittest import mock
+
+from xiyou_solo.infra.http_pool import HTTPStatusError
+from xiyou_solo.llm import openrouter, structured
+from xiyou_solo.llm.directive_parser import parse_structured
+
+
+DIRECTIVE = {
+    "need_check": True,
+    "check": {"attribute": "Body", "dc": 20, "reason": "Climb the wall."},
+    "enter_combat": False,
+    "npc_attitude_changes": [{"npc_id": "innkeeper", "delta": 1}],
+}
+STRUCTURED = json.dumps({"narrative": "You climb.", "directive": DIRECTIVE})
+
+
+class _RecordingPool:
+    """Returns responses in order (exceptions are raised) and keeps every payload sent."""
+
+    def __init__(self, responses: List[Any]) -> None:
+        self.responses = list(responses)
+        self.payloads: List[Dict[str, Any]] = []
+
+    def request_json(self, method: str, url: str, payload: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        self.payloads.append(payload)
+        item = self.responses.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+
+def _content(text: str) -> Dict[str, Any]:
+    return {"choices": [{"message": {"content": text}}]}
+
+
+def _tool_call(arguments: str) -> Dict[str, Any]:
+    call = {"type": "function", "function": {"name": structured.TOOL_NAME, "arguments": arguments}}
+    return {"choices": [{"message": {"content": None, "tool_calls": [call]}}]}
+
+
+class StructuredOutputTests(unittest.TestCase):
+    def setUp(self) -> None:
+        # Parse stats and rejections are per model; fresh names keep tests apart.
+        self.model = f"openai/test-{uuid.uuid4().hex[:6]}"
+
+    def _generate(self, pool: _RecordingPool, mode: str, model: str = ""):
+        provider = openrouter.OpenRouterProvider(
+            api_key="sk-x", model=model or self.model, cache=None, policy=openrouter.CallPolicy(max_attempts=1), fallback=None
+        )
+        with mock.patch.object(openrouter, "get_pool", lambda: pool), mock.patch.dict(os.environ, {"OPENROUTER_STRUCTURED": mode}):
+            return provider.generate("sys", "language: en", "climb")
+
+    def test_json_schema_reply_is_parsed_directly(self) -> None:
+        pool = _RecordingPool([_content(STRUCTURED)])
+        result = self._generate(pool, structured.AUTO)
+        fmt = pool.payloads[0]["response_format"]
+        self.assertEqual(fmt["json_schema"]["schema"]["required"], ["narrative", "directive"])
+        self.assertIn("npc_attitude_changes", fmt["json_schema"]["schema"]["properties"]["directive"]["properties"])
+        self.assertEqual(result.narrative, "You climb.")
+        self.assertEqual((result.directive["check"]["attribute"], result.directive["check"]["dc"]), ("Body", 20))
+        self.assertEqual(structured.parse_stats()[self.model]["structured"], 1)
+
+    def test_tool_call_arguments_are_parsed(self) -> None:
+        pool = _RecordingPool([_tool_call(STRUCTURED)])
+        result = self._generate(pool, structured.TOOLS)
+        self.assertEqual(pool.payloads[0]["tool_choice"]["function"]["name"], structured.TOOL_NAME)
+        self.assertNotIn("response_format", pool.payloads[0])
+        self.assertTrue(result.directive["need_check"])
+
+    def test_text_reply_in_structured_mode_falls_back(self) -> None:
+        pool = _RecordingPool([_content('Rain.\n```json\n{"grant_clue": true}\n```')])
+        result = self._generate(pool, structured.JSON_SCHEMA)
+        self.assertEqual(result.narrative, "Rain.")
+        self.assertTrue(result.directive["grant_clue"])
+        row = structured.parse_stats()[self.model]
+        self.assertEqual((row["fallback"], row["fallback_rate"]), (1, 1.0))
+
+    def test_rejected_response_format_retries_as_text_and_sticks(self) -> None:
+        pool = _RecordingPool([HTTPStatusError(400, b"response_format unsupported", {}), _content("Plain."), _content("Again.")])
+        self.assertEqual(self._generate(pool, structured.JSON_SCHEMA).narrative, "Plain.")
+        self.assertIn("response_format", pool.payloads[0])
+        self.assertNotIn("response_format", pool.payloads[1])
+        self._generate(pool, structured.JSON_SCHEMA)
+        self.assertNotIn("response_format", pool.payloads[2])
+        self.assertEqual(structured.parse_stats()[self.model]["rejected"], 1)
+
+    def test_unrelated_bad_request_keeps_structured_mode(self) -> None:
+        pool = _RecordingPool([HTTPStatusError(400, b'{"error": {"message": "context length exceeded"}}', {}), _content(STRUCTURED)])
+        self.assertEqual(self._generate(pool, structured.JSON_SCHEMA).error, "other")
+        self.assertEqual(len(pool.payloads), 1)
+        self._generate(pool, structured.JSON_SCHEMA)
+        self.assertIn("response_format", pool.payloads[1])
+        self.assertEqual(structured.parse_stats()[self.model]["rejected"], 0)
+
+    def test_structured_reply_with_bad_directive_keeps_its_narrative(self) -> None:
+        pool = _RecordingPool([_content(json.dumps({"narrative": "You climb.", "directive": "none"}))])
+        result = self._generate(pool, structured.JSON_SCHEMA)
+        self.assertEqual(result.narrative, "You climb.")
+        self.assertFalse(result.directive["need_check"])
+        self.assertEqual(structured.parse_stats()[self.model]["fallback"], 1)
+
+    def test_off_and_unknown_models_send_plain_text(self) -> None:
+        pool = _RecordingPool([_content("Plain."), _content("Plain.")])
+        self._generate(pool, structured.OFF)
+        self._generate(pool, structured.AUTO, model=f"other/{uuid.uuid4().hex[:6]}")
+        self.assertFalse(any("response_format" in p or "tools" in p for p in pool.payloads))
+
+
+def test_parse_structured_rejects_non_turn_json() -> None:
+    assert parse_structured('{"need_check": true}') is None
+    assert parse_structured("not json") is None
+    narrative, directive = parse_structured(f"```json\n{STRUCTURED}\n```")
+    assert narrative == "You climb." and directive["npc_attitude_changes"][0]["npc_id"] == "innkeeper"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from xiyou_solo.infra.dispatcher import KeyedDispatcher
+from xiyou_solo.services import telegram_bot
+from xiyou_solo.services.telegram_state import OffsetStore, ReplyCache
+
+
+def _update(update_id: int, chat_id: int, text: str) -> dict:
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}, "text": text}}
+
+
+class PollOnceTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dispatcher = KeyedDispatcher(max_workers=4, max_queue_per_key=8)
+        self.addCleanup(self.dispatcher.shutdown)
+        self.sent: list[tuple[int, str]] = []
+        self.sent_lock = threading.Lock()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.cache = ReplyCache(self.tmp / "replies.sqlite3")
+        self.addCleanup(self.cache.close)
+        for patcher in (
+            mock.patch.object(telegram_bot, "send_message", self._record),
+            mock.patch.object(telegram_bot, "_REPLY_CACHE", self.cache),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _record(self, token: str, chat_id: int, text: str) -> None:
+        with self.sent_lock:
+            self.sent.append((chat_id, text))
+
+    def test_slow_chat_does_not_block_others_and_keeps_order(self) -> None:
+        gate = threading.Event()
+        done = threading.Event()
+
+        def handler(chat_id: int, text: str) -> str:
+            if chat_id == 1 and text == "first":
+                gate.wait(5)
+            if chat_id == 2:
+                done.set()
+            return f"{chat_id}:{text}"
+
+        batch = {"ok": True, "result": [_update(10, 1, "first"), _update(11, 1, "second"), _update(12, 2, "hi"), {"update_id": 13}]}
+        with mock.patch.object(telegram_bot, "_http_get_json", return_value=batch), mock.patch.object(
+            telegram_bot, "handle_chat_text", handler
+        ):
+            offset = telegram_bot.poll_once("tok", 0, self.dispatcher)
+            # The poll returned while chat 1 is still blocked.
+            self.assertEqual(offset, 14)
+            self.assertTrue(done.wait(2))
+            self.dispatcher.submit(2, lambda: None).result(timeout=5)
+            self.assertEqual(self.sent, [(2, "2:hi")])
+            gate.set()
+            self.dispatcher.submit(1, lambda: None).result(timeout=5)
+        self.assertEqual(self.sent[1:], [(1, "1:first"), (1, "1:second")])
+
+    def test_full_chat_queue_gets_busy_notice(self) -> None:
+        dispatcher = KeyedDispatcher(max_workers=1, max_queue_per_key=1)
+        self.addCleanup(dispatcher.shutdown)
+        gate = threading.Event()
+        dispatcher.submit(5, gate.wait, 5)
+        deadline = time.time() + 2
+        while dispatcher.queue_depth(5) and time.time() < deadline:
+            time.sleep(0.005)
+        dispatcher.submit(5, lambda: None)
+        batch = {"ok": True, "result": [_update(1, 5, "more")]}
+        with mock.patch.object(telegram_bot, "_http_get_json", return_value=batch):
+            telegram_bot.poll_once("tok", 0, dispatcher)
+        gate.set()
+        self.assertEqual(self.sent, [(5, "Too many pending messages. Please wait for the current reply.")])
+
+    def test_failed_turn_is_not_cached_and_runs_again(self) -> None:
+        handler = mock.Mock(side_effect=[RuntimeError("db path /srv/secret locked"), "played"])
+        self.assertTrue(self.cache.claim(30))
+        with mock.patch.object(telegram_bot, "handle_chat_text", handler):
+            telegram_bot._process_update("tok", 4, "look", update_id=30)
+            self.assertIsNone(self.cache.get(30))
+            self.assertTrue(self.cache.claim(30))
+            telegram_bot._process_update("tok", 4, "look", update_id=30)
+        self.assertEqual(self.sent, [(4, telegram_bot.INTERNAL_ERROR_REPLY), (4, "played")])
+        self.assertEqual(self.cache.get(30), "played")
+
+    def test_restart_resumes_offset_and_replays_cached_replies(self) -> None:
+        turns: list[str] = []
+
+        def handler(chat_id: int, text: str) -> str:
+            turns.append(text)
+            return f"reply {text}"
+
+        offsets = OffsetStore(self.tmp / "offset.json")
+        batch = {"ok": True, "result": [_update(20, 3, "a"), _update(21, 3, "b")]}
+        with mock.patch.object(telegram_bot, "_http_get_json", return_value=batch), mock.patch.object(
+            telegram_bot, "handle_chat_text", handler
+        ):
+            telegram_bot.poll_once("tok", offsets.next_offset, self.dispatcher, offsets=offsets)
+            self.dispatcher.submit(3, lambda: None).result(timeout=5)
+            # Crash before the next batch: the offset on disk still covers both updates.
+            self.assertEqual(OffsetStore(self.tmp / "offset.json").next_offset, 20)
+
+            restarted = OffsetStore(self.tmp / "offset.json")
+            telegram_bot.poll_once("tok", restarted.next_offset, self.dispatcher, offsets=restarted)
+            self.dispatcher.submit(3, lambda: None).result(timeout=5)
+            restarted.save()
+        self.assertEqual(turns, ["a", "b"])
+        self.assertEqual([text for _chat, text in self.sent], ["reply a", "reply b", "reply a", "reply b"])
+        self.assertEqual(OffsetStore(self.tmp / "offset.json").next_offset, 22)
+        self.assertEqual(self.cache.stats()["hits"], 2)
+
+
+class ReplyCacheTests(unittest.TestCase):
+    def test_cache_is_bounded(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ReplyCache(Path(tmp) / "r.sqlite3", capacity=10)
+            for update_id in range(100):
+                cache.put(update_id, 1, f"r{update_id}")
+            self.assertLessEqual(len(cache), 10 + 49)
+            self.assertEqual(cache.get(99), "r99")
+            self.assertIsNone(cache.get(0))
+            cache.close()
+
+    def test_claim_is_shared_between_processes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            first = ReplyCache(Path(tmp) / "r.sqlite3", claim_lease_sec=60)
+            second = ReplyCache(Path(tmp) / "r.sqlite3", claim_lease_sec=60)
+            self.assertTrue(first.claim(5, now=0))
+            self.assertFalse(second.claim(5, now=30))
+            # The claimer died without answering: the lease runs out and another process takes over.
+            self.assertTrue(second.claim(5, now=61))
+            second.put(5, 1, "done")
+            self.assertFalse(first.claim(5, now=500))
+            first.release(6)
+            self.assertTrue(first.claim(6, now=0))
+            first.release(6)
+            self.assertTrue(second.claim(6, now=1))
+            first.close()
+            second.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import time
+import unittest
+
+from xiyou_solo.infra.http_pool import ConnectionPool
+from xiyou_solo.services.telegram_sender import OutboundQueue, split_message
+from xiyou_solo.tests.fake_telegram import FakeTelegram
+
+
+class SplitMessageTests(unittest.TestCase):
+    def test_splits_on_boundaries_without_losing_text(self) -> None:
+        text = "\n\n".join(f"paragraph {idx} " + "word " * 30 for idx in range(10))
+        parts = split_message(text, limit=400)
+        self.assertTrue(all(len(p) <= 400 for p in parts))
+        self.assertTrue(all(p.startswith("paragraph") for p in parts))
+        self.assertEqual(" ".join(" ".join(parts).split()), " ".join(text.split()))
+
+    def test_unbroken_run_is_hard_cut(self) -> None:
+        self.assertEqual(split_message("x" * 10, limit=4), ["xxxx", "xxxx", "xx"])
+        self.assertEqual(split_message("   "), [])
+        # One early space then an unbroken run: hard cuts, not a tiny first part.
+        self.assertEqual(split_message("ab " + "x" * 20, limit=10), ["ab xxxxxxx", "xxxxxxxxxx", "xxx"])
+
+
+class OutboundQueueTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.fake = FakeTelegram().start()
+        self.addCleanup(self.fake.stop)
+        self.pool = ConnectionPool(timeout=5)
+        self.addCleanup(self.pool.close)
+        url = f"{self.fake.base_url}/bot123:abc/sendMessage"
+
+        def post(chat_id: int, text: str) -> None:
+            self.pool.request_json("POST", url, payload={"chat_id": chat_id, "text": text})
+
+        self.post = post
+
+    def _queue(self, **kwargs) -> OutboundQueue:
+        queue = OutboundQueue(self.post, **kwargs)
+        self.addCleanup(queue.close, 1)
+        return queue
+
+    def test_long_reply_is_split_and_delivered_in_order(self) -> None:
+        queue = self._queue(per_chat_rate=1000, per_chat_burst=1000)
+        self.assertEqual(queue.send(1, "a" * 5000 + " " + "b" * 100), 2)
+        queue.send(1, "tail")
+        self.assertTrue(queue.flush(5))
+        self.assertEqual([t[:1] for t in self.fake.texts(1)], ["a", "a", "t"])
+        self.assertEqual(queue.stats()["delivery_ms"]["count"], 3)
+
+    def test_retry_after_is_honoured(self) -> None:
+        self.fake.send_failures.append((429, {"retry_after": 0.2}))
+        queue = self._queue(per_chat_rate=1000, per_chat_burst=1000)
+        started = time.monotonic()
+        queue.send(2, "hello")
+        self.assertTrue(queue.flush(5))
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(self.fake.texts(2), ["hello"])
+        stats = queue.stats()
+        self.assertEqual((stats["rate_limited"], stats["retries"], stats["delivered"]), (1, 1, 1))
+
+    def test_server_errors_back_off_and_client_errors_drop(self) -> None:
+        self.fake.send_failures.extend([(500, {}), (400, {})])
+        queue = self._queue(per_chat_rate=1000, per_chat_burst=1000, backoff_base=0.01)
+        queue.send(3, "first")
+        queue.send(3, "second")
+        self.assertTrue(queue.flush(5))
+        # "first" fails with 500, retries and is rejected with 400; "second" goes through.
+        self.assertEqual(self.fake.texts(3), ["second"])
+        stats = queue.stats()
+        self.assertEqual((stats["retries"], stats["dropped"]), (1, 1))
+
+    def test_per_chat_bucket_throttles_one_chat_only(self) -> None:
+        queue = self._queue(per_chat_rate=5, per_chat_burst=1)
+        for idx in range(3):
+            queue.send(4, f"slow {idx}")
+        queue.send(5, "other")
+        deadline = time.time() + 2
+        while not self.fake.texts(5) and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertLess(len(self.fake.texts(4)), 3)
+        self.assertTrue(queue.flush(5))
+        self.assertEqual(self.fake.texts(4), ["slow 0", "slow 1", "slow 2"])
+        self.assertGreater(queue.stats()["throttled"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
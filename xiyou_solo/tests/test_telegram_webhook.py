@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import http.client
+import json
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from xiyou_solo.services import telegram_bot, telegram_webhook, tg_handler
+from xiyou_solo.services.metrics import metrics_snapshot
+from xiyou_solo.services.telegram_state import ChatIndex, ReplyCache
+from xiyou_solo.tests.fake_telegram import FakeTelegram
+
+
+class WebhookTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.fake = FakeTelegram().start()
+        self.addCleanup(self.fake.stop)
+        self.calls: list[tuple[int, str]] = []
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cache = ReplyCache(Path(tmp.name) / "replies.sqlite3")
+        self.addCleanup(cache.close)
+        index = ChatIndex(Path(tmp.name) / "chats.sqlite3", legacy_path=None)
+        self.addCleanup(index.close)
+        for patcher in (
+            mock.patch.object(telegram_bot, "_REPLY_CACHE", cache),
+            mock.patch.object(tg_handler, "_CHAT_INDEX", index),
+            mock.patch.dict(telegram_bot._SENDERS, clear=True),
+            mock.patch.object(telegram_bot, "API_BASE", self.fake.base_url),
+            mock.patch.object(telegram_bot, "handle_chat_text", self._handle),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.app = telegram_webhook.WebhookApp("123:abc", "s3cret")
+        self.addCleanup(lambda: telegram_bot.get_sender("123:abc").close())
+        self.addCleanup(self.app.dispatcher.shutdown)
+        self.server = telegram_webhook.make_webhook_server(self.app, "127.0.0.1", 0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.conn = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=5)
+        self.addCleanup(self.conn.close)
+
+    def _handle(self, chat_id: int, text: str) -> str:
+        self.calls.append((chat_id, text))
+        return f"echo {text}"
+
+    def _post(self, update: dict, secret: str = "s3cret") -> int:
+        body = json.dumps(update).encode("utf-8")
+        headers = {"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": secret}
+        self.conn.request("POST", telegram_webhook.WEBHOOK_PATH, body=body, headers=headers)
+        resp = self.conn.getresponse()
+        resp.read()
+        return resp.status
+
+    def test_update_is_answered_once_through_fake_telegram(self) -> None:
+        update = {"update_id": 42, "message": {"chat": {"id": 7}, "text": "/status"}}
+        self.assertEqual(self._post(update), 200)
+        # Telegram redelivery of the same update is acknowledged but not re-run.
+        self.assertEqual(self._post(update), 200)
+        self.assertTrue(self.fake.wait_for(1))
+        self.app.dispatcher.submit(7, lambda: None).result(timeout=5)
+        self.assertEqual(self.calls, [(7, "/status")])
+        self.assertEqual(self.fake.texts(7), ["echo /status"])
+        stats = self.app.stats()
+        self.assertEqual((stats["accepted"], stats["ignored"]), (1, 1))
+        self.assertLessEqual(set(metrics_snapshot()), set(stats))
+
+    def test_redelivery_to_another_process_is_not_rerun(self) -> None:
+        other = telegram_webhook.WebhookApp("123:abc", "s3cret")
+        self.addCleanup(other.dispatcher.shutdown)
+        update = {"update_id": 43, "message": {"chat": {"id": 7}, "text": "look"}}
+        self.assertEqual(self.app.accept(update), 200)
+        self.assertEqual(other.accept(update), 200)
+        self.app.dispatcher.submit(7, lambda: None).result(timeout=5)
+        self.assertEqual(self.calls, [(7, "look")])
+        self.assertEqual(other.stats()["ignored"], 1)
+
+    def test_wrong_secret_is_rejected(self) -> None:
+        self.assertEqual(self._post({"update_id": 1, "message": {"chat": {"id": 7}, "text": "hi"}}, secret="nope"), 403)
+        self.assertEqual(self.app.stats()["forbidden"], 1)
+        self.assertEqual(self.calls, [])
+
+    def test_empty_secret_rejects_every_request(self) -> None:
+        self.app.secret = ""
+        self.assertEqual(self._post({"update_id": 2, "message": {"chat": {"id": 7}, "text": "hi"}}, secret=""), 403)
+        self.assertEqual(self.calls, [])
+
+    def test_run_webhook_refuses_to_start_without_secret(self) -> None:
+        env = mock.patch.dict(os.environ, {"TELEGRAM_BOT_TOKEN": "123:abc"})
+        with env, mock.patch.object(telegram_webhook, "SECRET", ""), mock.patch.object(telegram_webhook, "make_webhook_server") as make:
+            telegram_webhook.run_webhook("127.0.0.1", 0)
+        make.assert_not_called()
+
+    def test_set_webhook_sends_secret(self) -> None:
+        telegram_webhook.set_webhook("123:abc", "https://example.test/hook", "s3cret")
+        self.assertEqual(self.fake.webhooks[0]["secret_token"], "s3cret")
+
+
+if __name__ == "__main__":
+    unittest.main()
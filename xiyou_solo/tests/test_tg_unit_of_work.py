@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from xiyou_solo.benchmarks.bench_tg_io import IOCounter, isolated_data_dir
+from xiyou_solo.core.state import new_game_state
+from xiyou_solo.infra.session_store import GameSessionStore, SessionStore, SessionUnitOfWork
+from xiyou_solo.services import tg_handler
+
+
+class SessionUnitOfWorkTests(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.backing = SessionStore(Path(tmp.name))
+        self.sid = self.backing.create_session("p1", {"onboarding": {"stage": "playing"}})
+        GameSessionStore(self.backing).save_game(new_game_state(self.sid), {"events": []})
+
+    def test_reads_once_and_skips_unchanged_meta(self) -> None:
+        uow = SessionUnitOfWork(self.backing)
+        counter = IOCounter()
+        with counter.counting():
+            first = uow.load_game(self.sid)
+            self.assertIs(uow.load_game(self.sid), first)
+            meta = uow.load_meta(self.sid)
+            uow.save_meta(self.sid, uow.load_meta(self.sid))
+            self.assertFalse(uow.is_dirty())
+            self.assertEqual(uow.commit(), 0)
+        self.assertEqual(counter.counts["open_read"], 3)
+        self.assertEqual(counter.counts["open_write"], 0)
+        meta["onboarding"]["stage"] = "choose_language"
+        uow.save_meta(self.sid, meta)
+        self.assertTrue(uow.is_dirty())
+
+    def test_saves_are_deferred_until_commit(self) -> None:
+        uow = SessionUnitOfWork(self.backing)
+        state, log_data = uow.load_game(self.sid)
+        state.player_name = "Wukong"
+        uow.save_game(state, log_data)
+        self.assertNotEqual(GameSessionStore(self.backing).load_game(self.sid)[0].player_name, "Wukong")
+        self.assertEqual(uow.commit(), 1)
+        self.assertEqual(GameSessionStore(self.backing).load_game(self.sid)[0].player_name, "Wukong")
+
+
+class HandlerIOTests(unittest.TestCase):
+    def test_playing_message_reads_and_writes_each_file_once(self) -> None:
+        with isolated_data_dir():
+            for text in ("/start", "en", "/skip", "1", "Wukong"):
+                tg_handler.handle_chat_text(7, text)
+            sid = tg_handler.get_chat_index().get("7")
+            before = len(GameSessionStore().load_game(sid)[1]["events"])
+            counter = IOCounter()
+            with counter.counting():
+                reply = tg_handler.handle_chat_text(7, "inspect the cart tracks")
+            self.assertTrue(reply)
+            # meta, state, log and the DM prompt; state and log written once.
+            self.assertEqual(counter.counts["open_read"], 4)
+            self.assertEqual(counter.counts["open_write"], 2)
+            with counter.counting():
+                tg_handler.handle_chat_text(7, "/status")
+            self.assertEqual(counter.counts["open_write"], 2)
+            state, log_data = GameSessionStore().load_game(sid)
+            self.assertEqual(state.player_name, "Wukong")
+            self.assertGreater(len(log_data["events"]), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import os
+import unittest
+from typing import Any, Dict, List
+from unittest import mock
+
+from xiyou_solo.core.engine import GameEngine
+from xiyou_solo.core.state import new_game_state
+from xiyou_solo.core.turn_class import CHECK_HEAVY, COMBAT_ENTRY, FINALE, ROUTINE, classify_turn
+from xiyou_solo.llm import tiers
+from xiyou_solo.llm.base import LLMCallResult
+from xiyou_solo.llm.directive_parser import DEFAULT_DIRECTIVE
+from xiyou_solo.llm.openrouter import OpenRouterProvider
+from xiyou_solo.llm.tiers import ModelTiers
+
+
+class _TieredProvider:
+    """Records which turn classes asked for a model and answers as that model."""
+
+    def __init__(self, model: str = "base") -> None:
+        self.model = model
+        self.asked: List[str] = []
+
+    def for_turn_class(self, turn_class: str) -> "_TieredProvider":
+        self.asked.append(turn_class)
+        return _TieredProvider("strong-model" if turn_class == FINALE else "light-model")
+
+    def generate(self, dm_system: str, dm_context: str, player_input: str) -> LLMCallResult:
+        directive: Dict[str, Any] = dict(DEFAULT_DIRECTIVE)
+        return LLMCallResult(narrative="ok", directive=directive, raw_text="ok", latency_ms=5, tokens=40, model=self.model)
+
+
+class ClassifyTurnTests(unittest.TestCase):
+    def test_classes(self) -> None:
+        state = new_game_state("sess_a")
+        self.assertEqual(classify_turn(state, "walk to the inn"), ROUTINE)
+        self.assertEqual(classify_turn(state, "Inspect the cart tracks"), CHECK_HEAVY)
+        self.assertEqual(classify_turn(state, "我要调查车辙"), CHECK_HEAVY)
+        self.assertEqual(classify_turn(state, "fight the bandits"), COMBAT_ENTRY)
+        state.threat_level = 6
+        self.assertEqual(classify_turn(state, "walk to the inn"), CHECK_HEAVY)
+        state.threat = 6
+        self.assertEqual(classify_turn(state, "fight the bandits"), FINALE)
+        calm = new_game_state("sess_b")
+        calm.flags.add("finale")
+        self.assertEqual(classify_turn(calm, "walk"), FINALE)
+
+
+class ModelTiersTests(unittest.TestCase):
+    def test_env_overrides(self) -> None:
+        env = {"TURN_TIERS": "check_heavy=strong,bogus=light", "OPENROUTER_MODEL_STRONG": "big/model", "OPENROUTER_MODEL_LIGHT": ""}
+        with mock.patch.dict(os.environ, env):
+            model_tiers = ModelTiers.from_env()
+        self.assertEqual(model_tiers.tier_for(CHECK_HEAVY), "strong")
+        self.assertEqual(model_tiers.model_for(FINALE), "big/model")
+        self.assertIsNone(model_tiers.model_for(ROUTINE))
+
+    def test_openrouter_provider_switches_model_per_tier(self) -> None:
+        model_tiers = ModelTiers(models={"light": "small/model"})
+        with mock.patch.object(tiers, "_TIERS", model_tiers):
+            provider = OpenRouterProvider(api_key="sk-x", model="big/model", fallback=None)
+            self.assertEqual(provider.for_turn_class(ROUTINE).model, "small/model")
+            self.assertIs(provider.for_turn_class(FINALE), provider)
+
+
+class EngineTierTests(unittest.TestCase):
+    def test_engine_asks_provider_per_class_and_reports_tiers(self) -> None:
+        provider = _TieredProvider()
+        engine = GameEngine(provider=provider)
+        state = new_game_state("sess_tiers")
+        log_data: Dict[str, Any] = {"events": []}
+        report = tiers.TierReport()
+        with mock.patch.object(tiers, "_REPORT", report), mock.patch.object(tiers, "_TIERS", ModelTiers()):
+            first = engine.run_turn(state, log_data, "walk to the inn", "DM")
+            state.flags.add("finale")
+            last = engine.run_turn(state, log_data, "walk to the gate", "DM")
+        self.assertEqual((first.turn_class, last.turn_class), (ROUTINE, FINALE))
+        self.assertEqual(provider.asked, [ROUTINE, FINALE])
+        narrated = [ev["meta"] for ev in log_data["events"] if ev["type"] == "dm_narrative"]
+        self.assertEqual([(m["tier"], m["model"]) for m in narrated], [("light", "light-model"), ("strong", "strong-model")])
+        snapshot = report.snapshot()
+        self.assertEqual(snapshot["strong"]["classes"], {FINALE: 1})
+        self.assertEqual(snapshot["light"]["tokens_per_turn"], 40)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+import uuid
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+from xiyou_solo.adapters import wechat_adapter
+from xiyou_solo.infra import session_store
+from xiyou_solo.infra.dispatcher import QueueFullError
+from xiyou_solo.infra.http_pool import HTTPStatusError
+from xiyou_solo.infra.rate_limit import RateLimiter
+from xiyou_solo.infra.turn_queue import TransientTurnError, TurnQueue, TurnWorkers
+from xiyou_solo.llm import openrouter
+from xiyou_solo.services import game_service, room_repo
+from xiyou_solo.ui import bot_runner
+
+
+class TurnQueueTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = Path(self._tmp.name) / "turns.sqlite3"
+        self.queue = TurnQueue(self.path, max_attempts=2, retry_base_sec=0)
+        self.addCleanup(self.queue.close)
+
+    def test_group_order_and_duplicate_ids(self) -> None:
+        first = self.queue.enqueue("g", "a", "/act one", "m1")
+        self.queue.enqueue("g", "b", "/act two", "m2")
+        self.queue.enqueue("h", "c", "/act three", "m1")
+        self.assertIsNone(self.queue.enqueue("g", "a", "/act one", "m1"))
+        job = self.queue.claim()
+        self.assertEqual(job.id, first)
+        # g is busy, so the next claim skips g's second job.
+        self.assertEqual(self.queue.claim().group_id, "h")
+        self.assertIsNone(self.queue.claim())
+        self.queue.complete(job, ["done one"])
+        self.assertEqual(self.queue.claim().text, "/act two")
+        self.assertEqual(self.queue.stats()["duplicates"], 1)
+
+    def test_transient_errors_retry_then_fail(self) -> None:
+        calls = []
+
+        def handler(job):
+            calls.append(job.attempts)
+            raise TransientTurnError("model timeout")
+
+        workers = TurnWorkers(self.queue, handler)
+        self.queue.enqueue("g", "a", "/act x", "m1")
+        while workers.run_once():
+            pass
+        self.assertEqual(calls, [1, 2])
+        stats = self.queue.stats()
+        self.assertEqual((stats["retries"], stats["failed"]), (1, 1))
+        self.assertEqual(self.queue.outbox("g")[0]["replies"], ["Action failed: model timeout"])
+
+    def test_finished_rows_are_pruned_after_retention(self) -> None:
+        queue = TurnQueue(Path(self._tmp.name) / "pruned.sqlite3", retention_sec=100)
+        self.addCleanup(queue.close)
+        queue.enqueue("g", "a", "/act old", "m1", now=0)
+        queue.complete(queue.claim(now=0), ["old"], now=0)
+        queue.enqueue("g", "a", "/act new", "m2", now=150)
+        queue.complete(queue.claim(now=150), ["new"], now=150)
+        queue.enqueue("g", "a", "/act waiting", "m3", now=0)
+        self.assertEqual(queue.prune(now=160), 2)
+        self.assertEqual([row["replies"] for row in queue.outbox("g")], [["new"]])
+        self.assertEqual(queue.counts()["queued"], 1)
+
+    def test_pending_jobs_per_group_are_capped(self) -> None:
+        queue = TurnQueue(Path(self._tmp.name) / "capped.sqlite3", max_pending=1)
+        self.addCleanup(queue.close)
+        queue.enqueue("g", "a", "/act one", "m1")
+        with self.assertRaises(QueueFullError):
+            queue.enqueue("g", "a", "/act two", "m2")
+        self.assertIsNotNone(queue.enqueue("h", "a", "/act three", "m1"))
+        self.assertEqual(queue.stats()["rejected"], 1)
+
+    def test_running_jobs_recovered_after_restart(self) -> None:
+        self.queue.enqueue("g", "a", "/act x", "m1")
+        self.assertIsNotNone(self.queue.claim())
+        self.queue.close()
+        reopened = TurnQueue(self.path)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.claim().attempts, 2)
+
+
+class WeChatAsyncTurnTests(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        base = Path(tmp.name)
+        for patcher in (
+            mock.patch.object(room_repo, "ROOMS_DIR", base / "rooms"),
+            mock.patch.object(room_repo, "ROOMS_PATH", base / "rooms.json"),
+            mock.patch.object(wechat_adapter, "TURN_QUEUE_PATH", base / "turns.sqlite3"),
+            mock.patch.object(wechat_adapter, "ASYNC_TURNS", True),
+            mock.patch.object(wechat_adapter, "WECHAT_TOKEN", "tok"),
+            # Rate limits are process-wide; fresh buckets keep tests apart.
+            mock.patch.object(game_service, "_LIMITS", game_service.build_limits()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        wechat_adapter.set_turn_executor(lambda sid, uid, text, meta: f"narrated {text}")
+        self.addCleanup(wechat_adapter.set_turn_executor, None)
+        self.addCleanup(wechat_adapter.stop_turn_workers)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), wechat_adapter.WeChatCallbackHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _post(self, text: str, message_id: str) -> tuple[int, dict]:
+        body = json.dumps({"group_id": "g", "user_id": "a", "message_id": message_id, "text": text}).encode("utf-8")
+        req = urllib.request.Request(f"{self.base_url}/wechat/callback", data=body, method="POST")
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status, json.loads(resp.read())
+
+    def _outbox(self, signed: bool = True) -> list:
+        query = "group_id=g"
+        if signed:
+            sig = hashlib.sha1("".join(sorted(["tok", "1", "n"])).encode("utf-8")).hexdigest()
+            query += f"&timestamp=1&nonce=n&signature={sig}"
+        with urllib.request.urlopen(f"{self.base_url}/outbox?{query}", timeout=5) as resp:
+            return json.loads(resp.read())["messages"]
+
+    def _wait_outbox(self, count: int) -> list:
+        deadline = time.time() + 5
+        messages: list = []
+        while len(messages) < count and time.time() < deadline:
+            messages = self._outbox()
+            time.sleep(0.02)
+        return messages
+
+    def test_plain_command_does_not_open_the_queue(self) -> None:
+        status, payload = self._post("/new", "m1")
+        self.assertEqual(status, 200)
+        self.assertIn("Room created", payload["replies"][0])
+        self.assertIsNone(wechat_adapter._QUEUE)
+
+    def test_rate_limited_turn_is_refused_before_queueing(self) -> None:
+        game_service._LIMITS["user"] = RateLimiter(0.001, 1)
+        self.assertEqual(self._post("/act look", "m1")[0], 202)
+        status, payload = self._post("/act look again", "m2")
+        self.assertEqual((status, payload["queued"]), (200, False))
+        self.assertEqual(payload["replies"], [game_service._LIMIT_REPLIES["user"]])
+        counts = wechat_adapter.get_turn_queue().counts()
+        self.assertEqual(sum(counts[s] for s in ("queued", "running", "done", "failed")), 1)
+
+    def test_full_group_queue_answers_429(self) -> None:
+        gate = threading.Event()
+        self.addCleanup(gate.set)
+        wechat_adapter.set_turn_executor(lambda sid, uid, text, meta: gate.wait(5) and f"narrated {text}")
+        self._post("/new", "m1")
+        self._post("/start", "m2")
+        with mock.patch.object(wechat_adapter, "TURN_MAX_PENDING", 1):
+            self.assertEqual(self._post("/act look", "m3")[0], 202)
+            with self.assertRaises(urllib.error.HTTPError) as ctx:
+                self._post("/act look again", "m4")
+        self.assertEqual(ctx.exception.code, 429)
+
+    def test_outbox_requires_signature(self) -> None:
+        with self.assertRaises(urllib.error.HTTPError) as ctx:
+            self._outbox(signed=False)
+        self.assertEqual(ctx.exception.code, 403)
+
+    def test_commands_after_a_queued_turn_are_answered_in_order(self) -> None:
+        gate = threading.Event()
+
+        def slow(sid, uid, text, meta):
+            gate.wait(5)
+            return f"narrated {text}"
+
+        wechat_adapter.set_turn_executor(slow)
+        self._post("/new", "m1")
+        self._post("/start", "m2")
+        self.assertEqual(self._post("/act look", "m3")[0], 202)
+        status, payload = self._post("/me", "m4")
+        self.assertEqual((status, payload["replies"]), (202, []))
+        gate.set()
+        messages = self._wait_outbox(2)
+        self.assertEqual(messages[0]["replies"][0], "narrated look")
+        self.assertEqual(messages[1]["message_id"], "m4")
+
+    def test_act_is_acknowledged_then_delivered_through_outbox(self) -> None:
+        self._post("/new", "m1")
+        self._post("/start", "m2")
+        status, payload = self._post("/act look around", "m3")
+        self.assertEqual(status, 202)
+        self.assertTrue(payload["queued"])
+        messages = self._wait_outbox(1)
+        self.assertEqual(messages[0]["replies"], ["narrated look around", "Next turn: a"])
+        with urllib.request.urlopen(f"{self.base_url}/metrics", timeout=5) as resp:
+            stats = json.loads(resp.read())["turn_queue"]
+        self.assertEqual(stats["done"], 1)
+        self.assertEqual(stats["queue_ms"]["count"], 1)
+
+
+class _ScriptedPool:
+    def __init__(self, script: list) -> None:
+        self.script = script
+
+    def request_json(self, method: str, url: str, payload: dict, **kwargs) -> dict:
+        item = self.script.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+
+class LLMTurnExecutorTests(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        base = Path(tmp.name)
+        model = f"exec-{uuid.uuid4().hex[:6]}"
+        ok = {"choices": [{"message": {"content": 'The gate creaks.\n```json\n{"need_check": false}\n```'}}]}
+        self.pool = _ScriptedPool([HTTPStatusError(503, b"", {}), ok])
+        provider = openrouter.OpenRouterProvider(
+            api_key="sk-x", model=model, cache=None, policy=openrouter.CallPolicy(max_attempts=1), fallback=None
+        )
+        for patcher in (
+            mock.patch.object(room_repo, "ROOMS_DIR", base / "rooms"),
+            mock.patch.object(room_repo, "ROOMS_PATH", base / "rooms.json"),
+            mock.patch.object(session_store, "SESSIONS_DIR", base / "sessions"),
+            mock.patch.object(openrouter, "get_pool", lambda: self.pool),
+            mock.patch.object(bot_runner, "make_provider", lambda api_key: provider),
+            mock.patch.object(game_service, "_LIMITS", game_service.build_limits()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        wechat_adapter.set_turn_executor(wechat_adapter.llm_turn_executor)
+        self.addCleanup(wechat_adapter.set_turn_executor, None)
+        self.queue = TurnQueue(base / "turns.sqlite3", max_attempts=3, retry_base_sec=0)
+        self.addCleanup(self.queue.close)
+
+    def test_upstream_outage_is_retried_without_saving(self) -> None:
+        game_service.handle_message("g", "a", "/new", "m1")
+        game_service.handle_message("g", "a", "/start", "m2")
+        self.queue.enqueue("g", "a", "/act open the gate", "m3")
+        workers = TurnWorkers(self.queue, wechat_adapter._run_queued_turn)
+        while workers.run_once():
+            pass
+        stats = self.queue.stats()
+        self.assertEqual((stats["retries"], stats["done"], stats["failed"]), (1, 1, 0))
+        replies = self.queue.outbox("g")[0]["replies"]
+        self.assertTrue(replies[0].startswith("The gate creaks."))
+        sid = room_repo.get_room(room_repo.load_group("g"), "g")["session_id"]
+        state, _ = session_store.GameSessionStore().load_game(sid)
+        self.assertEqual(state.turn, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import unittest
+from typing import Any, Dict
+
+from xiyou_solo.core import pacing
+from xiyou_solo.core.engine import GameEngine
+from xiyou_solo.core.state import GameState, new_game_state
+from xiyou_solo.core.world import WorldClock
+from xiyou_solo.llm.base import LLMCallResult
+from xiyou_solo.llm.directive_parser import DEFAULT_DIRECTIVE
+
+
+class _ClockProvider:
+    def __init__(self, clock_delta: Any) -> None:
+        self.clock_delta = clock_delta
+        self.contexts: list[str] = []
+
+    def generate(self, dm_system: str, dm_context: str, player_input: str) -> LLMCallResult:
+        self.contexts.append(dm_context)
+        directive = dict(DEFAULT_DIRECTIVE)
+        directive["world_tick"] = {"threat_delta": 0, "clock_delta": self.clock_delta, "notes": ""}
+        return LLMCallResult(narrative="ok", directive=directive, raw_text="ok", latency_ms=0)
+
+
+class WorldClockTests(unittest.TestCase):
+    def test_events_fire_in_due_order(self) -> None:
+        clock = WorldClock()
+        clock.schedule("deadline", 5, event_id="b")
+        clock.schedule("reinforcements", 2, event_id="a")
+        clock.schedule("late", 50)
+        self.assertEqual(clock.advance(1), [])
+        fired = clock.advance(4)
+        self.assertEqual([ev["id"] for ev in fired], ["a", "b"])
+        self.assertEqual(len(clock), 1)
+
+    def test_repeating_event_reschedules(self) -> None:
+        clock = WorldClock()
+        clock.schedule("shop_restock", 3, repeat_every=3)
+        fired = clock.advance(9)
+        self.assertEqual([ev["due"] for ev in fired], [3, 6, 9])
+        self.assertEqual(clock.upcoming()[0]["due"], 12)
+
+    def test_cancel_and_round_trip(self) -> None:
+        clock = WorldClock(now=4, seeded=True)
+        clock.schedule("deadline", 2, {"threat_delta": 1}, event_id="d")
+        clock.schedule("restock", 1, event_id="r")
+        restored = WorldClock.from_dict(clock.to_dict())
+        self.assertEqual(restored, clock)
+        self.assertTrue(restored.cancel("r"))
+        self.assertFalse(restored.cancel("r"))
+        self.assertEqual([ev["id"] for ev in restored.advance(2)], ["d"])
+
+
+class EnginePacingTests(unittest.TestCase):
+    def _run(self, clock_delta: Any, turns: int) -> tuple[GameState, Dict[str, Any], _ClockProvider]:
+        provider = _ClockProvider(clock_delta)
+        state = new_game_state("sess_clock")
+        log_data: Dict[str, Any] = {"events": []}
+        engine = GameEngine(provider=provider)
+        for _ in range(turns):
+            engine.run_turn(state, log_data, "wait", "DM")
+        return state, log_data, provider
+
+    def test_clock_follows_directive_and_is_clamped(self) -> None:
+        state, _, _ = self._run(2, 2)
+        self.assertEqual(state.clock.now, 4)
+        max_delta = int(pacing.load_pacing_rules()["max_clock_delta"])
+        state, _, _ = self._run(99, 1)
+        self.assertEqual(state.clock.now, max_delta)
+
+    def test_scheduled_events_apply_effects_and_log(self) -> None:
+        rules = pacing.load_pacing_rules()
+        deadline = next(ev for ev in rules["events"] if ev["kind"] == "deadline")
+        state, log_data, provider = self._run(1, int(deadline["at"]))
+        kinds = [ev["meta"]["kind"] for ev in log_data["events"] if ev.get("type") == "world_event"]
+        self.assertIn("deadline", kinds)
+        self.assertIn("finale", state.flags)
+        self.assertIn("upcoming: ", provider.contexts[0])
+        self.assertNotIn("upcoming: none", provider.contexts[0])
+
+    def test_clock_persists_with_state(self) -> None:
+        state, _, _ = self._run(3, 1)
+        restored = GameState.from_dict(state.to_dict())
+        self.assertEqual(restored.clock, state.clock)
+        self.assertTrue(restored.clock.seeded)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import unittest
+from typing import Any, Dict
+
+from xiyou_solo.core.containers import FlagStore
+from xiyou_solo.core.engine import GameEngine
+from xiyou_solo.core.state import GameState, new_game_state
+from xiyou_solo.llm.base import LLMCallResult
+from xiyou_solo.llm.directive_parser import DEFAULT_DIRECTIVE
+
+
+class _FixedProvider:
+    def __init__(self, directive: Dict[str, Any]) -> None:
+        self.directive = directive
+        self.contexts: list[str] = []
+
+    def generate(self, dm_system: str, dm_context: str, player_input: str) -> LLMCallResult:
+        self.contexts.append(dm_context)
+        return LLMCallResult(narrative="ok", directive=dict(self.directive), raw_text="ok", latency_ms=0)
+
+
+class FlagStoreIndexTests(unittest.TestCase):
+    def test_namespace_index(self) -> None:
+        flags = FlagStore(["clue:map", "scene:bridge", "finale", "clue:seal", "npc:tang:met"])
+        self.assertEqual(flags.namespace("clue"), ["clue:map", "clue:seal"])
+        self.assertEqual(flags.values("clue"), ["map", "seal"])
+        self.assertEqual(flags.with_prefix("npc:tang"), ["npc:tang:met"])
+        self.assertEqual(flags.with_prefix("fin"), ["finale"])
+        flags.discard("clue:map")
+        self.assertEqual(flags.values("clue"), ["seal"])
+
+    def test_normalizes_and_dedups(self) -> None:
+        flags = FlagStore()
+        self.assertTrue(flags.add("clue:old  map"))
+        self.assertFalse(flags.add(" clue:old map "))
+        self.assertFalse(flags.add("   "))
+        self.assertEqual(len(flags), 1)
+
+    def test_bounded_keeps_bare_flags(self) -> None:
+        flags = FlagStore(["finale"], limit=3)
+        for idx in range(5):
+            flags.add(f"scene:{idx}")
+        self.assertEqual(len(flags), 3)
+        self.assertIn("finale", flags)
+        self.assertEqual(flags.values("scene"), ["3", "4"])
+
+    def test_full_of_bare_flags_keeps_them(self) -> None:
+        flags = FlagStore(["finale", "ending"], limit=2)
+        self.assertFalse(flags.add("scene:late"))
+        self.assertEqual(flags, ["finale", "ending"])
+
+    def test_discard_and_contains_normalize(self) -> None:
+        flags = FlagStore(["clue:old map"])
+        self.assertIn(" clue:old  map", flags)
+        self.assertTrue(flags.discard("clue:old  map "))
+        self.assertEqual(flags.namespaces(), [])
+
+    def test_round_trip_keeps_index(self) -> None:
+        state = new_game_state("sess_flags")
+        state.flags.add("clue:map")
+        restored = GameState.from_dict(state.to_dict())
+        self.assertEqual(restored.flags.values("clue"), ["map"])
+
+
+class EngineFlagTests(unittest.TestCase):
+    def _run(self, directive: Dict[str, Any]) -> tuple[GameState, _FixedProvider]:
+        provider = _FixedProvider(directive)
+        state = new_game_state("sess_flags")
+        log_data: Dict[str, Any] = {"events": []}
+        engine = GameEngine(provider=provider)
+        engine.run_turn(state, log_data, "look", "DM")
+        engine.run_turn(state, log_data, "look again", "DM")
+        return state, provider
+
+    def test_flags_to_add_applied_without_provider_flags(self) -> None:
+        directive = dict(DEFAULT_DIRECTIVE)
+        directive["flags_to_add"] = ["scene:bridge_out", "provider:error", "scene:bridge_out"]
+        state, _ = self._run(directive)
+        self.assertEqual(state.flags.namespace("scene"), ["scene:bridge_out"])
+        self.assertEqual(state.flags.namespace("provider"), [])
+
+    def test_directive_cannot_set_bare_flags(self) -> None:
+        directive = dict(DEFAULT_DIRECTIVE)
+        directive["flags_to_add"] = ["finale", "scene:gate"]
+        state, _ = self._run(directive)
+        self.assertNotIn("finale", state.flags)
+        self.assertIn("scene:gate", state.flags)
+
+    def test_clues_deduplicated_and_in_context(self) -> None:
+        directive = dict(DEFAULT_DIRECTIVE)
+        directive["grant_clue"] = True
+        directive["clue"] = {"title": "torn map", "detail": ""}
+        state, provider = self._run(directive)
+        self.assertEqual(state.flags.values("clue"), ["torn map"])
+        self.assertIn("clues: ['torn map']", provider.contexts[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
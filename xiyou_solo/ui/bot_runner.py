@@ -1,15 +1,27 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Tuple
+import os
+from typing import Any, Collection, Dict, Optional, Tuple
 
 from xiyou_solo.core.engine import GameEngine
 from xiyou_solo.core.state import GameState, new_game_state
+from xiyou_solo.infra.rate_limit import ConcurrencyLimiter, key_fingerprint
 from xiyou_solo.infra.session_store import GameSessionStore
-from xiyou_solo.llm.openrouter import OpenRouterProvider
+from xiyou_solo.infra.turn_queue import TransientTurnError
+from xiyou_solo.llm.router import make_provider
 from xiyou_solo.ui.common import _read_dm_system, _summary
 
-def create_bot_session(session_id: str, language: str = "zh", player_name: str = "tg_player") -> Tuple[Dict[str, Any], Dict[str, Any]]:
-    store = GameSessionStore()
+# In-flight LLM turns. A second turn in the same group is rejected at once; turns on a busy
+# API key (the server key is shared by every chat) wait up to KEY_SLOT_WAIT_SEC for a slot.
+_GROUP_TURNS = ConcurrencyLimiter(int(os.getenv("BOT_MAX_TURNS_PER_GROUP", "1")), scope="group_turns")
+_KEY_TURNS = ConcurrencyLimiter(int(os.getenv("BOT_MAX_TURNS_PER_KEY", "4")), scope="api_key_turns")
+KEY_SLOT_WAIT_SEC = float(os.getenv("BOT_KEY_SLOT_WAIT_SEC", "30"))
+
+
+def create_bot_session(
+    session_id: str, language: str = "zh", player_name: str = "tg_player", store: Optional[GameSessionStore] = None
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    store = store or GameSessionStore()
     state = new_game_state(session_id=session_id, player_id=f"telegram:{player_name}", language=language)
     state.player_name = player_name
     log_data: Dict[str, Any] = {"session_id": session_id, "events": []}
@@ -17,27 +29,57 @@ def create_bot_session(session_id: str, language: str = "zh", player_name: str =
     return state.to_dict(), log_data
 
 
-def run_turn(session_id: str, player_input: str, api_key: str | None = None) -> Tuple[str, Dict[str, Any], str]:
-    store = GameSessionStore()
+def run_turn(
+    session_id: str,
+    player_input: str,
+    api_key: str | None = None,
+    group_id: Optional[str] = None,
+    store: Optional[GameSessionStore] = None,
+    retry_errors: Collection[str] = (),
+) -> Tuple[str, Dict[str, Any], str]:
+    """
+    Play one LLM turn. When the LLM call fails with one of retry_errors,
+    nothing is saved and TransientTurnError is raised so the caller can
+    run the turn again later.
+    """
+    key_id = key_fingerprint(api_key or os.getenv("OPENROUTER_API_KEY", ""))
+    with _GROUP_TURNS.slot(group_id or session_id), _KEY_TURNS.slot(key_id, timeout=KEY_SLOT_WAIT_SEC):
+        return _run_turn(session_id, player_input, api_key, store, retry_errors)
+
+
+def turn_slot_stats() -> Dict[str, Any]:
+    return {"group": _GROUP_TURNS.stats(), "api_key": _KEY_TURNS.stats()}
+
+
+def _run_turn(
+    session_id: str,
+    player_input: str,
+    api_key: str | None,
+    store: Optional[GameSessionStore] = None,
+    retry_errors: Collection[str] = (),
+) -> Tuple[str, Dict[str, Any], str]:
+    store = store or GameSessionStore()
     loaded = store.load_game(session_id)
     if not loaded:
-        state_dict, log_data = create_bot_session(session_id, language="zh", player_name=f"tg_{session_id[-6:]}")
+        state_dict, log_data = create_bot_session(session_id, language="zh", player_name=f"tg_{session_id[-6:]}", store=store)
         state = GameState.from_dict(state_dict)
     else:
         state, log_data = loaded
 
-    provider = OpenRouterProvider(api_key=api_key)
+    provider = make_provider(api_key)
     engine = GameEngine(provider=provider)
     turn = engine.run_turn(state, log_data, player_input, _read_dm_system())
+    if turn.error is not None and turn.error in retry_errors:
+        raise TransientTurnError(turn.error)
     store.save_game(state, log_data)
     return turn.narrative, turn.directive, _summary(state)
 
 
-def run_utility_command(session_id: str, command: str) -> str:
-    store = GameSessionStore()
+def run_utility_command(session_id: str, command: str, store: Optional[GameSessionStore] = None) -> str:
+    store = store or GameSessionStore()
     loaded = store.load_game(session_id)
     if not loaded:
-        state_dict, log_data = create_bot_session(session_id, language="zh", player_name=f"tg_{session_id[-6:]}")
+        state_dict, log_data = create_bot_session(session_id, language="zh", player_name=f"tg_{session_id[-6:]}", store=store)
         state = GameState.from_dict(state_dict)
     else:
         state, log_data = loaded
@@ -10,7 +10,7 @@ from xiyou_solo.infra.metrics import MetricsCollector, format_metric_line
 from xiyou_solo.infra.session_store import GameSessionStore
 from xiyou_solo.llm.base import LLMProvider
 from xiyou_solo.llm.mock import MockProvider
-from xiyou_solo.llm.openrouter import OpenRouterProvider
+from xiyou_solo.llm.router import make_provider
 from xiyou_solo.ui.common import _read_dm_system, _summary
 
 
@@ -19,7 +19,7 @@ QUIT_WORDS = {"quit", "exit", "q", "/quit"}
 
 def _provider_from_name(name: str) -> LLMProvider:
     if name == "openrouter":
-        return OpenRouterProvider()
+        return make_provider()
     return MockProvider()
 
 